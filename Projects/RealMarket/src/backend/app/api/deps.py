@@ -1,6 +1,7 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
-from firebase_admin import auth, exceptions
 from loguru import logger
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token") # tokenUrl is not used, but required
@@ -9,6 +10,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Dependency to verify Firebase ID token and get user data.
     """
+    # Deferred to the first authenticated request (the lifespan has usually imported it already).
+    from firebase_admin import auth, exceptions
+
     try:
         decoded_token = auth.verify_id_token(token)
         return decoded_token
@@ -26,4 +30,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Malformed authentication token",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+async def get_websocket_user(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    Like `get_current_user`, for WebSocket routes. Browsers cannot set headers on the
+    handshake, so the ID token may also be passed as `?token=`.
+    """
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" and credentials else None
+    if not token:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+    try:
+        return await get_current_user(token)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
@@ -1,82 +1,238 @@
 # src/backend/app/api/v1/endpoints.py
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, Security
-from typing import Annotated, List, Any, Dict
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, Security, WebSocket, WebSocketDisconnect
+from fastapi.requests import HTTPConnection
+from fastapi.responses import JSONResponse
+from typing import Annotated, List, Any, Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 import time
 
-from app.schemas.population import MarketDataRequest, PopulationDataResponse, ErrorResponse, CacheDeleteRequest
+from app.schemas.population import MarketDataRequest, PopulationDataResponse, ErrorResponse, CacheDeleteRequest, TradeAreaResponse, CensusKeyUsage, CompressionStats, OverloadStats, JobAccepted, JobStatus, MigrationFlowsResponse
 from app.services.census_service import CensusService
 from app.db.session import get_db_session
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_websocket_user
 
 # --- Dependency Injection Setup ---
 # By creating service instances here, FastAPI can manage their lifecycle.
 # This is a placeholder for a more robust dependency injection system if needed.
-from httpx import AsyncClient
+from app.core.admission import AdmissionController
+from app.core.local_cache import LocalCache
+from app.core.overload import AdaptiveLimiter
+from app.core.upstream_clients import UpstreamClients
+from app.core.census_keys import get_census_key_pool
+from app.core.compression import compression_stats
+from app.core.config import settings
+from app.core.http_caching import cache_headers, has_validators, is_not_modified, not_modified_response
 from app.services.cache_manager import CacheManager
 from app.services.geocoding_service import GeocodingService
 from app.services.census_api_client import CensusAPIClient
 from app.services.data_processor import DataProcessor
+from app.services.trade_area import TradeAreaService
+from app.services.county_percentiles import CountyPercentileStore
+from app.services.tract_matrix import TractMatrix
+from app.services.migration_flows import MigrationFlows
+from app.services.tract_adjacency import TractAdjacency
+from app.services.job_queue import MarketDataJobQueue, job_status
 
-# Create a single HTTP client to be shared across services for connection pooling
-http_client = AsyncClient(timeout=20.0)
+# Upstream HTTP clients (one pooled client per host) are created by the app lifespan.
+def get_upstream_clients(request: Request) -> UpstreamClients: return request.app.state.upstream_clients
 
-def get_cache_manager(): return CacheManager()
+def get_cache_manager(request: Request):
+    return CacheManager(writer=request.app.state.cache_writer, local_cache=request.app.state.response_cache)
 def get_data_processor(): return DataProcessor()
-def get_geocoding_service(): return GeocodingService(http_client)
-def get_census_api_client(): return CensusAPIClient(http_client)
+def get_percentile_store(request: Request) -> Optional[CountyPercentileStore]: return request.app.state.percentile_store
+def get_tract_matrix(request: Request) -> Optional[TractMatrix]: return request.app.state.tract_matrix
+def get_migration_flows(request: Request) -> Optional[MigrationFlows]: return request.app.state.migration_flows
+def get_tract_adjacency(request: Request) -> Optional[TractAdjacency]: return request.app.state.tract_adjacency
+def get_boundary_cache(request: Request) -> Optional[LocalCache]: return request.app.state.boundary_cache
+def get_admission(request: Request) -> Optional[AdmissionController]: return request.app.state.admission
+def get_miss_limiter(request: Request) -> Optional[AdaptiveLimiter]: return request.app.state.miss_limiter
+def get_job_queue(connection: HTTPConnection) -> Optional[MarketDataJobQueue]: return connection.app.state.job_queue
+def get_geocoding_service(clients: UpstreamClients = Depends(get_upstream_clients)): return GeocodingService(clients)
+def get_census_api_client(request: Request, clients: UpstreamClients = Depends(get_upstream_clients)):
+    return CensusAPIClient(clients, batcher=request.app.state.acs_batcher)
 
 # The main CensusService depends on the other services
 def get_census_service(
     cache: CacheManager = Depends(get_cache_manager),
     geocoder: GeocodingService = Depends(get_geocoding_service),
     api_client: CensusAPIClient = Depends(get_census_api_client),
-    processor: DataProcessor = Depends(get_data_processor)
+    processor: DataProcessor = Depends(get_data_processor),
+    percentiles: Optional[CountyPercentileStore] = Depends(get_percentile_store),
+    tract_matrix: Optional[TractMatrix] = Depends(get_tract_matrix),
+    boundaries: Optional[LocalCache] = Depends(get_boundary_cache),
+    admission: Optional[AdmissionController] = Depends(get_admission),
+    miss_limiter: Optional[AdaptiveLimiter] = Depends(get_miss_limiter),
+    migration_flows: Optional[MigrationFlows] = Depends(get_migration_flows),
+    tract_adjacency: Optional[TractAdjacency] = Depends(get_tract_adjacency),
 ) -> CensusService:
-    return CensusService(cache, geocoder, api_client, processor)
+    return CensusService(
+        cache, geocoder, api_client, processor, percentiles, tract_matrix, boundaries, admission, miss_limiter, migration_flows, tract_adjacency
+    )
+
+def get_trade_area_service(
+    api_client: CensusAPIClient = Depends(get_census_api_client),
+    processor: DataProcessor = Depends(get_data_processor)
+) -> TradeAreaService:
+    return TradeAreaService(api_client, processor)
 
 router = APIRouter()
 CensusServiceDep = Annotated[CensusService, Depends(get_census_service)]
 DBSessionDep = Annotated[AsyncSession, Depends(get_db_session)]
+JobQueueDep = Annotated[Optional[MarketDataJobQueue], Depends(get_job_queue)]
+
+MARKET_DATA_RESPONSES = {
+    202: {"model": JobAccepted, "description": "With async=true, a cache miss was queued as a job"},
+    304: {"description": "The client's cached copy (If-None-Match / If-Modified-Since) is current"},
+    404: {"model": ErrorResponse, "description": "Address or data not found"},
+    429: {"model": ErrorResponse, "description": "Per-user rate or concurrency limit reached; see Retry-After"},
+    503: {"model": ErrorResponse, "description": "External service unavailable, or overloaded (with Retry-After)"},
+}
+
+async def _accept_market_data_job(
+    fastapi_request: Request, address: str, service: CensusService, job_queue: MarketDataJobQueue,
+    db_session: AsyncSession, user_id: Optional[str],
+) -> Response:
+    if service.admission is not None and user_id is not None:
+        # A queued job costs the user as much as a synchronous miss.
+        service.admission.charge_miss(user_id)
+    job = await job_queue.submit(address, service.cache.cache_key(address), user_id, db_session)
+    status_url = str(fastapi_request.url_for("get_job", job_id=job.id))
+    websocket_url = str(fastapi_request.url_for("watch_job", job_id=job.id)).replace("http", "ws", 1)
+    accepted = JobAccepted(job_id=job.id, status=job.status, status_url=status_url, websocket_url=websocket_url)
+    logger.info(f"Accepted '{address}' as job {job.id} ({job.status}).")
+    return JSONResponse(status_code=202, content=accepted.model_dump(), headers={"Location": status_url})
+
+async def _market_data_response(
+    fastapi_request: Request, address: str, service: CensusService, db_session: AsyncSession, current_user: dict,
+    run_async: bool = False, job_queue: Optional[MarketDataJobQueue] = None,
+) -> Response:
+    start_time = time.time()
+    client_host = fastapi_request.client.host if fastapi_request.client else "unknown"
+    logger.info(f"Received /market-data request from {client_host} for address: '{address}'")
+    user_id = current_user.get("uid")
+
+    try:
+        if service.admission is not None and user_id is not None:
+            # Every request pays the (small) hit cost; a miss is charged the rest inside the service.
+            service.admission.admit(user_id)
+        if has_validators(fastapi_request):
+            # Revalidation only needs the entry's ETag and timestamp, not its JSON.
+            validators = await service.get_market_data_validators(address, db_session)
+            if validators is not None and is_not_modified(fastapi_request, *validators):
+                logger.info(f"Answered '{address}' with 304 Not Modified.")
+                return not_modified_response(*validators, settings.MARKET_DATA_MAX_AGE)
+
+        if run_async and job_queue is not None:
+            # Hits are answered as usual; only a miss becomes a job.
+            entry = await service.get_cached_market_data_entry(address, db_session)
+            if entry is None:
+                return await _accept_market_data_job(fastapi_request, address, service, job_queue, db_session, user_id)
+        else:
+            entry = await service.get_market_data_entry(
+                address=address,
+                db=db_session,
+                user_id=user_id,
+            )
+        process_time = (time.time() - start_time) * 1000
+        logger.info(f"Successfully processed request for '{address}' in {process_time:.2f}ms.")
+        body = entry.body
+        if is_not_modified(fastapi_request, body.etag, body.last_modified):
+            return not_modified_response(body.etag, body.last_modified, settings.MARKET_DATA_MAX_AGE)
+        # The body is already serialized (and possibly compressed) with the cache entry.
+        return body.to_response(fastapi_request, headers=cache_headers(body.etag, body.last_modified, settings.MARKET_DATA_MAX_AGE))
+    except HTTPException as e:
+        process_time = (time.time() - start_time) * 1000
+        logger.warning(f"HTTPException for '{address}': Status={e.status_code}, Detail='{e.detail}'. Processed in {process_time:.2f}ms.")
+        raise e
+    except Exception:
+        process_time = (time.time() - start_time) * 1000
+        logger.exception(f"An unexpected error occurred for '{address}'. Processed in {process_time:.2f}ms.")
+        raise HTTPException(status_code=500, detail="An unexpected internal error occurred.")
 
 @router.post(
     "/market-data",
     response_model=PopulationDataResponse,
     summary="Get Population Metrics by Address",
     description="Accepts an address and returns key population metrics for the census tract.",
-    responses={
-        404: {"model": ErrorResponse, "description": "Address or data not found"},
-        503: {"model": ErrorResponse, "description": "External service unavailable"},
-    },
+    responses=MARKET_DATA_RESPONSES,
 )
 async def get_market_data(
     fastapi_request: Request,
     request: MarketDataRequest,
     service: CensusServiceDep,
     db_session: DBSessionDep,
+    job_queue: JobQueueDep,
+    run_async: bool = Query(False, alias="async", description="Queue a cache miss as a job and return 202 instead of waiting."),
     current_user: dict = Security(get_current_user),
 ):
-    start_time = time.time()
-    client_host = fastapi_request.client.host if fastapi_request.client else "unknown"
-    logger.info(f"Received /market-data request from {client_host} for address: '{request.address}'")
-    
+    return await _market_data_response(fastapi_request, request.address, service, db_session, current_user, run_async, job_queue)
+
+@router.get(
+    "/market-data",
+    response_model=PopulationDataResponse,
+    summary="Get Population Metrics by Address (cacheable)",
+    description="Same as POST /market-data, addressed by query string so browsers and proxies can cache and revalidate it.",
+    responses=MARKET_DATA_RESPONSES,
+)
+async def get_market_data_by_query(
+    fastapi_request: Request,
+    service: CensusServiceDep,
+    db_session: DBSessionDep,
+    job_queue: JobQueueDep,
+    address: str = Query(..., description="A full U.S. address."),
+    run_async: bool = Query(False, alias="async", description="Queue a cache miss as a job and return 202 instead of waiting."),
+    current_user: dict = Security(get_current_user),
+):
+    return await _market_data_response(fastapi_request, address, service, db_session, current_user, run_async, job_queue)
+
+@router.get(
+    "/jobs/{job_id}",
+    name="get_job",
+    response_model=JobStatus,
+    summary="Get an async market-data job",
+    description="Reports a job queued by /market-data?async=true; once it succeeds, `result` holds the market data.",
+    responses={404: {"model": ErrorResponse, "description": "No such job (or it has expired)"}},
+)
+async def get_job(
+    job_id: str,
+    job_queue: JobQueueDep,
+    current_user: dict = Security(get_current_user),
+):
+    """Returns the job's state, error or result."""
+    job = await job_queue.get(job_id) if job_queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_status(job)
+
+@router.websocket("/jobs/{job_id}/ws", name="watch_job")
+async def watch_job(
+    websocket: WebSocket,
+    job_id: str,
+    job_queue: JobQueueDep,
+    current_user: dict = Depends(get_websocket_user),
+):
+    """
+    Sends the job's state as JSON (the GET /jobs/{job_id} body) whenever it changes and
+    closes once the job has succeeded or failed.
+    """
+    await websocket.accept()
+    last_status = None
     try:
-        result = await service.get_market_data_for_address(
-            address=request.address,
-            db=db_session
-        )
-        process_time = (time.time() - start_time) * 1000
-        logger.info(f"Successfully processed request for '{request.address}' in {process_time:.2f}ms.")
-        return result
-    except HTTPException as e:
-        process_time = (time.time() - start_time) * 1000
-        logger.warning(f"HTTPException for '{request.address}': Status={e.status_code}, Detail='{e.detail}'. Processed in {process_time:.2f}ms.")
-        raise e
-    except Exception:
-        process_time = (time.time() - start_time) * 1000
-        logger.exception(f"An unexpected error occurred for '{request.address}'. Processed in {process_time:.2f}ms.")
-        raise HTTPException(status_code=500, detail="An unexpected internal error occurred.")
+        while True:
+            job = await job_queue.get(job_id) if job_queue is not None else None
+            if job is None:
+                await websocket.close(code=1008, reason="Job not found.")
+                return
+            if job.status != last_status:
+                last_status = job.status
+                await websocket.send_text(job_status(job).model_dump_json(by_alias=True))
+            if job.status in ("succeeded", "failed"):
+                await websocket.close()
+                return
+            await job_queue.wait(job_id, settings.JOB_WS_POLL_INTERVAL)
+    except WebSocketDisconnect:
+        logger.debug(f"Client stopped watching job {job_id}.")
 
 @router.get(
     "/tract-geojson",
@@ -84,11 +240,13 @@ async def get_market_data(
     summary="Get Census Tract GeoJSON Boundary",
     description="Fetches the GeoJSON polygon for a given census tract.",
     responses={
+        304: {"description": "The client's cached copy is current"},
         404: {"model": ErrorResponse, "description": "Tract not found"},
         503: {"model": ErrorResponse, "description": "External service unavailable"},
     },
 )
 async def get_tract_geojson(
+    fastapi_request: Request,
     service: CensusServiceDep,
     state: str = Query(..., description="State FIPS code"),
     county: str = Query(..., description="County FIPS code"),
@@ -99,7 +257,59 @@ async def get_tract_geojson(
     Provides the GeoJSON boundary for a specific census tract.
     """
     logger.info(f"Received /tract-geojson request for state={state}, county={county}, tract={tract}")
-    return await service.get_tract_geojson(state, county, tract)
+    # Boundary-cache hits are revalidated from the stored body's ETag without touching TIGERweb.
+    body = await service.get_tract_geojson_body(state, county, tract)
+    if is_not_modified(fastapi_request, body.etag, body.last_modified):
+        return not_modified_response(body.etag, body.last_modified, settings.BOUNDARY_MAX_AGE)
+    return body.to_response(fastapi_request, headers=cache_headers(body.etag, body.last_modified, settings.BOUNDARY_MAX_AGE))
+
+@router.get(
+    "/trade-area",
+    response_model=TradeAreaResponse,
+    summary="Get Demographics for a Radius Trade Area",
+    description="Aggregates ACS metrics over all census tracts within a radius of a point, apportioning partially covered tracts by area.",
+    responses={
+        404: {"model": ErrorResponse, "description": "No tracts or data found in the trade area"},
+        503: {"model": ErrorResponse, "description": "External service unavailable"},
+    },
+)
+async def get_trade_area(
+    service: Annotated[TradeAreaService, Depends(get_trade_area_service)],
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the trade area center"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude of the trade area center"),
+    radius_miles: float = Query(..., gt=0, le=25, description="Trade area radius in miles"),
+    current_user: dict = Security(get_current_user),
+):
+    """Returns apportioned totals and weighted medians for a radius around a point."""
+    logger.info(f"Received /trade-area request for ({lat}, {lon}) radius={radius_miles}mi")
+    return await service.get_trade_area(lat, lon, radius_miles)
+
+
+@router.get(
+    "/migration-flows",
+    response_model=MigrationFlowsResponse,
+    summary="Get County-to-County Migration Flows",
+    description="Answers ACS county-to-county migration queries from the prebuilt flows store, without contacting Census.",
+    responses={
+        404: {"model": ErrorResponse, "description": "County not in the flows store"},
+        503: {"model": ErrorResponse, "description": "Migration flows store not configured"},
+    },
+)
+async def get_migration_flows_for_county(
+    migration_flows: Annotated[Optional[MigrationFlows], Depends(get_migration_flows)],
+    state: str = Query(..., pattern=r"^\d{2}$", description="State FIPS code"),
+    county: str = Query(..., pattern=r"^\d{3}$", description="County FIPS code"),
+    limit: int = Query(10, ge=1, le=100, description="Top inbound and outbound counties to return"),
+    partner: Optional[str] = Query(None, pattern=r"^\d{5}$", description="Five-digit FIPS of a county to report the flows with"),
+    current_user: dict = Security(get_current_user),
+):
+    """Totals, top inbound/outbound counties and, optionally, the flows with one partner county."""
+    if migration_flows is None:
+        raise HTTPException(status_code=503, detail="Migration flows are not available on this server.")
+    response = migration_flows.summary(f"{state}{county}", limit, partner)
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"No migration flows for county {state}{county}.")
+    return response
 
 
 @router.get(
@@ -133,4 +343,37 @@ async def delete_cached_data(
     """Deletes a cache entry for a given address."""
     logger.info(f"Received request to delete cache for address: '{request.address}'")
     await service.delete_cache_for_address(address=request.address, db=db_session)
-    return Response(status_code=204)
\ No newline at end of file
+    return Response(status_code=204)
+
+@router.get(
+    "/census-keys/usage",
+    response_model=List[CensusKeyUsage],
+    summary="Get Census API key usage",
+    description="Reports per-key request counts, quota errors and back-off state for this worker's Census API key pool.",
+)
+async def get_census_key_usage(current_user: dict = Security(get_current_user)):
+    """Returns usage counters for each pooled Census API key."""
+    return get_census_key_pool().usage()
+
+@router.get(
+    "/compression/stats",
+    response_model=Dict[str, CompressionStats],
+    summary="Get response compression stats",
+    description="Reports compression CPU time, byte counts and precompressed-variant hits per encoding for this worker.",
+)
+async def get_compression_stats(current_user: dict = Security(get_current_user)):
+    """Returns compression counters keyed by content encoding."""
+    return compression_stats()
+
+@router.get(
+    "/overload/stats",
+    response_model=Optional[OverloadStats],
+    summary="Get overload protection state",
+    description="Reports this worker's adaptive cache-miss limit, misses in flight, latency baseline, event loop lag and shed count.",
+)
+async def get_overload_stats(
+    miss_limiter: Annotated[Optional[AdaptiveLimiter], Depends(get_miss_limiter)],
+    current_user: dict = Security(get_current_user),
+):
+    """Returns the miss limiter's state, or null when adaptive limiting is disabled."""
+    return miss_limiter.stats() if miss_limiter is not None else None
@@ -0,0 +1,252 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Optional
+
+from fastapi import HTTPException, status
+from loguru import logger
+
+from app.core.config import settings
+from app.core.tracing import span
+
+
+class AdmissionRejected(HTTPException):
+    """429 with a Retry-After (whole seconds, at least 1) telling the client when it may retry."""
+    def __init__(self, reason: str, retry_after: float):
+        self.retry_after = max(1, math.ceil(min(retry_after, 3600.0)))
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=reason,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._refilled_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)."""
+        self._refill()
+        if self._tokens >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (min(cost, self.burst) - self._tokens) / self.rate
+
+    def take(self, cost: float) -> float:
+        """Takes `cost` tokens and returns 0, or takes nothing and returns the wait time."""
+        wait = self.wait_time(cost)
+        if wait == 0.0:
+            self._tokens -= cost
+        return wait
+
+    def refund(self, cost: float) -> None:
+        self._refill()
+        self._tokens = min(self.burst, self._tokens + cost)
+
+
+@dataclass
+class _UserState:
+    bucket: TokenBucket
+    misses: int = 0
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+
+    @property
+    def idle(self) -> bool:
+        return self.misses == 0 and not self.waiters
+
+
+class AdmissionController:
+    """
+    Per-user admission for /market-data, keyed by the Firebase uid.
+
+    Every request spends tokens from the user's bucket: `hit_cost` up front, and the rest
+    of `miss_cost` only when the address turns out to be a cache miss. A miss also needs
+    one of the user's `user_max_misses` slots and one of the worker's `max_misses` slots.
+    When those are taken it waits (at most `queue_depth` per user, for `queue_timeout`
+    seconds) in a queue served round-robin across users, so one user's backlog cannot
+    delay everyone else's first miss. Anything that cannot be admitted gets a 429.
+    """
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        hit_cost: float,
+        miss_cost: float,
+        user_max_misses: int,
+        max_misses: int,
+        queue_depth: int,
+        queue_timeout: float,
+        max_users: int = 10000,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.hit_cost = hit_cost
+        self.miss_cost = miss_cost
+        self.user_max_misses = user_max_misses
+        self.max_misses = max_misses
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.max_users = max_users
+        self.misses = 0
+        self.rejected = 0
+        self._users: "OrderedDict[str, _UserState]" = OrderedDict()
+        # Users with queued misses, in the order they are next served.
+        self._ring: "OrderedDict[str, None]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            rate=settings.ADMISSION_RATE,
+            burst=settings.ADMISSION_BURST,
+            hit_cost=settings.ADMISSION_HIT_COST,
+            miss_cost=settings.ADMISSION_MISS_COST,
+            user_max_misses=settings.ADMISSION_USER_MAX_MISSES,
+            max_misses=settings.ADMISSION_MAX_MISSES,
+            queue_depth=settings.ADMISSION_QUEUE_DEPTH,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+            max_users=settings.ADMISSION_MAX_USERS,
+        )
+
+    def _user(self, user_id: str) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(TokenBucket(self.rate, self.burst))
+            if len(self._users) > self.max_users:
+                # Forget the least recently seen idle users; a forgotten user starts with a full bucket.
+                for stale in [uid for uid, s in self._users.items() if s.idle][: len(self._users) - self.max_users]:
+                    del self._users[stale]
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    def _reject(self, user_id: str, reason: str, retry_after: float) -> AdmissionRejected:
+        self.rejected += 1
+        logger.warning(f"Admission rejected for user '{user_id}': {reason} (retry after {retry_after:.1f}s).")
+        return AdmissionRejected(reason, retry_after)
+
+    def admit(self, user_id: str) -> None:
+        """Charges the up-front (cache hit) cost of a request, or raises AdmissionRejected."""
+        if self.hit_cost <= 0:
+            return
+        wait = self._user(user_id).bucket.take(self.hit_cost)
+        if wait:
+            raise self._reject(user_id, "Request rate limit exceeded.", wait)
+
+    def _can_start(self, state: _UserState) -> bool:
+        return state.misses < self.user_max_misses and self.misses < self.max_misses
+
+    def _start(self, state: _UserState) -> None:
+        state.misses += 1
+        self.misses += 1
+
+    def _dispatch(self) -> None:
+        """Grants free miss slots to queued users, one miss per user per turn."""
+        while self.misses < self.max_misses and self._ring:
+            granted = False
+            for user_id in list(self._ring):
+                state = self._users[user_id]
+                while state.waiters and state.waiters[0].done():
+                    state.waiters.popleft()
+                if not state.waiters:
+                    del self._ring[user_id]
+                    continue
+                if not self._can_start(state):
+                    continue
+                self._start(state)
+                state.waiters.popleft().set_result(None)
+                self._ring.move_to_end(user_id)
+                granted = True
+                break
+            if not granted:
+                return
+
+    def _release(self, state: _UserState) -> None:
+        state.misses -= 1
+        self.misses -= 1
+        self._dispatch()
+
+    async def _acquire(self, user_id: str, state: _UserState) -> None:
+        if not self._ring and self._can_start(state):
+            self._start(state)
+            return
+        if len(state.waiters) >= self.queue_depth:
+            raise self._reject(user_id, "Too many uncached requests in progress.", self._retry_after(state))
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        self._ring.setdefault(user_id, None)
+        self._dispatch()
+        try:
+            with span("admission.queue", user=user_id):
+                await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._forget(user_id, state, future)
+            raise self._reject(user_id, "Too many uncached requests in progress.", self._retry_after(state))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the client went away; hand the slot on.
+                self._release(state)
+            else:
+                self._forget(user_id, state, future)
+            raise
+
+    def _forget(self, user_id: str, state: _UserState, future: asyncio.Future) -> None:
+        if future in state.waiters:
+            state.waiters.remove(future)
+        if not state.waiters:
+            self._ring.pop(user_id, None)
+
+    def _retry_after(self, state: _UserState) -> float:
+        # Roughly when a miss would both be affordable and find a slot; a queue timeout
+        # means slots were busy for at least that long.
+        return max(state.bucket.wait_time(self.miss_cost), self.queue_timeout)
+
+    @property
+    def miss_extra_cost(self) -> float:
+        """What a miss costs beyond the up-front hit cost."""
+        return max(0.0, self.miss_cost - max(0.0, self.hit_cost))
+
+    def charge_miss(self, user_id: str) -> float:
+        """Charges the rest of a miss's cost (beyond the hit cost) and returns it, or raises AdmissionRejected."""
+        extra = self.miss_extra_cost
+        wait = self._user(user_id).bucket.take(extra) if extra else 0.0
+        if wait:
+            raise self._reject(user_id, "Uncached request rate limit exceeded.", wait)
+        return extra
+
+    @asynccontextmanager
+    async def miss(self, user_id: Optional[str]) -> AsyncIterator[None]:
+        """Holds a miss slot for the block, charging the rest of the miss cost on entry."""
+        if user_id is None:
+            yield
+            return
+        extra = self.charge_miss(user_id)
+        state = self._user(user_id)
+        try:
+            await self._acquire(user_id, state)
+        except AdmissionRejected:
+            # Not served, so not charged for the miss.
+            state.bucket.refund(extra)
+            raise
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    def refund_miss(self, user_id: Optional[str]) -> None:
+        """Returns the miss cost of an admitted miss that was then shed without being served."""
+        if user_id is not None:
+            self._user(user_id).bucket.refund(self.miss_extra_cost)
@@ -0,0 +1,124 @@
+import datetime
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+
+def _utc_day() -> datetime.date:
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+@dataclass
+class CensusKey:
+    """One API key and its usage counters."""
+    key: str
+    label: str
+    day: datetime.date
+    requests_today: int = 0
+    total_requests: int = 0
+    quota_errors: int = 0
+    consecutive_quota_errors: int = 0
+    backoff_until: float = 0.0
+
+    def roll_day(self, today: datetime.date) -> None:
+        if self.day != today:
+            self.day, self.requests_today = today, 0
+
+    def usage(self, daily_quota: Optional[int]) -> Dict[str, Any]:
+        remaining_backoff = max(0.0, self.backoff_until - time.monotonic())
+        return {
+            "key": self.label,
+            "requests_today": self.requests_today,
+            "daily_quota": daily_quota,
+            "total_requests": self.total_requests,
+            "quota_errors": self.quota_errors,
+            "backed_off_seconds": round(remaining_backoff, 1),
+        }
+
+
+class CensusKeyPool:
+    """
+    Spreads Census API requests over several keys.
+    Each request goes to the available key with the fewest requests today. A key that
+    answers with a quota error (HTTP 429, or the Census API's HTML "limit"/"invalid key"
+    pages) is backed off exponentially and the error surfaces as an HTTPStatusError,
+    so the callers' retry policies move on to another key. Counters are per process;
+    set CENSUS_KEY_DAILY_QUOTA to each worker's share of a key's daily quota.
+    """
+    def __init__(self, keys: List[str], daily_quota: Optional[int], backoff_base: float, backoff_max: float):
+        if not keys:
+            raise ValueError("At least one Census API key is required.")
+        today = _utc_day()
+        self.keys = [CensusKey(key, f"key{i + 1}…{key[-4:]}", today) for i, key in enumerate(keys)]
+        self.daily_quota = daily_quota
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_settings(cls) -> "CensusKeyPool":
+        keys = list(dict.fromkeys([settings.CENSUS_API_KEY, *settings.CENSUS_API_EXTRA_KEYS]))
+        return cls(keys, settings.CENSUS_KEY_DAILY_QUOTA, settings.CENSUS_KEY_BACKOFF_SECONDS, settings.CENSUS_KEY_BACKOFF_MAX_SECONDS)
+
+    def acquire(self) -> CensusKey:
+        today, now = _utc_day(), time.monotonic()
+        for key in self.keys:
+            key.roll_day(today)
+        available = [
+            k for k in self.keys
+            if k.backoff_until <= now and (self.daily_quota is None or k.requests_today < self.daily_quota)
+        ]
+        if available:
+            chosen = min(available, key=lambda k: k.requests_today)
+        else:
+            # Every key is exhausted or backed off: use the one that recovers first rather than failing outright.
+            chosen = min(self.keys, key=lambda k: (k.backoff_until, k.requests_today))
+            logger.warning(f"All Census API keys are exhausted or backed off; using {chosen.label}.")
+        chosen.requests_today += 1
+        chosen.total_requests += 1
+        return chosen
+
+    @staticmethod
+    def _is_quota_error(response: httpx.Response) -> bool:
+        if response.status_code == 429:
+            return True
+        if "json" in response.headers.get("content-type", ""):
+            return False
+        body = response.text[:2000].lower()
+        return "limit" in body or "invalid key" in body
+
+    def _back_off(self, key: CensusKey) -> None:
+        key.quota_errors += 1
+        key.consecutive_quota_errors += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (key.consecutive_quota_errors - 1))
+        key.backoff_until = time.monotonic() + delay
+        logger.warning(f"Census API key {key.label} hit its quota; backing off for {delay:.0f}s.")
+
+    async def get(self, http_client: Any, url: str, params: Dict[str, Any], **kwargs: Any) -> httpx.Response:
+        """Sends a GET with a pooled key; raises HTTPStatusError when the key is over quota."""
+        key = self.acquire()
+        response = await http_client.get(url, params={**params, "key": key.key}, **kwargs)
+        if self._is_quota_error(response):
+            self._back_off(key)
+            raise httpx.HTTPStatusError(
+                f"Census API key {key.label} is over quota", request=response.request, response=response
+            )
+        key.consecutive_quota_errors = 0
+        return response
+
+    def usage(self) -> List[Dict[str, Any]]:
+        today = _utc_day()
+        for key in self.keys:
+            key.roll_day(today)
+        return [key.usage(self.daily_quota) for key in self.keys]
+
+
+@lru_cache()
+def get_census_key_pool() -> CensusKeyPool:
+    """The process-wide key pool, shared by every Census API caller."""
+    return CensusKeyPool.from_settings()
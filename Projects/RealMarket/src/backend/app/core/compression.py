@@ -0,0 +1,151 @@
+import datetime
+import gzip
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.http_caching import content_etag
+from app.core.tracing import span
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; negotiation falls back to gzip.
+    brotli = None
+
+# Preferred first when the client accepts several with equal weight.
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+@dataclass
+class EncodingStats:
+    compressions: int = 0
+    cpu_seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    precompressed_hits: int = 0
+
+
+_stats: Dict[str, EncodingStats] = {encoding: EncodingStats() for encoding in SUPPORTED_ENCODINGS}
+_stats_lock = threading.Lock()
+
+
+def compression_stats() -> Dict[str, Dict[str, float]]:
+    """Per-encoding counters for this worker since startup."""
+    with _stats_lock:
+        return {
+            encoding: {
+                "compressions": s.compressions,
+                "cpu_ms": round(s.cpu_seconds * 1000, 1),
+                "bytes_in": s.bytes_in,
+                "bytes_out": s.bytes_out,
+                "ratio": round(s.bytes_out / s.bytes_in, 3) if s.bytes_in else None,
+                "precompressed_hits": s.precompressed_hits,
+            }
+            for encoding, s in _stats.items()
+        }
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks the best supported encoding from an Accept-Encoding header, or None for identity."""
+    if not accept_encoding or not settings.COMPRESSION_ENABLED:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compresses `data`, recording the CPU time in the stats and the current trace."""
+    with span("compress", encoding=encoding, bytes_in=len(data)):
+        started = time.thread_time()
+        if encoding == "br":
+            output = brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            output = gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+        elapsed = time.thread_time() - started
+    with _stats_lock:
+        stats = _stats[encoding]
+        stats.compressions += 1
+        stats.cpu_seconds += elapsed
+        stats.bytes_in += len(data)
+        stats.bytes_out += len(output)
+    return output
+
+
+class EncodedBody:
+    """
+    A serialized response body plus its compressed variants and HTTP validators.
+    Variants are built on first use and kept on the object, so a body held in a cache
+    is compressed at most once per encoding however many times it is served.
+    """
+    def __init__(
+        self,
+        identity: bytes,
+        variants: Optional[Dict[str, bytes]] = None,
+        media_type: str = "application/json",
+        etag: Optional[str] = None,
+        last_modified: Optional[datetime.datetime] = None,
+        etag_version: str = "",
+    ):
+        self.identity = identity
+        self.etag_version = etag_version
+        self.media_type = media_type
+        self._variants: Dict[str, bytes] = dict(variants or {})
+        self._etag = etag
+        self.last_modified = last_modified or datetime.datetime.now(datetime.timezone.utc)
+
+    @classmethod
+    def from_model(cls, model: BaseModel, variants: Optional[Dict[str, bytes]] = None, **kwargs) -> "EncodedBody":
+        # by_alias matches what FastAPI's response_model serialization would send.
+        return cls(model.model_dump_json(by_alias=True).encode(), variants, **kwargs)
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = content_etag(self.identity, self.etag_version)
+        return self._etag
+
+    def ensure(self, encoding: str) -> bytes:
+        """The variant for `encoding`, compressing it now if it does not exist yet."""
+        if encoding not in self._variants:
+            self._variants[encoding] = compress(self.identity, encoding)
+        return self._variants[encoding]
+
+    def variant(self, encoding: str) -> bytes:
+        """Like `ensure`, but counts reuse of an existing variant as a precompressed hit."""
+        if encoding in self._variants:
+            with _stats_lock:
+                _stats[encoding].precompressed_hits += 1
+            return self._variants[encoding]
+        return self.ensure(encoding)
+
+    def to_response(self, request: Request, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Serves the best variant the client accepts; small bodies are always sent as-is."""
+        headers = {"Vary": "Accept-Encoding", **(headers or {})}
+        encoding = None
+        if len(self.identity) >= settings.COMPRESSION_MIN_BYTES:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is None:
+            return Response(self.identity, status_code=status_code, media_type=self.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(self.variant(encoding), status_code=status_code, media_type=self.media_type, headers=headers)
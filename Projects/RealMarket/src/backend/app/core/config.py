@@ -1,6 +1,7 @@
 import base64
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Dict, List, Literal
 from loguru import logger
 
 class Settings(BaseSettings):
@@ -12,22 +13,225 @@ class Settings(BaseSettings):
 
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
+    # Production logging: JSON lines, a non-blocking enqueued sink, and per-class
+    # sampling / rate limits (keys are "module:function" or a module prefix).
+    LOG_JSON: bool = False
+    LOG_ENQUEUE: bool = False
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    LOG_RATE_LIMITS: Dict[str, float] = {}
 
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_HOST: str
     POSTGRES_PORT: int
     POSTGRES_DB: str
+    # Optional read replica. When set, cache reads are routed here and writes go to the primary.
+    POSTGRES_READ_HOST: str | None = None
+    POSTGRES_READ_PORT: int | None = None
+
+    # --- Database Pool ---
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    # Connections are recycled before server/proxy idle timeouts can kill them, which
+    # makes a pre-ping round-trip on every checkout unnecessary in most deployments.
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    # SQLAlchemy's per-connection prepared statement cache and asyncpg's own statement cache.
+    # Set both to 0 when running behind PgBouncer in transaction pooling mode.
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    DB_ASYNCPG_STATEMENT_CACHE_SIZE: int = 100
+
+    # --- Cache Write-Behind ---
+    # Cache saves are queued and upserted in batches by a background task instead of
+    # inside the request. Pending entries are flushed on shutdown.
+    CACHE_WRITE_BEHIND_ENABLED: bool = True
+    CACHE_WRITE_BATCH_SIZE: int = 50
+    CACHE_WRITE_FLUSH_INTERVAL: float = 0.05
+    CACHE_WRITE_QUEUE_SIZE: int = 1000
+
+    # --- In-Process Cache Tier ---
+    # Per-worker LRU in front of Postgres. Workers keep each other's copies coherent
+    # through Postgres LISTEN/NOTIFY on CACHE_INVALIDATION_CHANNEL.
+    LOCAL_CACHE_ENABLED: bool = True
+    LOCAL_CACHE_MAX_ENTRIES: int = 2000
+    LOCAL_CACHE_TTL: float = 300.0
+    CACHE_INVALIDATION_CHANNEL: str = "population_cache_invalidation"
+
+    # --- Response Compression ---
+    # /market-data and /tract-geojson negotiate br/gzip via Accept-Encoding. Compressed
+    # variants are kept with cache entries (gzip is also stored in Postgres), so hits
+    # are not recompressed. Bodies under COMPRESSION_MIN_BYTES are sent uncompressed.
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    # Per-worker cache of serialized tract boundaries (and their compressed variants).
+    BOUNDARY_CACHE_MAX_ENTRIES: int = 5000
+    BOUNDARY_CACHE_TTL: float = 86400.0
+
+    # --- HTTP Caching ---
+    # max-age sent with ETag/Last-Modified on /market-data and /tract-geojson. Clients
+    # revalidate with If-None-Match afterwards and get a 304 if nothing changed.
+    MARKET_DATA_MAX_AGE: int = 300
+    BOUNDARY_MAX_AGE: int = 86400
+
+    # --- Bulk Geocoding ---
+    # GeocodingService.geocode_addresses sends address lists through the Census
+    # addressbatch CSV geocoder (max 10,000 per file); unmatched ones are geocoded one
+    # by one (Census one-line geocoder, then Nominatim). A chunk that still fails after
+    # GEOCODER_BATCH_ATTEMPTS is reported, not geocoded address by address.
+    GEOCODER_BATCH_SIZE: int = 1000
+    GEOCODER_BATCH_CONCURRENCY: int = 4
+    GEOCODER_BATCH_TIMEOUT: float = 600.0
+    GEOCODER_BATCH_ATTEMPTS: int = 3
+    GEOCODER_FALLBACK_CONCURRENCY: int = 4
+
+    # --- ACS Micro-Batching ---
+    # Single-tract ACS requests arriving within the window for the same year, endpoint,
+    # county and variables are merged into one `for=tract:a,b,...` call.
+    ACS_BATCH_ENABLED: bool = True
+    ACS_BATCH_WINDOW_MS: float = 10.0
+    ACS_BATCH_MAX_TRACTS: int = 50
+
+    # --- Projections ---
+    # Model used for tract population projections: county_growth (mean county growth
+    # factor), cagr, linear, log_linear or county_share. Bands use PROJECTION_CONFIDENCE
+    # (0.8, 0.9 or 0.95).
+    PROJECTION_MODEL: Literal["county_growth", "cagr", "linear", "log_linear", "county_share"] = "county_growth"
+    PROJECTION_HORIZON_YEARS: int = 3
+    PROJECTION_CONFIDENCE: float = 0.90
+
+    # --- County Percentiles ---
+    # Within-county ranks are precomputed by `python -m app.jobs.county_percentiles`
+    # and attached to /market-data responses. Decoded county tables are kept per worker.
+    COUNTY_PERCENTILES_ENABLED: bool = True
+    PERCENTILE_CACHE_MAX_COUNTIES: int = 500
+    PERCENTILE_CACHE_TTL: float = 3600.0
+
+    # --- National Tract Matrix ---
+    # Directory built by `python -m app.jobs.tract_matrix`. Workers memory-map it read-only
+    # and serve the latest-year ACS sections from it; unset to always fetch upstream.
+    TRACT_MATRIX_PATH: str | None = None
+    # Tract adjacency graph built by `python -m app.jobs.tract_adjacency`. With the tract
+    # matrix, /market-data compares the tract with the tracts sharing its boundary.
+    TRACT_ADJACENCY_PATH: str | None = None
+
+    # --- County Migration Flows ---
+    # Directory built by `python -m app.jobs.migration_flows`. Workers memory-map it and serve
+    # county migration totals, the top MIGRATION_TOP_COUNTIES inbound/outbound counties and
+    # /migration-flows from it; unset to fetch county totals upstream on every miss.
+    MIGRATION_FLOWS_PATH: str | None = None
+    MIGRATION_TOP_COUNTIES: int = 5
+
+    # --- Admission Control ---
+    # Per-user limits on /market-data, keyed by Firebase uid. Each user's token bucket
+    # refills at ADMISSION_RATE/s up to ADMISSION_BURST; a cache hit costs ADMISSION_HIT_COST
+    # (0 exempts hits) and a miss ADMISSION_MISS_COST in total. Misses also need one of the
+    # user's and one of the worker's miss slots, waiting briefly in a round-robin queue.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_RATE: float = 1.0
+    ADMISSION_BURST: float = 30.0
+    ADMISSION_HIT_COST: float = 0.1
+    ADMISSION_MISS_COST: float = 1.0
+    ADMISSION_USER_MAX_MISSES: int = 4
+    ADMISSION_MAX_MISSES: int = 32
+    ADMISSION_QUEUE_DEPTH: int = 8
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    ADMISSION_MAX_USERS: int = 10000
+
+    # --- Overload Protection ---
+    # Cache misses are capped by an AIMD limit that shrinks when misses take longer than
+    # ADAPTIVE_LIMIT_TOLERANCE x their unloaded latency (or fail) and grows while they don't.
+    # New misses beyond the limit, or while event loop lag exceeds LOOP_LAG_THRESHOLD
+    # seconds, get an immediate 503; cache hits are always served.
+    ADAPTIVE_LIMIT_ENABLED: bool = True
+    ADAPTIVE_LIMIT_INITIAL: int = 20
+    ADAPTIVE_LIMIT_MIN: int = 2
+    ADAPTIVE_LIMIT_MAX: int = 200
+    ADAPTIVE_LIMIT_BACKOFF: float = 0.8
+    ADAPTIVE_LIMIT_TOLERANCE: float = 2.0
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_LAG_THRESHOLD: float = 0.25
+
+    # --- Async Jobs ---
+    # /market-data?async=true answers cache misses with 202 and a job id. Jobs are stored
+    # in market_data_jobs and run by JOB_WORKERS tasks per process; a running job whose
+    # heartbeat is older than JOB_STALE_AFTER seconds is picked up by another worker.
+    JOBS_ENABLED: bool = True
+    JOB_WORKERS: int = 4
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_HEARTBEAT_INTERVAL: float = 10.0
+    JOB_STALE_AFTER: float = 60.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_DELAY: float = 5.0
+    JOB_RETENTION: float = 86400.0
+    # How often a job WebSocket re-reads a job that another process is running.
+    JOB_WS_POLL_INTERVAL: float = 1.0
 
     CENSUS_API_KEY: str
+    # Additional keys pooled with CENSUS_API_KEY (JSON list). Requests are spread across
+    # keys; a key returning quota errors is backed off exponentially.
+    CENSUS_API_EXTRA_KEYS: List[str] = []
+    CENSUS_KEY_DAILY_QUOTA: int | None = None
+    CENSUS_KEY_BACKOFF_SECONDS: float = 60.0
+    CENSUS_KEY_BACKOFF_MAX_SECONDS: float = 3600.0
     GEOCODING_API_KEY: str | None = None
     WALKSCORE_API_KEY: str | None = None # Add this line
 
+    # --- Upstream Base URLs ---
+    # Overridable so the app can run against a local stand-in (see benchmarks/).
+    CENSUS_API_BASE_URL: str = "https://api.census.gov"
+    CENSUS_GEOCODER_BASE_URL: str = "https://geocoding.geo.census.gov"
+    NOMINATIM_BASE_URL: str = "https://nominatim.openstreetmap.org"
+    WALKSCORE_BASE_URL: str = "https://api.walkscore.com"
+    TIGERWEB_BASE_URL: str = "https://tigerweb.geo.census.gov"
+
+    # --- Upstream HTTP Transport ---
+    # 'record' archives every upstream exchange to HTTP_ARCHIVE_PATH; 'replay' serves
+    # them back without network access (optionally with the recorded latency).
+    HTTP_TRANSPORT_MODE: Literal["live", "record", "replay"] = "live"
+    HTTP_ARCHIVE_PATH: str = "http_archive.jsonl"
+    HTTP_REPLAY_SIMULATE_LATENCY: bool = False
+
+    # --- Upstream HTTP Clients ---
+    # Each upstream host gets its own pooled client (see app/core/upstream_clients.py).
+    # Per-host pool/timeout/admission defaults can be overridden by name, e.g.
+    # {"census_api": {"max_connections": 80, "read_timeout": 15}, "nominatim": {"rate_limit": 1}}.
+    UPSTREAM_CLIENT_OVERRIDES: Dict[str, Dict[str, float | int | bool]] = {}
+    CENSUS_API_HTTP2: bool = True
+    UPSTREAM_DNS_CACHE_TTL: float = 300.0
+    UPSTREAM_WARM_CONNECTIONS: int = 2
+    UPSTREAM_WARM_TIMEOUT: float = 5.0
+    # Share of each upstream's in-flight slots that background work may occupy.
+    # Background calls also wait whenever an interactive call is queued.
+    UPSTREAM_BACKGROUND_SHARE: float = 0.5
+    # In-flight background calls per upstream across every process (API workers running
+    # async jobs and each CLI job), held as Postgres advisory locks. Off (0) unless set.
+    # Each process opens up to this many extra connections outside DB_POOL_SIZE, and one
+    # /market-data job alone makes 10+ Census calls, so size it above a single job's fan-out.
+    UPSTREAM_SHARED_BACKGROUND_SLOTS: int = 0
+
+    # --- Tracing ---
+    # Per-request spans are summarized in the Server-Timing header.
+    # Full span trees can optionally be exported to a JSON-lines file or a collector URL.
+    TRACE_ENABLED: bool = True
+    TRACE_EXPORT_FILE: str | None = None
+    TRACE_COLLECTOR_URL: str | None = None
+
     @property
     def DATABASE_URL(self) -> str:
         """Constructs the full SQLAlchemy async database URL."""
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def DATABASE_READ_URL(self) -> str | None:
+        """Constructs the read replica URL, or None when no replica is configured."""
+        if not self.POSTGRES_READ_HOST:
+            return None
+        port = self.POSTGRES_READ_PORT or self.POSTGRES_PORT
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_READ_HOST}:{port}/{self.POSTGRES_DB}"
+
     @property
     def FIREBASE_SERVICE_ACCOUNT_JSON(self) -> str | None:
         """Decodes the base64 encoded service account."""
@@ -1,6 +1,4 @@
 import json
-import firebase_admin
-from firebase_admin import credentials
 from loguru import logger
 from app.core.config import settings
 
@@ -13,6 +11,11 @@ def initialize_firebase():
         logger.warning("FIREBASE_SERVICE_ACCOUNT_BASE64 not set. Firebase Admin SDK not initialized. API will not be protected.")
         return
 
+    # firebase_admin pulls in google-auth and requests; imported here so it stays out of import time.
+    import firebase_admin
+    import firebase_admin.auth  # noqa: F401 -- preloaded for get_current_user
+    from firebase_admin import credentials
+
     try:
         service_account_info = json.loads(service_account_json_str)
         cred = credentials.Certificate(service_account_info)
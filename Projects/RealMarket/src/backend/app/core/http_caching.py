@@ -0,0 +1,69 @@
+import datetime
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+
+def content_etag(data: bytes, version: str = "") -> str:
+    """
+    A weak ETag over the uncompressed body. Weak because gzip and br variants of the
+    same body are semantically equal and should revalidate against the same tag.
+    A `version` is appended after a dot, so it can be checked without the body.
+    """
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f'W/"{digest}.{version}"' if version else f'W/"{digest}"'
+
+
+def etag_version(etag: str) -> str:
+    """The version part of a `content_etag` ('' if it has none)."""
+    return _opaque(etag).strip('"').partition(".")[2]
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime.datetime]) -> bool:
+    """
+    Evaluates If-None-Match (weak comparison) or, when absent, If-Modified-Since
+    against the entry's validators, as a cache would per RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        tags = [t for t in if_none_match.split(",") if t.strip()]
+        return any(t.strip() == "*" or _opaque(t) == _opaque(etag) for t in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        # HTTP dates have one-second resolution.
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def cache_headers(etag: Optional[str], last_modified: Optional[datetime.datetime], max_age: int) -> Dict[str, str]:
+    """ETag, Last-Modified and Cache-Control for an authenticated (private) response."""
+    headers = {"Cache-Control": f"private, max-age={max_age}, must-revalidate"}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(datetime.timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified_response(etag: Optional[str], last_modified: Optional[datetime.datetime], max_age: int) -> Response:
+    return Response(status_code=304, headers={"Vary": "Accept-Encoding", **cache_headers(etag, last_modified, max_age)})
@@ -0,0 +1,142 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+# Credentials are stripped from archived URLs and ignored when matching,
+# so archives can be shared and replayed with any key configured.
+REDACTED_PARAMS = {"key", "wsapikey"}
+
+# Every upstream client appends to the same archive file, possibly from several threads.
+_ARCHIVE_LOCK = threading.Lock()
+
+
+def _request_key(method: str, url: httpx.URL) -> str:
+    """A stable identity for a request: method + URL with sorted, redacted query params."""
+    params = sorted(
+        (k, "REDACTED" if k in REDACTED_PARAMS else v) for k, v in url.params.multi_items()
+    )
+    query = "&".join(f"{k}={v}" for k, v in params)
+    base = str(url.copy_with(query=None))
+    return f"{method} {base}?{query}" if query else f"{method} {base}"
+
+
+class HttpArchive:
+    """An append-only JSON-lines archive of upstream request/response pairs."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append(self, request: httpx.Request, response: httpx.Response, body: bytes, elapsed_ms: float) -> None:
+        entry = {
+            "key": _request_key(request.method, request.url),
+            "status_code": response.status_code,
+            "headers": [[k, v] for k, v in response.headers.multi_items()],
+            "body_b64": base64.b64encode(body).decode("ascii"),
+            "elapsed_ms": round(elapsed_ms, 3),
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(entry)
+        with _ARCHIVE_LOCK, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def load(self) -> Dict[str, List[dict]]:
+        entries: Dict[str, List[dict]] = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.setdefault(entry["key"], []).append(entry)
+        return entries
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards requests to the real transport and archives every exchange."""
+
+    def __init__(self, archive: HttpArchive, wrapped: Optional[httpx.AsyncBaseTransport] = None):
+        self.archive = archive
+        self.wrapped = wrapped or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.wrapped.handle_async_request(request)
+        try:
+            # Raw (still content-encoded) bytes, so replay hands the client exactly what the upstream sent.
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        await asyncio.to_thread(self.archive.append, request, response, body, elapsed_ms)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            content=body,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.wrapped.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves archived responses without touching the network.
+    Repeated requests for the same key are answered in recorded order; once the
+    recordings for a key are exhausted the last one is repeated.
+    """
+
+    def __init__(self, archive: HttpArchive, simulate_latency: bool = False):
+        self.entries = archive.load()
+        self.simulate_latency = simulate_latency
+        self._cursors: Dict[str, int] = {}
+        logger.info(f"Loaded {sum(len(v) for v in self.entries.values())} recorded responses from '{archive.path}'.")
+
+    def _next_entry(self, key: str) -> Optional[dict]:
+        recorded = self.entries.get(key)
+        if not recorded:
+            return None
+        index = self._cursors.get(key, 0)
+        self._cursors[key] = index + 1
+        return recorded[min(index, len(recorded) - 1)]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = _request_key(request.method, request.url)
+        entry = self._next_entry(key)
+        if entry is None:
+            logger.warning(f"No recorded response for '{key}'.")
+            raise httpx.ConnectError(f"No recorded response for {key}", request=request)
+        if self.simulate_latency:
+            await asyncio.sleep(entry["elapsed_ms"] / 1000)
+        return httpx.Response(
+            status_code=entry["status_code"],
+            headers=entry["headers"],
+            content=base64.b64decode(entry["body_b64"]),
+        )
+
+
+def build_transport(wrapped: Optional[httpx.AsyncBaseTransport] = None) -> Optional[httpx.AsyncBaseTransport]:
+    """
+    Returns the transport for upstream clients according to HTTP_TRANSPORT_MODE:
+    'live' (None, i.e. the httpx default or `wrapped`), 'record' or 'replay'.
+    """
+    mode = settings.HTTP_TRANSPORT_MODE
+    if mode == "live":
+        return wrapped
+    archive = HttpArchive(settings.HTTP_ARCHIVE_PATH)
+    if mode == "record":
+        logger.warning(f"HTTP record mode: upstream exchanges are archived to '{archive.path}'.")
+        return RecordingTransport(archive, wrapped)
+    if mode == "replay":
+        logger.warning(f"HTTP replay mode: upstream responses are served from '{archive.path}', no network access.")
+        return ReplayTransport(archive, simulate_latency=settings.HTTP_REPLAY_SIMULATE_LATENCY)
+    raise ValueError(f"Unsupported HTTP_TRANSPORT_MODE: {mode}")
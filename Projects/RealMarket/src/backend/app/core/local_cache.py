@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LocalCache(Generic[V]):
+    """
+    A small in-process LRU cache with a per-entry TTL.
+    Each uvicorn worker has its own copy, so entries are kept coherent across
+    workers by the cache invalidation bus (see app/services/cache_invalidation.py).
+    """
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def delete_many(self, keys: Iterable[Hashable]) -> int:
+        return sum(1 for key in keys if self.delete(key))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
@@ -1,64 +1,131 @@
-import logging
-import sys
-
-from loguru import logger
-
-from app.core.config import settings
-
-class InterceptHandler(logging.Handler):
-    """
-    Default handler from loguru documentation.
-    This handler intercepts standard logging messages and redirects them to Loguru.
-    See: https://loguru.readthedocs.io/en/stable/overview.html#entirely-compatible-with-standard-logging
-    """
-
-    def emit(self, record: logging.LogRecord):
-        # Get corresponding Loguru level if it exists
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame and frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
-
-        logger.opt(depth=depth, exception=record.exc_info).log(
-            level, record.getMessage()
-        )
-
-def setup_logging():
-    """
-    Configures the Loguru logger and intercepts standard logging.
-    This function should be called once at application startup.
-    """
-    # Disable existing handlers from other libraries to avoid duplicate logs
-    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
-    
-    # Remove the default loguru handler to add our custom one
-    logger.remove()
-
-    # Add a new handler with a rich, colorful format for better readability
-    log_format = (
-        "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
-        "<level>{level: <8}</level> | "
-        "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
-        "<level>{message}</level>"
-    )
-    
-    # Configure the logger sink to output to stderr
-    # In development, we enable backtrace and diagnose for richer error reports.
-    logger.add(
-        sys.stderr,
-        level=settings.LOG_LEVEL.upper(),
-        format=log_format,
-        colorize=True,
-        backtrace=settings.ENVIRONMENT == "development",
-        diagnose=settings.ENVIRONMENT == "development",
-    )
-
-    logger.info("--- Logging configured successfully ---")
-    logger.info(f"Log level set to: {settings.LOG_LEVEL.upper()}")
-    logger.info(f"Running in '{settings.ENVIRONMENT}' environment.")
\ No newline at end of file
+import logging
+import math
+import sys
+import time
+from typing import Dict, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+
+class InterceptHandler(logging.Handler):
+    """
+    Default handler from loguru documentation.
+    This handler intercepts standard logging messages and redirects them to Loguru.
+    See: https://loguru.readthedocs.io/en/stable/overview.html#entirely-compatible-with-standard-logging
+    """
+
+    def emit(self, record: logging.LogRecord):
+        # Get corresponding Loguru level if it exists
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+
+        # Find caller from where originated the logged message
+        frame, depth = logging.currentframe(), 2
+        while frame and frame.f_code.co_filename == logging.__file__:
+            frame = frame.f_back
+            depth += 1
+
+        logger.opt(depth=depth, exception=record.exc_info).log(
+            level, record.getMessage()
+        )
+
+class HotPathSampler:
+    """
+    Loguru filter that samples or rate limits chatty log lines per message class.
+    A message class is the emitting `module:function` (or an explicit `log_class`
+    bound via `logger.bind`). Rules can target a full class or a module prefix.
+    WARNING and above always pass so errors are never dropped.
+    """
+    def __init__(self, sample_rates: Dict[str, float], rate_limits: Dict[str, float]):
+        self.sample_rates = sample_rates
+        self.rate_limits = rate_limits
+        self._seen: Dict[str, int] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._always_keep_level = logger.level("WARNING").no
+
+    def _match(self, rules: Dict[str, float], log_class: str, module: str) -> float | None:
+        if log_class in rules:
+            return rules[log_class]
+        # Longest module prefix wins, e.g. "app.services" matches "app.services.cache_manager".
+        for prefix in sorted(rules, key=len, reverse=True):
+            if module == prefix or module.startswith(prefix + "."):
+                return rules[prefix]
+        return None
+
+    def _sampled(self, log_class: str, rate: float) -> bool:
+        # Deterministic 1-in-N sampling: keeps exactly `rate` of the messages.
+        n = self._seen.get(log_class, 0)
+        self._seen[log_class] = n + 1
+        return math.floor((n + 1) * rate) > math.floor(n * rate)
+
+    def _within_rate(self, log_class: str, per_second: float) -> bool:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(log_class, (per_second, now))
+        tokens = min(per_second, tokens + (now - last) * per_second)
+        if tokens < 1:
+            self._buckets[log_class] = (tokens, now)
+            return False
+        self._buckets[log_class] = (tokens - 1, now)
+        return True
+
+    def __call__(self, record) -> bool:
+        if record["level"].no >= self._always_keep_level:
+            return True
+        module = record["name"] or ""
+        log_class = record["extra"].get("log_class") or f"{module}:{record['function']}"
+
+        rate = self._match(self.sample_rates, log_class, module)
+        if rate is not None and not self._sampled(log_class, rate):
+            return False
+        limit = self._match(self.rate_limits, log_class, module)
+        if limit is not None and not self._within_rate(log_class, limit):
+            return False
+        return True
+
+def setup_logging():
+    """
+    Configures the Loguru logger and intercepts standard logging.
+    This function should be called once at application startup.
+    """
+    # Disable existing handlers from other libraries to avoid duplicate logs
+    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
+    
+    # Remove the default loguru handler to add our custom one
+    logger.remove()
+
+    # Add a new handler with a rich, colorful format for better readability
+    log_format = (
+        "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
+        "<level>{level: <8}</level> | "
+        "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+        "<level>{message}</level>"
+    )
+    
+    sampler = None
+    if settings.LOG_SAMPLE_RATES or settings.LOG_RATE_LIMITS:
+        sampler = HotPathSampler(settings.LOG_SAMPLE_RATES, settings.LOG_RATE_LIMITS)
+
+    # Configure the logger sink to output to stderr
+    # In development, we enable backtrace and diagnose for richer error reports.
+    # In production, LOG_JSON emits one JSON object per line. With LOG_ENQUEUE the record is
+    # still formatted (and serialized) in the calling thread; only the write to stderr is
+    # queued to a background thread, so the event loop never blocks on a slow stderr.
+    logger.add(
+        sys.stderr,
+        level=settings.LOG_LEVEL.upper(),
+        format="{message}" if settings.LOG_JSON else log_format,
+        serialize=settings.LOG_JSON,
+        colorize=not settings.LOG_JSON,
+        enqueue=settings.LOG_ENQUEUE,
+        filter=sampler,
+        backtrace=settings.ENVIRONMENT == "development",
+        diagnose=settings.ENVIRONMENT == "development",
+    )
+
+    logger.info("--- Logging configured successfully ---")
+    logger.info(f"Log level set to: {settings.LOG_LEVEL.upper()}")
+    logger.info(f"Running in '{settings.ENVIRONMENT}' environment.")
+    logger.info(f"Log output: json={settings.LOG_JSON}, enqueue={settings.LOG_ENQUEUE}, sampled={sampler is not None}")
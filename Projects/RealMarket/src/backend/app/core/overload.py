@@ -0,0 +1,169 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException, status
+from loguru import logger
+
+from app.core.config import settings
+
+
+class Overloaded(HTTPException):
+    """Fast 503 for cold work shed under overload; cache hits are still served."""
+    def __init__(self, reason: str, retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=reason,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes a periodic sleep. Lag rises when the loop
+    is saturated (too many coroutines, CPU-bound work, GC), long before requests time out.
+    Rises are taken at once and decay gradually, so one quiet tick does not end shedding.
+    """
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "EventLoopLagMonitor":
+        return cls(settings.LOOP_LAG_INTERVAL, settings.LOOP_LAG_THRESHOLD)
+
+    @property
+    def overloaded(self) -> bool:
+        return self.lag > self.threshold
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            was_overloaded = self.overloaded
+            self.lag = lag if lag > self.lag else 0.7 * self.lag + 0.3 * lag
+            if self.overloaded != was_overloaded:
+                if self.overloaded:
+                    logger.warning(f"Event loop lag {self.lag * 1000:.0f}ms is over {self.threshold * 1000:.0f}ms; shedding new cold requests.")
+                else:
+                    logger.info(f"Event loop lag back to {self.lag * 1000:.0f}ms; no longer shedding.")
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="event-loop-lag-monitor")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for cache misses, driven by how long misses take.
+
+    The baseline is a slowly rising minimum of observed miss latency (roughly the
+    unloaded upstream round trip). A miss that completes within `tolerance` x baseline
+    while the limit is in use grows the limit by 1/limit (about +1 per limit's worth of
+    completions). A slower miss or a failure shrinks it by `backoff`, at most once per
+    baseline interval so a single burst of slow responses counts once. Misses beyond the
+    limit, or any while the event loop is lagging, are rejected with a fast 503 instead
+    of queueing behind upstreams that are already slow.
+    """
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        backoff: float,
+        tolerance: float,
+        lag_monitor: Optional[EventLoopLagMonitor] = None,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.lag_monitor = lag_monitor
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self.shed = 0
+        self._decreased_at = 0.0
+
+    @classmethod
+    def from_settings(cls, lag_monitor: Optional[EventLoopLagMonitor] = None) -> "AdaptiveLimiter":
+        return cls(
+            initial_limit=settings.ADAPTIVE_LIMIT_INITIAL,
+            min_limit=settings.ADAPTIVE_LIMIT_MIN,
+            max_limit=settings.ADAPTIVE_LIMIT_MAX,
+            backoff=settings.ADAPTIVE_LIMIT_BACKOFF,
+            tolerance=settings.ADAPTIVE_LIMIT_TOLERANCE,
+            lag_monitor=lag_monitor,
+        )
+
+    def check(self) -> None:
+        """Raises Overloaded if a new miss would be shed right now."""
+        if self.lag_monitor is not None and self.lag_monitor.overloaded:
+            self.shed += 1
+            raise Overloaded("Server is overloaded; please retry shortly.")
+        if self.in_flight >= int(self.limit):
+            self.shed += 1
+            raise Overloaded("Too many uncached requests in progress; please retry shortly.")
+
+    def _on_sample(self, latency: float, failed: bool) -> None:
+        if not failed:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # Follows a lasting rise in upstream latency instead of remembering one lucky sample forever.
+                self.baseline += (latency - self.baseline) * 0.01
+        if self.baseline is None:
+            return
+        now = time.monotonic()
+        if failed or latency > self.baseline * self.tolerance:
+            if now - self._decreased_at >= self.baseline:
+                self._decreased_at = now
+                previous = self.limit
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                logger.debug(f"Miss limit {previous:.1f} -> {self.limit:.1f} (latency {latency * 1000:.0f}ms, failed={failed}).")
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Only grow while the limit is actually being used.
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.check()
+        self.in_flight += 1
+        started = time.monotonic()
+        failed, sampled = False, True
+        try:
+            yield
+        except HTTPException as e:
+            # 4xx (e.g. an address that does not geocode) says nothing about upstream health.
+            failed = e.status_code >= 500
+            raise
+        except asyncio.CancelledError:
+            # An abandoned miss has no meaningful latency.
+            sampled = False
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.in_flight -= 1
+            if sampled:
+                self._on_sample(time.monotonic() - started, failed)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "baseline_ms": round(self.baseline * 1000, 1) if self.baseline is not None else None,
+            "loop_lag_ms": round(self.lag_monitor.lag * 1000, 1) if self.lag_monitor is not None else None,
+            "shed": self.shed,
+        }
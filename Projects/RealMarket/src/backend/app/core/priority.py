@@ -0,0 +1,249 @@
+import asyncio
+import random
+import time
+import zlib
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncIterator, Deque, Dict, Iterator, Literal, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.tracing import span
+
+if TYPE_CHECKING:
+    import asyncpg
+
+Priority = Literal["interactive", "background"]
+
+# Work is interactive unless a caller opts into background (cache warming, refreshes, batch jobs).
+_priority: ContextVar[Priority] = ContextVar("upstream_priority", default="interactive")
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+@contextmanager
+def priority(level: Priority) -> Iterator[None]:
+    """Tags every upstream call made inside the block (including spawned tasks) with `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PriorityGate:
+    """
+    Admission control for one upstream host with two classes of work.
+    Interactive calls may use every slot; background calls are admitted only while no
+    interactive call is waiting, at most `background_limit` of them at once, and only
+    when the optional rate budget (`rate` requests/s) has a token left.
+    """
+    def __init__(self, name: str, max_in_flight: int, background_limit: int, rate: float = 0.0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.background_limit = background_limit
+        self.rate = rate
+        self.in_flight = 0
+        self._waiters: Dict[Priority, Deque[asyncio.Future]] = {"interactive": deque(), "background": deque()}
+        self._tokens = max(1.0, rate)
+        self._refilled_at = time.monotonic()
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+
+    def _has_token(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            return True
+        if self._wake_handle is None:
+            delay = (1 - self._tokens) / self.rate
+            self._wake_handle = asyncio.get_running_loop().call_later(delay, self._on_refill)
+        return False
+
+    def _on_refill(self) -> None:
+        self._wake_handle = None
+        self._wake()
+
+    def _can_admit(self, level: Priority) -> bool:
+        if level == "background":
+            if self._waiters["interactive"] or self.in_flight >= self.background_limit:
+                return False
+        elif self.in_flight >= self.max_in_flight:
+            return False
+        if not self._has_token():
+            return False
+        if self.rate > 0:
+            self._tokens -= 1
+        return True
+
+    def _wake(self) -> None:
+        for level in ("interactive", "background"):
+            waiters = self._waiters[level]
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            while waiters and self._can_admit(level):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self.in_flight += 1
+                future.set_result(None)
+            if waiters:
+                # Nothing of lower priority runs while this class still waits.
+                return
+
+    async def acquire(self, level: Priority) -> None:
+        blocked = self._waiters[level] or (level == "background" and self._waiters["interactive"])
+        if not blocked and self._can_admit(level):
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[level].append(future)
+        try:
+            with span("upstream.queue", upstream=self.name, priority=level):
+                await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled; hand it on.
+                self.release()
+            else:
+                if future in self._waiters[level]:
+                    self._waiters[level].remove(future)
+                # Our place in the queue may have been holding back other work.
+                self._wake()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, level: Priority) -> AsyncIterator[None]:
+        await self.acquire(level)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "interactive_waiting": sum(not f.done() for f in self._waiters["interactive"]),
+            "background_waiting": sum(not f.done() for f in self._waiters["background"]),
+        }
+
+
+
+class SharedBackgroundSlots:
+    """
+    A cap on background upstream calls shared by every process using the database:
+    API workers running async jobs and each CLI job. A PriorityGate only sees its own
+    process, so without this N jobs would each take their full background share.
+
+    Slot i of an upstream is the Postgres advisory lock (crc32 of its name, i). Each held
+    slot pins one connection from a small asyncpg pool of this class's own (at most
+    `slots` per process), never a request-pool connection. A caller that finds every slot
+    taken blocks inside Postgres on one of them until it frees up, re-checking the others
+    every `wait_timeout` seconds (lock_timeout), so there is no polling loop. Returning a
+    connection to the pool resets it, which drops its advisory locks, and Postgres drops
+    the locks of a process that dies, so budget never leaks. If the database cannot be
+    reached the cap is turned off for this process and calls fall back to the local gate.
+    """
+    def __init__(self, dsn: str, slots: int, wait_timeout: float = 1.0):
+        self.dsn = dsn
+        self.slots = slots
+        self.wait_timeout = wait_timeout
+        self.disabled = False
+        self._pool: Optional["asyncpg.Pool"] = None
+        self._pool_lock = asyncio.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "SharedBackgroundSlots":
+        # asyncpg takes a plain libpq-style DSN, without SQLAlchemy's driver suffix.
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        return cls(dsn, settings.UPSTREAM_SHARED_BACKGROUND_SLOTS)
+
+    @staticmethod
+    def _key(name: str) -> int:
+        # Signed int4, as pg_advisory_lock(int, int) expects.
+        return zlib.crc32(f"upstream-background:{name}".encode()) - 2**31
+
+    async def _get_pool(self) -> "asyncpg.Pool":
+        import asyncpg
+
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=0,
+                    max_size=self.slots,
+                    server_settings={"lock_timeout": f"{int(self.wait_timeout * 1000)}ms"},
+                )
+        return self._pool
+
+    async def _lock(self, connection: "asyncpg.Connection", name: str) -> int:
+        import asyncpg
+
+        key = self._key(name)
+        while True:
+            for slot in random.sample(range(self.slots), self.slots):
+                if await connection.fetchval("SELECT pg_try_advisory_lock($1, $2)", key, slot):
+                    return slot
+            slot = random.randrange(self.slots)
+            try:
+                # Sleeps in Postgres until that slot is released or lock_timeout expires.
+                await connection.execute("SELECT pg_advisory_lock($1, $2)", key, slot)
+                return slot
+            except asyncpg.LockNotAvailableError:
+                continue
+
+    async def acquire(self, name: str) -> Optional["asyncpg.Connection"]:
+        """Waits for a free slot of upstream `name`; returns the connection holding it (None once disabled)."""
+        if self.disabled:
+            return None
+        try:
+            pool = await self._get_pool()
+            connection = await pool.acquire()
+        except Exception as e:
+            self._disable(e)
+            return None
+        try:
+            with span("upstream.shared_queue", upstream=name):
+                await self._lock(connection, name)
+            return connection
+        except asyncio.CancelledError:
+            await asyncio.shield(self.release(connection))
+            raise
+        except Exception as e:
+            await self.release(connection)
+            self._disable(e)
+            return None
+
+    async def release(self, connection: "asyncpg.Connection") -> None:
+        try:
+            await self._pool.release(connection)
+        except Exception as e:
+            logger.warning(f"Could not return a shared background slot; it is freed when the connection closes. Error: {e}")
+
+    def _disable(self, error: Exception) -> None:
+        self.disabled = True
+        logger.warning(f"Shared background budget unavailable; using per-process limits only. Error: {error}")
+
+    @asynccontextmanager
+    async def slot(self, name: str) -> AsyncIterator[None]:
+        connection = await self.acquire(name)
+        try:
+            yield
+        finally:
+            if connection is not None:
+                await asyncio.shield(self.release(connection))
+
+    async def aclose(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
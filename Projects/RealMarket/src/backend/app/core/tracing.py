@@ -0,0 +1,202 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, Set, TypeVar
+
+from loguru import logger
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Server-Timing metric names must be HTTP tokens.
+_INVALID_TOKEN_CHARS = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+@dataclass
+class Span:
+    """A single timed unit of work inside a request trace."""
+    span_id: str
+    name: str
+    parent_id: Optional[str]
+    start_ms: float
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def end_ms(self) -> float:
+        return self.start_ms + (self.duration_ms or 0.0)
+
+
+class RequestTrace:
+    """
+    Collects the spans recorded while serving one request.
+    Span offsets are relative to the start of the trace so the waterfall
+    can be reconstructed from the exported JSON.
+    """
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Span] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._origin) * 1000
+
+    def finish(self) -> None:
+        self.duration_ms = self.elapsed_ms()
+
+    def server_timing_header(self) -> str:
+        """
+        Builds a compact Server-Timing summary. Spans sharing a name (e.g. every
+        ACS chunk) are collapsed into one entry whose duration is the wall-clock
+        extent of the group, which is what matters for the critical path.
+        """
+        groups: Dict[str, List[Span]] = {}
+        for span in self.spans:
+            if span.duration_ms is not None:
+                groups.setdefault(span.name, []).append(span)
+
+        entries = []
+        for name, spans in groups.items():
+            extent = max(s.end_ms for s in spans) - min(s.start_ms for s in spans)
+            entry = f"{_INVALID_TOKEN_CHARS.sub('_', name)};dur={extent:.1f}"
+            if len(spans) > 1:
+                entry += f';desc="{len(spans)}x"'
+            entries.append(entry)
+
+        total = self.duration_ms if self.duration_ms is not None else self.elapsed_ms()
+        entries.append(f"total;dur={total:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": [
+                {
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "name": s.name,
+                    "start_ms": round(s.start_ms, 3),
+                    "duration_ms": round(s.duration_ms, 3) if s.duration_ms is not None else None,
+                    "attributes": s.attributes,
+                    "error": s.error,
+                }
+                for s in self.spans
+            ],
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("current_span_id", default=None)
+
+# Keeps references to in-flight export tasks so they are not garbage collected.
+_export_tasks: Set[asyncio.Task] = set()
+_collector_client = None
+
+
+def get_current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name: str) -> Iterator[RequestTrace]:
+    """Starts a new trace bound to the current context (one per request)."""
+    trace = RequestTrace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span_id.set(None)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _current_span_id.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Records a span around the enclosed block. This is a no-op when no trace is
+    active, so instrumented code can run unchanged in jobs and scripts.
+    Tasks created inside the block (e.g. via asyncio.gather) inherit it as parent.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    current = Span(
+        span_id=uuid.uuid4().hex[:16],
+        name=name,
+        parent_id=_current_span_id.get(),
+        start_ms=trace.elapsed_ms(),
+        attributes=attributes,
+    )
+    trace.spans.append(current)
+    token = _current_span_id.set(current.span_id)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = trace.elapsed_ms() - current.start_ms
+        _current_span_id.reset(token)
+
+
+async def traced(name: str, awaitable: Awaitable[T], **attributes: Any) -> T:
+    """Awaits `awaitable` inside a span. Handy for wrapping tasks passed to gather."""
+    with span(name, **attributes):
+        return await awaitable
+
+
+# --- Export ---
+
+def _append_to_file(path: str, payload: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(payload + "\n")
+
+
+async def _export(trace: RequestTrace) -> None:
+    global _collector_client
+    payload = trace.to_dict()
+    try:
+        if settings.TRACE_EXPORT_FILE:
+            await asyncio.to_thread(_append_to_file, settings.TRACE_EXPORT_FILE, json.dumps(payload))
+        if settings.TRACE_COLLECTOR_URL:
+            if _collector_client is None:
+                from httpx import AsyncClient
+                _collector_client = AsyncClient(timeout=2.0)
+            await _collector_client.post(settings.TRACE_COLLECTOR_URL, json=payload)
+    except Exception as e:
+        logger.warning(f"Failed to export trace {trace.trace_id}: {e}")
+
+
+def export_trace(trace: RequestTrace) -> None:
+    """Schedules the full span export in the background, off the response path."""
+    if not (settings.TRACE_EXPORT_FILE or settings.TRACE_COLLECTOR_URL):
+        return
+    task = asyncio.create_task(_export(trace))
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+
+
+async def shutdown_tracing() -> None:
+    """Waits for pending exports and closes the collector client."""
+    global _collector_client
+    if _export_tasks:
+        await asyncio.gather(*_export_tasks, return_exceptions=True)
+    if _collector_client is not None:
+        await _collector_client.aclose()
+        _collector_client = None
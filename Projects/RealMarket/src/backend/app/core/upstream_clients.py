@@ -0,0 +1,312 @@
+import asyncio
+import importlib.util
+import socket
+import time
+from contextlib import AsyncExitStack, contextmanager
+from dataclasses import dataclass, fields, replace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpcore
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+from app.core.http_transport import build_transport
+from app.core.priority import PriorityGate, SharedBackgroundSlots, current_priority
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    """Connection tuning for one upstream host."""
+    name: str
+    base_url: str
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 20.0
+    http2: bool = False
+    # Concurrent requests admitted by the priority gate (defaults to max_connections)
+    # and an optional request-rate budget in requests/second (0 = unlimited).
+    max_in_flight: int = 0
+    rate_limit: float = 0.0
+
+
+def default_upstream_configs() -> List[UpstreamConfig]:
+    """Per-host defaults, overridable per upstream via UPSTREAM_CLIENT_OVERRIDES."""
+    configs = [
+        # Census fan-out is the bulk of our traffic: a wide pool, multiplexed over HTTP/2.
+        UpstreamConfig("census_api", settings.CENSUS_API_BASE_URL, max_connections=50,
+                       max_keepalive_connections=20, keepalive_expiry=60.0, http2=settings.CENSUS_API_HTTP2),
+        UpstreamConfig("census_geocoder", settings.CENSUS_GEOCODER_BASE_URL, read_timeout=30.0),
+        # Nominatim's usage policy allows 1 req/s; the gate enforces it per process.
+        UpstreamConfig("nominatim", settings.NOMINATIM_BASE_URL, max_connections=4,
+                       max_keepalive_connections=2, read_timeout=10.0, rate_limit=1.0),
+        # Walk Score is non-critical; fail fast rather than hold up the response.
+        UpstreamConfig("walkscore", settings.WALKSCORE_BASE_URL, max_connections=10,
+                       max_keepalive_connections=5, read_timeout=5.0),
+        UpstreamConfig("tigerweb", settings.TIGERWEB_BASE_URL, max_connections=10,
+                       max_keepalive_connections=5, read_timeout=30.0),
+    ]
+    allowed = {f.name for f in fields(UpstreamConfig)} - {"name", "base_url"}
+    for i, config in enumerate(configs):
+        overrides = settings.UPSTREAM_CLIENT_OVERRIDES.get(config.name, {})
+        unknown = set(overrides) - allowed
+        if unknown:
+            raise ValueError(f"Unknown client option(s) for upstream '{config.name}': {', '.join(sorted(unknown))}")
+        configs[i] = replace(config, **overrides)
+    return configs
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that caches getaddrinfo results for `ttl` seconds.
+    Connections are opened to the cached IP; TLS still uses the original
+    hostname for SNI and certificate checks because httpcore passes it separately.
+    """
+    def __init__(self, ttl: float, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[key] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host: str, port: int, timeout: float | None = None,
+                          local_address: str | None = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        addresses = await self.resolve(host, port)
+        last_error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout=timeout,
+                                                       local_address=local_address, socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # Every cached address failed; the records may be stale, so resolve again next time.
+        self._cache.pop((host, port), None)
+        raise last_error or httpcore.ConnectError(f"No addresses resolved for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: float | None = None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+# httpcore exceptions and the httpx types callers catch, most specific first.
+_HTTPCORE_ERRORS = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+]
+
+
+@contextmanager
+def _httpx_errors(request: httpx.Request) -> Iterator[None]:
+    try:
+        yield
+    except Exception as e:
+        for core_error, httpx_error in _HTTPCORE_ERRORS:
+            if isinstance(e, core_error):
+                raise httpx_error(str(e), request=request) from e
+        raise
+
+
+class _PoolStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any, request: httpx.Request):
+        self._stream = stream
+        self._request = request
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_errors(self._request):
+            async for chunk in self._stream:
+                yield chunk
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class _TunedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport over an httpcore connection pool built with our network backend.
+    httpx.AsyncHTTPTransport does not accept a network backend, so the pool is created
+    here through httpcore's public constructor rather than patched after the fact.
+    """
+    def __init__(self, network_backend: httpcore.AsyncNetworkBackend, limits: httpx.Limits, http2: bool = False):
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=network_backend,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors(request):
+            response = await self._pool.handle_async_request(core_request)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_PoolStream(response.stream, request),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+
+
+class UpstreamClients:
+    """
+    Owns one tuned AsyncClient per upstream host for the lifetime of the app.
+    Exposes the small `get`/`post` surface the services use and routes each call
+    to the client whose base URL matches, so services stay host-agnostic.
+    Each host also has a PriorityGate, so background work (see app/core/priority.py)
+    never delays interactive requests.
+    """
+    def __init__(
+        self,
+        configs: List[UpstreamConfig],
+        dns_cache_ttl: float,
+        background_share: float = 0.5,
+        shared_background: Optional[SharedBackgroundSlots] = None,
+    ):
+        self.configs = configs
+        # Cross-process cap on background calls; the gates below only see this process.
+        self.shared_background = shared_background
+        self.resolver = CachingDNSBackend(ttl=dns_cache_ttl)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._gates: Dict[int, PriorityGate] = {}
+        self._routes: List[Tuple[str, httpx.AsyncClient]] = []
+
+        http2_available = importlib.util.find_spec("h2") is not None
+        for config in configs:
+            http2 = config.http2 and http2_available
+            if config.http2 and not http2_available:
+                logger.warning(f"HTTP/2 requested for '{config.name}' but the 'h2' package is missing; using HTTP/1.1.")
+            transport = _TunedTransport(
+                self.resolver,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=config.max_connections,
+                    max_keepalive_connections=config.max_keepalive_connections,
+                    keepalive_expiry=config.keepalive_expiry,
+                ),
+            )
+            client = httpx.AsyncClient(
+                transport=build_transport(wrapped=transport),
+                timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            )
+            self._clients[config.name] = client
+            self._routes.append((config.base_url.rstrip("/"), client))
+            max_in_flight = config.max_in_flight or config.max_connections
+            self._gates[id(client)] = PriorityGate(
+                config.name,
+                max_in_flight=max_in_flight,
+                background_limit=max(1, int(max_in_flight * background_share)),
+                rate=config.rate_limit,
+            )
+        # Anything not matching a configured upstream still gets pooling and the record/replay transport.
+        self._default = httpx.AsyncClient(timeout=20.0, transport=build_transport())
+
+    @classmethod
+    def from_settings(cls) -> "UpstreamClients":
+        shared_background = None
+        if settings.UPSTREAM_SHARED_BACKGROUND_SLOTS > 0:
+            shared_background = SharedBackgroundSlots.from_settings()
+        return cls(
+            default_upstream_configs(),
+            dns_cache_ttl=settings.UPSTREAM_DNS_CACHE_TTL,
+            background_share=settings.UPSTREAM_BACKGROUND_SHARE,
+            shared_background=shared_background,
+        )
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        for base_url, client in self._routes:
+            if url.startswith(base_url):
+                return client
+        return self._default
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        client = self.client_for(url)
+        gate = self._gates.get(id(client))
+        if gate is None:
+            return await client.request(method, url, **kwargs)
+        level = current_priority()
+        async with AsyncExitStack() as stack:
+            if level == "background" and self.shared_background is not None:
+                await stack.enter_async_context(self.shared_background.slot(gate.name))
+            # Interactive calls go first; background work only fills capacity they leave idle.
+            await stack.enter_async_context(gate.slot(level))
+            return await client.request(method, url, **kwargs)
+
+    def gate_stats(self) -> Dict[str, Dict[str, int]]:
+        return {gate.name: gate.stats() for gate in self._gates.values()}
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def warm_up(self) -> None:
+        """Resolves DNS and opens keep-alive connections so first requests skip TCP/TLS setup."""
+        if settings.HTTP_TRANSPORT_MODE != "live" or settings.UPSTREAM_WARM_CONNECTIONS <= 0:
+            return
+
+        async def warm(config: UpstreamConfig) -> None:
+            client = self._clients[config.name]
+            count = min(settings.UPSTREAM_WARM_CONNECTIONS, config.max_keepalive_connections)
+            results = await asyncio.gather(*(client.head(config.base_url) for _ in range(count)), return_exceptions=True)
+            failures = [r for r in results if isinstance(r, Exception)]
+            if failures:
+                logger.warning(f"Warm-up for upstream '{config.name}' failed: {failures[0]!r}")
+            else:
+                logger.info(f"Warmed {count} connection(s) to upstream '{config.name}'.")
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(warm(c) for c in self.configs)), timeout=settings.UPSTREAM_WARM_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Upstream warm-up did not finish within {settings.UPSTREAM_WARM_TIMEOUT}s; continuing startup.")
+        logger.info(f"Upstream client warm-up took {(time.perf_counter() - start) * 1000:.0f}ms.")
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(c.aclose() for c in [*self._clients.values(), self._default]), return_exceptions=True)
+        if self.shared_background is not None:
+            await self.shared_background.aclose()
+        logger.info("Upstream HTTP clients closed.")
@@ -1,32 +1,121 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
 from loguru import logger
 
 from app.core.config import settings
 
-logger.info("Creating database engine...")
-# Create an async engine instance. pool_pre_ping=True helps manage stale connections.
-try:
-    engine = create_async_engine(settings.DATABASE_URL, pool_pre_ping=True, echo=False)
+
+def _create_engine(url: str) -> AsyncEngine:
+    """Creates an async engine with the pool and statement cache tuning from Settings."""
+    return create_async_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_ASYNCPG_STATEMENT_CACHE_SIZE,
+        },
+        echo=False,
+    )
+
+
+@lru_cache()
+def get_engine() -> AsyncEngine:
+    """
+    The primary engine, created on first use rather than at import so that importing
+    the app (and every CLI job) does not pay for the asyncpg dialect up front.
+    """
+    logger.info("Creating database engine...")
+    try:
+        engine = _create_engine(settings.DATABASE_URL)
+    except Exception as e:
+        logger.critical(f"FATAL: Failed to create database engine: {e}")
+        raise
     # Log connection details without credentials for security
-    db_connection_info = (
+    logger.info(
         f"DB Engine created for "
         f"host='{settings.POSTGRES_HOST}', "
         f"port='{settings.POSTGRES_PORT}', "
-        f"database='{settings.POSTGRES_DB}'"
+        f"database='{settings.POSTGRES_DB}', "
+        f"pool_size={settings.DB_POOL_SIZE}, max_overflow={settings.DB_MAX_OVERFLOW}"
+    )
+    return engine
+
+
+@lru_cache()
+def get_read_engine() -> Optional[AsyncEngine]:
+    """The read replica engine, or None when DATABASE_READ_URL is not configured."""
+    if not settings.DATABASE_READ_URL:
+        return None
+    try:
+        read_engine = _create_engine(settings.DATABASE_READ_URL)
+    except Exception as e:
+        logger.critical(f"FATAL: Failed to create read replica engine: {e}")
+        raise
+    logger.info(f"Read replica engine created for host='{settings.POSTGRES_READ_HOST}'.")
+    return read_engine
+
+
+class RoutingSession(Session):
+    """
+    Sends everything to the primary except SELECTs that opt in to the read replica with
+    `.execution_options(use_replica=True)`. Only reads that tolerate replication lag
+    (the cache lookups) should opt in; anything that may read its own writes must not.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        read_engine = get_read_engine()
+        if (
+            read_engine is not None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause.get_execution_options().get("use_replica")
+        ):
+            return read_engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@lru_cache()
+def _session_factory() -> async_sessionmaker[AsyncSession]:
+    factory = async_sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=get_engine(),
+        expire_on_commit=False, # Important for FastAPI
+        sync_session_class=RoutingSession if settings.DATABASE_READ_URL else Session,
     )
-    logger.info(db_connection_info)
-except Exception as e:
-    logger.critical(f"FATAL: Failed to create database engine: {e}")
-    raise
+    logger.info("AsyncSessionLocal session maker configured.")
+    return factory
+
+
+class _LazySessionMaker:
+    """Stands in for the async_sessionmaker, building it (and the engines) on the first session."""
+    def __call__(self, **kw) -> AsyncSession:
+        return _session_factory()(**kw)
+
+    def __getattr__(self, name):
+        return getattr(_session_factory(), name)
+
 
 # Create a configured "AsyncSession" class.
-AsyncSessionLocal = async_sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    expire_on_commit=False, # Important for FastAPI
-)
-logger.info("AsyncSessionLocal session maker configured.")
+AsyncSessionLocal = _LazySessionMaker()
+
+
+async def warm_up_engines() -> None:
+    """Creates the engines and opens one pooled connection, so the first request does not pay for either."""
+    async with get_engine().connect():
+        pass
+    read_engine = get_read_engine()
+    if read_engine is not None:
+        async with read_engine.connect():
+            pass
+    logger.info("Database connection pool warmed up.")
 
 
 async def get_db_session() -> AsyncSession:
@@ -43,3 +132,13 @@ async def get_db_session() -> AsyncSession:
             await session.rollback()
             logger.warning("Database session rolled back due to exception.")
             raise
+
+
+async def dispose_engines() -> None:
+    """Closes all pooled connections. Called on application shutdown."""
+    # Engines that were never used were never created; nothing to close.
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+    if get_read_engine.cache_info().currsize and get_read_engine() is not None:
+        await get_read_engine().dispose()
+    logger.info("Database engines disposed.")
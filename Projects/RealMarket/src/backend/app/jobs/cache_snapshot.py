@@ -0,0 +1,42 @@
+"""
+Exports the response cache to a columnar file, or loads one back.
+
+    python -m app.jobs.cache_snapshot export cache.parquet
+    python -m app.jobs.cache_snapshot export cache.arrow
+    python -m app.jobs.cache_snapshot import cache.parquet
+
+Snapshots have one row per cached address and one column per metric, plus the full
+response JSON, which is what `import` loads (via COPY) to seed another environment.
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from app.core.logging_config import setup_logging
+from app.db.session import AsyncSessionLocal, dispose_engines
+from app.services.cache_snapshot import export_cache_snapshot, import_cache_snapshot
+
+
+async def run(command: str, path: Path, batch_size: int) -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            if command == "export":
+                return await export_cache_snapshot(db, path, batch_size)
+            return await import_cache_snapshot(db, path, batch_size)
+    finally:
+        await dispose_engines()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", type=Path, help="Snapshot file (.parquet, or .arrow/.feather for Arrow IPC)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per fetch/COPY batch")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(run(args.command, args.path, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Precomputes within-county percentile ranks for every tract of the given counties.
+
+    python -m app.jobs.county_percentiles 06075 06001
+    python -m app.jobs.county_percentiles --state 06
+
+Each county costs three county-wide Census calls; results are upserted into the
+county_percentiles table, which /market-data reads without touching the Census API.
+"""
+import argparse
+import asyncio
+from typing import List
+
+from loguru import logger
+
+from app.core.logging_config import setup_logging
+from app.core.priority import priority
+from app.core.upstream_clients import UpstreamClients
+from app.db.session import AsyncSessionLocal, dispose_engines
+from app.services.census_api_client import CensusAPIClient
+from app.services.county_percentiles import compute_county_percentiles, save_county_percentiles
+from app.services.data_processor import LATEST_ACS_YEAR
+
+
+async def precompute(counties: List[str], states: List[str], concurrency: int) -> int:
+    """Computes and stores percentile tables; returns the number of counties that failed."""
+    clients = UpstreamClients.from_settings()
+    api_client = CensusAPIClient(clients)
+    failures = 0
+    try:
+        for state in states:
+            counties.extend(f"{state}{county}" for county in await api_client.fetch_counties_in_state(state, LATEST_ACS_YEAR))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(county_fips: str) -> bool:
+            async with semaphore:
+                try:
+                    matrix = await compute_county_percentiles(api_client, county_fips[:2], county_fips[2:])
+                    if matrix is None:
+                        return False
+                    async with AsyncSessionLocal() as db:
+                        await save_county_percentiles(matrix, db)
+                    logger.success(f"Stored percentiles for {len(matrix.tracts)} tracts in county {county_fips}.")
+                    return True
+                except Exception as e:
+                    logger.error(f"Percentile precomputation failed for county {county_fips}: {e}")
+                    return False
+
+        results = await asyncio.gather(*(run(c) for c in dict.fromkeys(counties)))
+        failures = results.count(False)
+        logger.info(f"Precomputed {results.count(True)} of {len(results)} counties.")
+    finally:
+        await clients.aclose()
+        await dispose_engines()
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("counties", nargs="*", help="Five-digit state+county FIPS codes")
+    parser.add_argument("--state", action="append", default=[], help="Two-digit state FIPS; precomputes all its counties")
+    parser.add_argument("--concurrency", type=int, default=4, help="Counties processed at once")
+    args = parser.parse_args()
+    if not args.counties and not args.state:
+        parser.error("Give at least one county FIPS code or --state.")
+
+    setup_logging()
+    # Batch work never competes with interactive requests for upstream capacity.
+    with priority("background"):
+        failures = asyncio.run(precompute(list(args.counties), args.state, args.concurrency))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Geocodes a file of addresses (one per line) to census tracts and writes a CSV.
+
+    python -m app.jobs.geocode_batch addresses.txt -o geocoded.csv
+
+Addresses go through the Census batch geocoder in chunks of GEOCODER_BATCH_SIZE;
+only the ones it cannot match are geocoded individually (Census one-line geocoder,
+then Nominatim at its 1 req/s limit). Addresses of a chunk that keeps failing are
+left empty and logged for a rerun. Output columns are address, state, county,
+tract, lat, lon, aland (empty where geocoding failed).
+"""
+import argparse
+import asyncio
+import csv
+import sys
+from typing import List
+
+from loguru import logger
+
+from app.core.logging_config import setup_logging
+from app.core.priority import priority
+from app.core.upstream_clients import UpstreamClients
+from app.services.geocoding_service import GeocodingService
+
+
+async def geocode_file(addresses: List[str], output) -> int:
+    """Geocodes and writes every address; returns the number that could not be geocoded."""
+    clients = UpstreamClients.from_settings()
+    try:
+        results = await GeocodingService(clients).geocode_addresses(addresses)
+    finally:
+        await clients.aclose()
+
+    writer = csv.writer(output)
+    writer.writerow(["address", "state", "county", "tract", "lat", "lon", "aland"])
+    for address, result in zip(addresses, results):
+        if result is None:
+            writer.writerow([address, "", "", "", "", "", ""])
+            continue
+        fips, coords = result["fips"], result["coords"]
+        writer.writerow([address, fips.state, fips.county, fips.tract, coords["lat"], coords["lon"], result["aland"]])
+    failures = results.count(None)
+    logger.info(f"Geocoded {len(addresses) - failures} of {len(addresses)} addresses.")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Text file with one address per line")
+    parser.add_argument("-o", "--output", help="Output CSV path (default: stdout)")
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        addresses = [line.strip() for line in f if line.strip()]
+
+    setup_logging()
+    output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        # Batch work never competes with interactive requests for upstream capacity.
+        with priority("background"):
+            asyncio.run(geocode_file(addresses, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Builds the county-to-county migration flows store that /market-data and
+/migration-flows serve from (see MIGRATION_FLOWS_PATH).
+
+    python -m app.jobs.migration_flows /var/lib/realmarket/migration_flows
+    python -m app.jobs.migration_flows ./migration_flows --state 06 --state 41
+
+One ACS flows request per state returns every (county, partner) row for its counties;
+the whole country is about fifty calls. Workers pick up a rebuilt store on restart.
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from app.core.logging_config import setup_logging
+from app.core.priority import priority
+from app.core.upstream_clients import UpstreamClients
+from app.services.census_api_client import MIGRATION_FLOWS_YEAR, CensusAPIClient
+from app.services.census_service import LATEST_ACS_YEAR
+from app.services.migration_flows import write_migration_flows
+
+
+async def build(path: str, states: List[str], concurrency: int) -> int:
+    """Fetches every state's county flows and writes the store; returns the number of failed states."""
+    clients = UpstreamClients.from_settings()
+    api_client = CensusAPIClient(clients)
+    rows: List[Dict[str, Any]] = []
+    failed: List[str] = []
+    try:
+        states = states or await api_client.fetch_states(LATEST_ACS_YEAR)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(state: str) -> None:
+            async with semaphore:
+                try:
+                    state_rows = await api_client.fetch_county_flows_in_state(state, MIGRATION_FLOWS_YEAR)
+                    rows.extend(state_rows)
+                    logger.success(f"Fetched {len(state_rows)} flow rows for state {state}.")
+                except Exception as e:
+                    logger.error(f"Migration flows fetch failed for state {state}: {e}")
+                    failed.append(state)
+
+        await asyncio.gather(*(run(s) for s in dict.fromkeys(states)))
+    finally:
+        await clients.aclose()
+
+    if failed:
+        # Missing states would also be missing as partners of every other county's rows.
+        logger.error(f"Not writing migration flows; {len(failed)} state(s) failed: {', '.join(sorted(failed))}.")
+        return len(failed)
+    counties, flows = write_migration_flows(path, MIGRATION_FLOWS_YEAR, rows)
+    logger.success(f"Wrote migration flows for {counties} counties ({flows} county pairs) to {path}.")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Store directory (a symlink to the current version, flipped atomically on rebuild)")
+    parser.add_argument("--state", action="append", default=[], help="Two-digit state FIPS; defaults to every state")
+    parser.add_argument("--concurrency", type=int, default=4, help="States fetched at once")
+    args = parser.parse_args()
+
+    setup_logging()
+    # Batch work never competes with interactive requests for upstream capacity.
+    with priority("background"):
+        failures = asyncio.run(build(args.path, args.state, args.concurrency))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Builds the tract adjacency graph that /market-data compares a tract's neighbors
+with (see TRACT_ADJACENCY_PATH).
+
+    python -m app.jobs.tract_adjacency /var/lib/realmarket/tract_adjacency
+    python -m app.jobs.tract_adjacency ./tract_adjacency --state 06 --state 41
+
+Every tract boundary in a state is fetched from TIGERweb (paged, a few dozen calls
+for a large state). Tracts sharing an edge are neighbors, including across county and
+state lines between the states built together. Workers pick up a rebuilt graph on restart.
+"""
+import argparse
+import asyncio
+from typing import List
+
+from loguru import logger
+
+from app.core.logging_config import setup_logging
+from app.core.priority import priority
+from app.core.upstream_clients import UpstreamClients
+from app.services.census_api_client import CensusAPIClient
+from app.services.census_service import LATEST_ACS_YEAR
+from app.services.tract_adjacency import TractAdjacencyBuilder
+
+
+async def build(path: str, states: List[str], concurrency: int) -> int:
+    """Fetches every state's tract boundaries and writes the graph; returns the number of failed states."""
+    clients = UpstreamClients.from_settings()
+    api_client = CensusAPIClient(clients)
+    builder = TractAdjacencyBuilder()
+    failed: List[str] = []
+    try:
+        states = states or await api_client.fetch_states(LATEST_ACS_YEAR)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(state: str) -> None:
+            async with semaphore:
+                try:
+                    features = await api_client.fetch_tract_boundaries_in_state(state)
+                    # Geometry is dropped once the state's shared vertices are resolved.
+                    count = builder.add_state(features)
+                    logger.success(f"Indexed {count} tract boundaries for state {state}.")
+                except Exception as e:
+                    logger.error(f"Tract boundary fetch failed for state {state}: {e}")
+                    failed.append(state)
+
+        await asyncio.gather(*(run(s) for s in dict.fromkeys(states)))
+    finally:
+        await clients.aclose()
+
+    if failed:
+        # Tracts of a missing state would silently have no neighbors.
+        logger.error(f"Not writing the tract adjacency graph; {len(failed)} state(s) failed: {', '.join(sorted(failed))}.")
+        return len(failed)
+    tracts, edges = builder.write(path, LATEST_ACS_YEAR)
+    logger.success(f"Wrote tract adjacency for {tracts} tracts ({edges} shared boundaries) to {path}.")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Graph directory (a symlink to the current version, flipped atomically on rebuild)")
+    parser.add_argument("--state", action="append", default=[], help="Two-digit state FIPS; defaults to every state")
+    parser.add_argument("--concurrency", type=int, default=4, help="States fetched at once")
+    args = parser.parse_args()
+
+    setup_logging()
+    # Batch work never competes with interactive requests for upstream capacity.
+    with priority("background"):
+        failures = asyncio.run(build(args.path, args.state, args.concurrency))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Builds the national ACS tract matrix that /market-data serves the latest-vintage
+ACS section from (see TRACT_MATRIX_PATH).
+
+    python -m app.jobs.tract_matrix /var/lib/realmarket/tract_matrix
+    python -m app.jobs.tract_matrix ./tract_matrix --state 06 --state 41
+
+Every variable in ACS_VARS, SUBJECT_VARS and PROFILE_VARS is fetched with its MOE,
+one state-wide request per endpoint and 45-variable chunk (a few hundred calls for
+the whole country). Workers pick up a rebuilt matrix on restart.
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from app.core.logging_config import setup_logging
+from app.core.priority import priority
+from app.core.upstream_clients import UpstreamClients
+from app.services.census_api_client import CensusAPIClient
+from app.services.census_service import ACS_VARS, LATEST_ACS_YEAR, PROFILE_VARS, SUBJECT_VARS, _expand_vars_with_moe
+from app.services.tract_matrix import write_tract_matrix
+
+SECTIONS = [
+    ("acs/acs5", _expand_vars_with_moe(ACS_VARS)),
+    ("acs/acs5/subject", _expand_vars_with_moe(SUBJECT_VARS)),
+    ("acs/acs5/profile", _expand_vars_with_moe(PROFILE_VARS)),
+]
+
+
+async def build(path: str, states: List[str], concurrency: int) -> int:
+    """Fetches every section for every state and writes the matrix; returns the number of failed states."""
+    clients = UpstreamClients.from_settings()
+    api_client = CensusAPIClient(clients)
+    rows: Dict[str, Dict[str, Any]] = {}
+    failed: List[str] = []
+    try:
+        states = states or await api_client.fetch_states(LATEST_ACS_YEAR)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(state: str) -> None:
+            async with semaphore:
+                try:
+                    state_rows: Dict[str, Dict[str, Any]] = {}
+                    for endpoint, variables in SECTIONS:
+                        section = await api_client.fetch_acs_tracts_in_state(state, LATEST_ACS_YEAR, variables, endpoint)
+                        for geoid, values in section.items():
+                            state_rows.setdefault(geoid, {}).update(values)
+                    rows.update(state_rows)
+                    logger.success(f"Fetched {len(state_rows)} tracts for state {state}.")
+                except Exception as e:
+                    logger.error(f"Tract matrix fetch failed for state {state}: {e}")
+                    failed.append(state)
+
+        await asyncio.gather(*(run(s) for s in dict.fromkeys(states)))
+    finally:
+        await clients.aclose()
+
+    if failed:
+        # A partial national matrix would silently send those states' lookups upstream forever.
+        logger.error(f"Not writing the tract matrix; {len(failed)} state(s) failed: {', '.join(sorted(failed))}.")
+        return len(failed)
+    variables = [var for _, section_vars in SECTIONS for var in section_vars]
+    count = write_tract_matrix(path, LATEST_ACS_YEAR, variables, rows)
+    logger.success(f"Wrote tract matrix with {count} tracts x {len(variables)} variables to {path}.")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Matrix directory (a symlink to the current version, flipped atomically on rebuild)")
+    parser.add_argument("--state", action="append", default=[], help="Two-digit state FIPS; defaults to every state")
+    parser.add_argument("--concurrency", type=int, default=4, help="States fetched at once")
+    args = parser.parse_args()
+
+    setup_logging()
+    # Batch work never competes with interactive requests for upstream capacity.
+    with priority("background"):
+        failures = asyncio.run(build(args.path, args.state, args.concurrency))
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
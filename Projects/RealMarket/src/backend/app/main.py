@@ -1,31 +1,206 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from loguru import logger
 
 from app.api.v1 import endpoints
+from app.core.admission import AdmissionController
+from app.core.census_keys import get_census_key_pool
+from app.core.config import settings
 from app.core.firebase import initialize_firebase
 from app.core.logging_config import setup_logging
+from app.core.overload import AdaptiveLimiter, EventLoopLagMonitor
+from app.core.tracing import start_trace, export_trace, shutdown_tracing
+from app.core.upstream_clients import UpstreamClients
+from app.db.session import AsyncSessionLocal, dispose_engines, warm_up_engines
+from app.services.acs_batcher import AcsBatchPlanner
+from app.services.cache_writer import CacheWriteBehind
+from app.services.census_api_client import CensusAPIClient
+from app.services.cache_invalidation import CacheInvalidationBus
+from app.services.cache_manager import CacheManager, RESPONSE_CACHE_NAMESPACE
+from app.services.census_service import CensusService
+from app.services.data_processor import DataProcessor
+from app.services.geocoding_service import GeocodingService
+from app.services.job_queue import MarketDataJobQueue
+from app.services.county_percentiles import CountyPercentileStore, PERCENTILE_CACHE_NAMESPACE
+from app.services.tract_matrix import TractMatrix
+from app.services.migration_flows import MigrationFlows
+from app.services.tract_adjacency import TractAdjacency
+from app.core.local_cache import LocalCache
 
 # --- Logging Setup ---
 # This must be called BEFORE the app is created to ensure
 # all startup logs are captured correctly.
 setup_logging()
 
+# --- Lifespan ---
+async def _warm_up_database() -> None:
+    try:
+        await asyncio.wait_for(warm_up_engines(), timeout=settings.DB_POOL_TIMEOUT)
+    except Exception as e:
+        # Not fatal at startup: the pool connects (and reports errors) on the first request.
+        logger.warning(f"Database warm-up failed: {e}")
+
+
+async def _open_tract_matrix(app: FastAPI) -> None:
+    # Mapped read-only: every worker on the host shares the same pages.
+    if not settings.TRACT_MATRIX_PATH:
+        return
+    try:
+        app.state.tract_matrix = await asyncio.to_thread(TractMatrix.open, settings.TRACT_MATRIX_PATH)
+    except Exception as e:
+        logger.warning(f"Tract matrix at {settings.TRACT_MATRIX_PATH} could not be opened; ACS will be fetched upstream. Error: {e}")
+
+
+async def _open_tract_adjacency(app: FastAPI) -> None:
+    if not settings.TRACT_ADJACENCY_PATH:
+        return
+    try:
+        app.state.tract_adjacency = await asyncio.to_thread(TractAdjacency.open, settings.TRACT_ADJACENCY_PATH)
+    except Exception as e:
+        logger.warning(f"Tract adjacency at {settings.TRACT_ADJACENCY_PATH} could not be opened; responses will have no neighbor comparison. Error: {e}")
+
+
+async def _open_migration_flows(app: FastAPI) -> None:
+    if not settings.MIGRATION_FLOWS_PATH:
+        return
+    try:
+        app.state.migration_flows = await asyncio.to_thread(MigrationFlows.open, settings.MIGRATION_FLOWS_PATH)
+    except Exception as e:
+        logger.warning(f"Migration flows at {settings.MIGRATION_FLOWS_PATH} could not be opened; county flows will be fetched upstream. Error: {e}")
+
+
+def _job_census_service(app: FastAPI) -> CensusService:
+    """
+    The CensusService async jobs run with. Jobs are already bounded by the worker pool, so
+    per-user admission and the miss limiter do not apply, and the cache entry is written
+    inline (not behind) so a follow-up GET /market-data finds it on every worker.
+    """
+    state = app.state
+    clients = state.upstream_clients
+    return CensusService(
+        CacheManager(local_cache=state.response_cache),
+        GeocodingService(clients),
+        CensusAPIClient(clients, batcher=state.acs_batcher),
+        DataProcessor(),
+        state.percentile_store,
+        state.tract_matrix,
+        state.boundary_cache,
+        migration_flows=state.migration_flows,
+        tract_adjacency=state.tract_adjacency,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Application startup...")
+    # Upstream HTTP clients are owned by the app: created and warmed here, closed on shutdown.
+    app.state.upstream_clients = UpstreamClients.from_settings()
+    # Independent startup work runs concurrently: network warm-ups overlap with the
+    # Firebase import/initialization and with mapping the tract matrix and flows store.
+    app.state.tract_matrix = None
+    app.state.migration_flows = None
+    app.state.tract_adjacency = None
+    await asyncio.gather(
+        asyncio.to_thread(initialize_firebase),
+        app.state.upstream_clients.warm_up(),
+        _warm_up_database(),
+        _open_tract_matrix(app),
+        _open_migration_flows(app),
+        _open_tract_adjacency(app),
+    )
+    app.state.admission = AdmissionController.from_settings() if settings.ADMISSION_ENABLED else None
+    app.state.loop_lag_monitor = None
+    app.state.miss_limiter = None
+    if settings.ADAPTIVE_LIMIT_ENABLED:
+        app.state.loop_lag_monitor = EventLoopLagMonitor.from_settings()
+        app.state.loop_lag_monitor.start()
+        app.state.miss_limiter = AdaptiveLimiter.from_settings(app.state.loop_lag_monitor)
+    app.state.acs_batcher = None
+    if settings.ACS_BATCH_ENABLED:
+        app.state.acs_batcher = AcsBatchPlanner.from_settings(CensusAPIClient(app.state.upstream_clients))
+    app.state.cache_writer = None
+    if settings.CACHE_WRITE_BEHIND_ENABLED:
+        app.state.cache_writer = CacheWriteBehind(
+            AsyncSessionLocal,
+            batch_size=settings.CACHE_WRITE_BATCH_SIZE,
+            flush_interval=settings.CACHE_WRITE_FLUSH_INTERVAL,
+            max_queue_size=settings.CACHE_WRITE_QUEUE_SIZE,
+        )
+        app.state.cache_writer.start()
+
+    # In-process cache tiers, invalidated across workers via Postgres LISTEN/NOTIFY.
+    app.state.response_cache = None
+    app.state.invalidation_bus = CacheInvalidationBus.from_settings()
+    if settings.LOCAL_CACHE_ENABLED:
+        app.state.response_cache = LocalCache(
+            RESPONSE_CACHE_NAMESPACE, max_entries=settings.LOCAL_CACHE_MAX_ENTRIES, ttl=settings.LOCAL_CACHE_TTL
+        )
+        app.state.invalidation_bus.register(RESPONSE_CACHE_NAMESPACE, app.state.response_cache)
+    # Tract boundaries are static per vintage, so this tier needs no invalidation.
+    app.state.boundary_cache = None
+    if settings.LOCAL_CACHE_ENABLED:
+        app.state.boundary_cache = LocalCache(
+            "boundaries", max_entries=settings.BOUNDARY_CACHE_MAX_ENTRIES, ttl=settings.BOUNDARY_CACHE_TTL
+        )
+
+    app.state.percentile_store = None
+    if settings.COUNTY_PERCENTILES_ENABLED:
+        percentile_cache = None
+        if settings.LOCAL_CACHE_ENABLED:
+            percentile_cache = LocalCache(
+                PERCENTILE_CACHE_NAMESPACE, max_entries=settings.PERCENTILE_CACHE_MAX_COUNTIES, ttl=settings.PERCENTILE_CACHE_TTL
+            )
+            app.state.invalidation_bus.register(PERCENTILE_CACHE_NAMESPACE, percentile_cache)
+        app.state.percentile_store = CountyPercentileStore(percentile_cache)
+    if settings.LOCAL_CACHE_ENABLED:
+        app.state.invalidation_bus.start()
+
+    app.state.job_queue = None
+    if settings.JOBS_ENABLED:
+        app.state.job_queue = MarketDataJobQueue.from_settings(AsyncSessionLocal, lambda: _job_census_service(app))
+        app.state.job_queue.start()
+
+    yield
+
+    if app.state.job_queue:
+        await app.state.job_queue.stop()
+    await app.state.invalidation_bus.stop()
+    if app.state.loop_lag_monitor:
+        await app.state.loop_lag_monitor.stop()
+    if app.state.cache_writer:
+        await app.state.cache_writer.stop()
+    await app.state.upstream_clients.aclose()
+    for usage in get_census_key_pool().usage():
+        logger.info(f"Census API key usage: {usage}")
+    await dispose_engines()
+    await shutdown_tracing()
+    logger.info("Application shutdown.")
+    # Drain the enqueued log sink (LOG_ENQUEUE) before the process exits.
+    await logger.complete()
+
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="CapMatch Market Data API",
     description="An API to fetch market context data for commercial real estate.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-# --- Event Handlers ---
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Application startup...")
-    initialize_firebase()
+# --- Middleware ---
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    """Traces each request and returns a compact span summary in the Server-Timing header."""
+    if not settings.TRACE_ENABLED:
+        return await call_next(request)
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("Application shutdown.")
+    with start_trace(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = trace.server_timing_header()
+    response.headers["X-Trace-Id"] = trace.trace_id
+    export_trace(trace)
+    return response
 
 # --- Router Inclusion ---
 # Include the router from our endpoints module
@@ -1,5 +1,5 @@
 # src/backend/app/models/population.py
-from sqlalchemy import Column, Integer, String, JSON, DateTime
+from sqlalchemy import Column, Integer, String, JSON, DateTime, LargeBinary, Index
 from sqlalchemy.sql import func
 from app.db.db_base_class import Base
 
@@ -12,7 +12,57 @@ class PopulationCache(Base):
     address_key = Column(String, unique=True, index=True, nullable=False)
     # The full JSON response from the service, stored for quick retrieval.
     response_data = Column(JSON, nullable=False)
+    # The serialized response, gzip-compressed, so hits can be served without recompressing.
+    response_gzip = Column(LargeBinary, nullable=True)
+    # Weak ETag of the serialized response; lets conditional requests be answered without reading the JSON.
+    etag = Column(String(64), nullable=True)
     # Timestamp for when the record was created.
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     # Timestamp for when the record was last updated.
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+class CountyPercentileTable(Base):
+    """Precomputed within-county percentile ranks for every tract of one county."""
+    __tablename__ = "county_percentiles"
+
+    # Five-digit state+county FIPS code.
+    county_fips = Column(String(5), primary_key=True)
+    data_year = Column(Integer, nullable=False)
+    # Ordered metric names (matrix columns) and tract codes (matrix rows).
+    metrics = Column(JSON, nullable=False)
+    tracts = Column(JSON, nullable=False)
+    # Row-major uint8 matrix of percentile ranks (0-100), 255 where the metric is unavailable.
+    ranks = Column(LargeBinary, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+class MarketDataJob(Base):
+    """An asynchronous /market-data request, run by the worker pool in app/services/job_queue.py."""
+    __tablename__ = "market_data_jobs"
+
+    id = Column(String(32), primary_key=True)
+    address = Column(String, nullable=False)
+    # Same normalization as PopulationCache.address_key; one active job per key.
+    address_key = Column(String, nullable=False)
+    user_id = Column(String, nullable=True)
+    # queued -> running -> succeeded | failed. A running job whose heartbeat stops
+    # (its worker died) is claimed again by another worker.
+    status = Column(String(16), nullable=False, server_default="queued")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    # The serialized PopulationDataResponse, kept with the job so pollers never depend on cache timing.
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    error_status = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Retries are not claimed before this time.
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_market_data_jobs_status_created_at", "status", "created_at"),
+        Index(
+            "uq_market_data_jobs_active_address_key", "address_key", unique=True,
+            postgresql_where=status.in_(("queued", "running")),
+        ),
+    )
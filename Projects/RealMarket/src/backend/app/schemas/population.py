@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List, Optional, Literal, Union
 
@@ -14,6 +15,8 @@ class PopulationTrendPoint(BaseModel):
     year: int
     population: int
     is_projection: bool = False
+    lower: Optional[int] = Field(None, description="Lower bound of the projection's confidence band.")
+    upper: Optional[int] = Field(None, description="Upper bound of the projection's confidence band.")
 
 class Coordinates(BaseModel):
     lat: float
@@ -50,6 +53,12 @@ class GrowthMetrics(BaseModel):
     yoy_growth: Optional[float] = Field(None, description="Year-over-Year Growth Rate (%) for the most recent year.")
     absolute_change: Optional[int] = Field(None, description="Absolute population change over the period.")
 
+class CountyFlow(BaseModel):
+    """Movers between a county and one other county over the ACS 5-year period."""
+    fips: str = Field(..., description="Five-digit county FIPS.")
+    name: str
+    movers: int
+
 class MigrationData(BaseModel):
     """Data on population change from migration."""
     net_migration: int
@@ -59,6 +68,8 @@ class MigrationData(BaseModel):
     inflows: int
     outflows: int
     gross_migration: int
+    top_inbound_counties: Optional[List[CountyFlow]] = Field(None, description="Counties the most movers came from.")
+    top_outbound_counties: Optional[List[CountyFlow]] = Field(None, description="Counties the most movers left for.")
 
 class NaturalIncreaseData(BaseModel):
     """Data on population change from births and deaths."""
@@ -76,6 +87,7 @@ class PopulationTrend(BaseModel):
     """Historical population trend with projections and benchmarks."""
     trend: List[PopulationTrendPoint]
     projection: List[PopulationTrendPoint]
+    projection_model: Optional[str] = None
     benchmark: Optional[BenchmarkData] = None
 
 class AgeDistribution(BaseModel):
@@ -135,6 +147,52 @@ class HousingMetrics(BaseModel):
 
 
 
+class CountyPercentiles(BaseModel):
+    """Where the tract ranks among all tracts in its county (0 = lowest, 100 = highest)."""
+    data_year: int
+    tract_count: int = Field(..., description="Number of tracts in the county ranking.")
+    median_household_income: Optional[int] = None
+    median_home_value: Optional[int] = None
+    median_gross_rent: Optional[int] = None
+    median_age: Optional[int] = None
+    avg_household_size: Optional[int] = None
+    percent_bachelors_or_higher: Optional[int] = None
+    percent_renter_occupied: Optional[int] = None
+    vacancy_rate: Optional[int] = None
+    labor_force_participation_rate: Optional[int] = None
+    poverty_rate: Optional[int] = None
+    population_cagr: Optional[int] = None
+
+class NeighborMetric(BaseModel):
+    """One metric for the tract against its adjacent tracts."""
+    tract: Optional[float] = None
+    neighbors_median: Optional[float] = None
+    difference_percent: Optional[float] = Field(None, description="Tract relative to the neighbors' median (%).")
+    rank: Optional[int] = Field(None, description="Tract's rank among itself and its neighbors (1 = highest).")
+
+class NeighborTract(BaseModel):
+    geoid: str
+    name: str
+    total_population: Optional[int] = None
+    median_household_income: Optional[int] = None
+    median_home_value: Optional[int] = None
+    median_gross_rent: Optional[int] = None
+
+class NeighborComparison(BaseModel):
+    """The tract compared with the tracts that share a boundary with it."""
+    data_year: int
+    neighbor_count: int
+    neighbors: List[NeighborTract]
+    total_population: Optional[NeighborMetric] = None
+    median_household_income: Optional[NeighborMetric] = None
+    median_home_value: Optional[NeighborMetric] = None
+    median_gross_rent: Optional[NeighborMetric] = None
+    median_age: Optional[NeighborMetric] = None
+    percent_bachelors_or_higher: Optional[NeighborMetric] = None
+    percent_renter_occupied: Optional[NeighborMetric] = None
+    vacancy_rate: Optional[NeighborMetric] = None
+    poverty_rate: Optional[NeighborMetric] = None
+
 # --- Main Response Schema (Heavily Modified) ---
 class PopulationDataResponse(BaseModel):
     """Final schema for the growth-focused market data response."""
@@ -173,9 +231,106 @@ class PopulationDataResponse(BaseModel):
 
     # Ancillary Metrics
     walkability: Optional[WalkabilityScores] = None
+    county_percentiles: Optional[CountyPercentiles] = None
+    neighbors: Optional[NeighborComparison] = None
 
     # Trend Data
     population_trends: PopulationTrend
 
     class Config:
         populate_by_name = True
+
+
+# --- Trade Area Schemas ---
+class TradeAreaTract(BaseModel):
+    geoid: str
+    coverage: float = Field(..., description="Share of the tract's area inside the radius (0-1).")
+
+class TradeAreaResponse(BaseModel):
+    """Demographics aggregated over all tracts intersecting a radius around a point."""
+    center: Coordinates
+    radius_miles: float
+    data_year: int
+    tract_count: int
+    tracts: List[TradeAreaTract]
+
+    total_population: ValueWithMoe
+    total_households: ValueWithMoe
+    total_housing_units: ValueWithMoe
+    owner_occupied_units: ValueWithMoe
+    renter_occupied_units: ValueWithMoe
+    vacant_units: ValueWithMoe
+
+    # Medians are universe-weighted averages of tract medians, not true area medians.
+    median_household_income: ValueWithMoe
+    median_home_value: ValueWithMoe
+    median_gross_rent: ValueWithMoe
+    median_age: ValueWithMoe
+
+    percent_renter_occupied: Optional[float] = None
+    vacancy_rate: Optional[float] = None
+    percent_bachelors_or_higher: Optional[float] = None
+
+
+class MigrationFlowsResponse(BaseModel):
+    """County-to-county ACS migration flows, served from the prebuilt flows store."""
+    fips: str = Field(..., description="Five-digit county FIPS.")
+    name: str
+    data_year: int
+    moved_in: int
+    moved_out: int
+    moved_net: int
+    top_inbound: List[CountyFlow]
+    top_outbound: List[CountyFlow]
+    partner: Optional[CountyFlow] = Field(None, description="The requested partner county, with movers from it.")
+    partner_outbound: Optional[int] = Field(None, description="Movers from this county to the requested partner.")
+
+
+# --- Operational Schemas ---
+class CensusKeyUsage(BaseModel):
+    """Usage counters for one pooled Census API key (the key itself is masked)."""
+    key: str
+    requests_today: int
+    daily_quota: Optional[int] = None
+    total_requests: int
+    quota_errors: int
+    backed_off_seconds: float
+
+class CompressionStats(BaseModel):
+    """Response compression counters for one encoding in this worker."""
+    compressions: int
+    cpu_ms: float = Field(..., description="CPU time spent compressing, in milliseconds.")
+    bytes_in: int
+    bytes_out: int
+    ratio: Optional[float] = None
+    precompressed_hits: int = Field(..., description="Responses served from an already compressed variant.")
+
+class OverloadStats(BaseModel):
+    """Adaptive cache-miss limiter state for this worker."""
+    limit: float = Field(..., description="Current concurrent-miss limit.")
+    in_flight: int
+    baseline_ms: Optional[float] = Field(None, description="Unloaded miss latency the limit adapts against.")
+    loop_lag_ms: Optional[float] = Field(None, description="Smoothed event loop lag.")
+    shed: int = Field(..., description="Misses rejected with 503 since startup.")
+
+JobState = Literal["queued", "running", "succeeded", "failed"]
+
+class JobAccepted(BaseModel):
+    """Returned with 202 when /market-data?async=true queues a cold address."""
+    job_id: str
+    status: JobState
+    status_url: str = Field(..., description="Poll with GET for the job's state and, once it succeeds, its result.")
+    websocket_url: str = Field(..., description="Pushes the job's state on every change and closes when it finishes.")
+
+class JobStatus(BaseModel):
+    """State of an asynchronous /market-data job."""
+    job_id: str
+    status: JobState
+    address: str
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = Field(None, description="HTTP status the synchronous request would have failed with.")
+    result: Optional[PopulationDataResponse] = None
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.priority import Priority, current_priority, priority
+from app.core.tracing import span
+
+if TYPE_CHECKING:
+    from app.services.census_api_client import CensusAPIClient
+
+# (year, endpoint, state, county, variables): requests that can share one Census call.
+BatchKey = Tuple[int, str, str, str, Tuple[str, ...]]
+
+
+@dataclass
+class _PendingBatch:
+    waiters: Dict[str, List[asyncio.Future]] = field(default_factory=dict)
+    level: Priority = "background"
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class AcsBatchPlanner:
+    """
+    Merges concurrent single-tract ACS requests into multi-tract Census calls.
+    Requests for the same year, endpoint, county and variable list that arrive within
+    `window` seconds of each other are sent as one `for=tract:a,b,...` request (up to
+    `max_tracts` tracts), and each caller receives just its own row. A failed call fails
+    every waiter in that batch, exactly as the individual requests would have.
+    """
+    def __init__(self, api_client: "CensusAPIClient", window: float, max_tracts: int):
+        self.api_client = api_client
+        self.window = window
+        self.max_tracts = max_tracts
+        self._pending: Dict[BatchKey, _PendingBatch] = {}
+        self._tasks: set = set()
+
+    @classmethod
+    def from_settings(cls, api_client: "CensusAPIClient") -> "AcsBatchPlanner":
+        return cls(api_client, window=settings.ACS_BATCH_WINDOW_MS / 1000, max_tracts=settings.ACS_BATCH_MAX_TRACTS)
+
+    async def fetch(self, state: str, county: str, tract: str, year: int, endpoint: str, variables: List[str]) -> Dict[str, Any]:
+        key: BatchKey = (year, endpoint, state, county, tuple(variables))
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch()
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self._dispatch, key)
+        if current_priority() == "interactive":
+            batch.level = "interactive"
+        future = asyncio.get_running_loop().create_future()
+        batch.waiters.setdefault(tract, []).append(future)
+        if len(batch.waiters) >= self.max_tracts:
+            batch.timer.cancel()
+            self._dispatch(key)
+        with span("census.acs_batched", year=year, endpoint=endpoint):
+            # Shielded so one caller's cancellation does not cancel the row for the others.
+            return await asyncio.shield(future)
+
+    def _dispatch(self, key: BatchKey) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        # A fresh context: the call serves many requests, so it belongs to no single trace.
+        task = asyncio.get_running_loop().create_task(self._run(key, batch), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: BatchKey, batch: _PendingBatch) -> None:
+        year, endpoint, state, county, variables = key
+        tracts = list(batch.waiters)
+        try:
+            with priority(batch.level):
+                rows = await self.api_client.fetch_acs_rows(state, county, tracts, year, list(variables), endpoint)
+        except BaseException as e:
+            for futures in batch.waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        logger.debug(f"ACS batch served {sum(len(f) for f in batch.waiters.values())} request(s) for {len(tracts)} tract(s) with one call.")
+        for tract, futures in batch.waiters.items():
+            for future in futures:
+                if not future.done():
+                    # Each waiter gets its own copy, as a separate request would have returned.
+                    future.set_result(dict(rows.get(tract, {})))
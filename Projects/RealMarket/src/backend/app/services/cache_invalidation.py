@@ -0,0 +1,138 @@
+import asyncio
+import json
+import uuid
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.local_cache import LocalCache
+
+if TYPE_CHECKING:
+    import asyncpg
+
+# Identifies this worker process, so it can ignore its own notifications
+# (it has already evicted locally before publishing).
+WORKER_ID = uuid.uuid4().hex
+
+# Postgres caps NOTIFY payloads at 8000 bytes; stay well below it.
+_MAX_PAYLOAD_BYTES = 7000
+
+_NOTIFY = text("SELECT pg_notify(:channel, :payload)")
+
+
+def _payloads(namespace: str, keys: Sequence[str]) -> List[str]:
+    """Splits a key list into as few NOTIFY payloads as fit the size limit."""
+    payloads, chunk = [], []
+    for key in keys:
+        candidate = json.dumps({"origin": WORKER_ID, "ns": namespace, "keys": chunk + [key]})
+        if chunk and len(candidate.encode()) > _MAX_PAYLOAD_BYTES:
+            payloads.append(json.dumps({"origin": WORKER_ID, "ns": namespace, "keys": chunk}))
+            chunk = [key]
+        else:
+            chunk.append(key)
+    if chunk:
+        payloads.append(json.dumps({"origin": WORKER_ID, "ns": namespace, "keys": chunk}))
+    return payloads
+
+
+async def publish_invalidation(db: AsyncSession, namespace: str, keys: Sequence[str]) -> None:
+    """
+    Queues an invalidation for `keys` in the given session's transaction.
+    Postgres delivers NOTIFY only on commit, so other workers evict exactly when
+    the change becomes visible, and never for a rolled-back change.
+    """
+    for payload in _payloads(namespace, keys):
+        await db.execute(_NOTIFY, {"channel": settings.CACHE_INVALIDATION_CHANNEL, "payload": payload})
+
+
+async def publish_clear(db: AsyncSession, namespace: str) -> None:
+    """Queues a "drop everything" for the namespace, for bulk changes too large to list key by key."""
+    payload = json.dumps({"origin": WORKER_ID, "ns": namespace, "keys": "*"})
+    await db.execute(_NOTIFY, {"channel": settings.CACHE_INVALIDATION_CHANNEL, "payload": payload})
+
+
+class CacheInvalidationBus:
+    """
+    Listens for cache invalidations published by any worker and evicts the
+    matching entries from this worker's in-process caches.
+    Uses a dedicated asyncpg connection to the primary for LISTEN. If that
+    connection drops, all local caches are cleared (events may have been missed)
+    and the listener reconnects with backoff.
+    """
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._caches: Dict[str, LocalCache] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._connection: Optional["asyncpg.Connection"] = None
+
+    @classmethod
+    def from_settings(cls) -> "CacheInvalidationBus":
+        # asyncpg takes a plain libpq-style DSN, without SQLAlchemy's driver suffix.
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        return cls(dsn, settings.CACHE_INVALIDATION_CHANNEL)
+
+    def register(self, namespace: str, cache: LocalCache) -> None:
+        self._caches[namespace] = cache
+
+    def _clear_all(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed cache invalidation payload: {payload[:200]}")
+            return
+        if message.get("origin") == WORKER_ID:
+            return
+        cache = self._caches.get(message.get("ns"))
+        if cache is None:
+            return
+        keys = message.get("keys")
+        if keys == "*":
+            cache.clear()
+            logger.debug(f"Cleared local cache '{cache.name}' on remote invalidation.")
+        else:
+            evicted = cache.delete_many(keys or [])
+            logger.debug(f"Evicted {evicted} local '{cache.name}' entries on remote invalidation.")
+
+    async def _listen_forever(self) -> None:
+        import asyncpg
+
+        backoff = 1.0
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._connection = await asyncpg.connect(self.dsn)
+                self._connection.add_termination_listener(lambda _: lost.set())
+                await self._connection.add_listener(self.channel, self._on_notification)
+                logger.info(f"Listening for cache invalidations on channel '{self.channel}'.")
+                backoff = 1.0
+                await lost.wait()
+                logger.warning("Cache invalidation listener connection lost.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed: {e}. Retrying in {backoff:.0f}s.")
+            # Anything published while we were disconnected was missed.
+            self._clear_all()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen_forever(), name="cache-invalidation-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+        logger.info("Cache invalidation listener stopped.")
@@ -1,33 +1,108 @@
 import re
 import json
-from typing import List, Optional
+import datetime
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import ValidationError
 from loguru import logger
 
+from app.core.compression import EncodedBody
+from app.core.local_cache import LocalCache
 from app.models.population import PopulationCache
 from app.schemas.population import PopulationDataResponse
+from app.services.cache_invalidation import publish_invalidation
+
+if TYPE_CHECKING:
+    from app.services.cache_writer import CacheWriteBehind
+
+# Invalidation namespace for the in-process response tier.
+RESPONSE_CACHE_NAMESPACE = "population"
+
+
+@dataclass
+class CachedResponse:
+    """A validated response and its serialized body (with any compressed variants)."""
+    response: PopulationDataResponse
+    body: EncodedBody
+
+    @classmethod
+    def from_response(cls, response: PopulationDataResponse, etag_version: str = "") -> "CachedResponse":
+        return cls(response, EncodedBody.from_model(response, etag_version=etag_version))
+
 
 class CacheManager:
     """Handles all database interactions for caching market data."""
 
+    def __init__(
+        self,
+        writer: Optional["CacheWriteBehind"] = None,
+        local_cache: Optional[LocalCache[CachedResponse]] = None,
+    ):
+        # When a write-behind writer is running, saves are queued instead of awaited.
+        self.writer = writer
+        # Optional per-worker tier in front of Postgres, kept coherent via LISTEN/NOTIFY.
+        self.local_cache = local_cache
+
     def _generate_cache_key(self, address: str) -> str:
         """Generates a consistent, normalized cache key for an address."""
         normalized_address = re.sub(r'\s+', ' ', address).strip().lower()
         # Versioning the cache key is good practice for when the response schema changes.
         return f"{normalized_address}|tract|5_year_projected_v3"
 
+    def cache_key(self, address: str) -> str:
+        """The key an address is cached under (async jobs are deduplicated on it too)."""
+        return self._generate_cache_key(address)
+
     async def get_cached_response(self, address: str, db: AsyncSession) -> Optional[PopulationDataResponse]:
         """
         Retrieves and validates a cached response from the database.
         Returns None if not found or if data is invalid.
         """
+        entry = await self.get_cached_entry(address, db)
+        return entry.response if entry else None
+
+    async def get_validators(self, address: str, db: AsyncSession) -> Optional[Tuple[str, datetime.datetime]]:
+        """
+        The cached entry's ETag and last-modified time, read from the local tier or from
+        two narrow columns, without loading or validating the response JSON.
+        None when there is no entry (or it predates stored ETags).
+        """
+        cache_key = self._generate_cache_key(address)
+        if self.local_cache is not None:
+            local_hit = self.local_cache.get(cache_key)
+            if local_hit is not None:
+                return local_hit.body.etag, local_hit.body.last_modified
+
+        stmt = (
+            select(PopulationCache.etag, PopulationCache.updated_at)
+            .where(PopulationCache.address_key == cache_key)
+            .execution_options(use_replica=True)
+        )
+        row = (await db.execute(stmt)).first()
+        if row is None or row.etag is None:
+            return None
+        return row.etag, row.updated_at
+
+    async def get_cached_entry(self, address: str, db: AsyncSession) -> Optional[CachedResponse]:
+        """Like `get_cached_response`, but also returns the body and its stored gzip variant."""
         cache_key = self._generate_cache_key(address)
         logger.info(f"Checking cache for key: {cache_key}")
 
-        stmt = select(PopulationCache).where(PopulationCache.address_key == cache_key)
+        if self.local_cache is not None:
+            local_hit = self.local_cache.get(cache_key)
+            if local_hit is not None:
+                logger.success(f"Local cache HIT for key: {cache_key}")
+                return local_hit
+
+        # Rows that fill the local tier are read from the primary: a lagging replica could
+        # hand back a row whose eviction NOTIFY has already been processed, and the stale
+        # copy would then be served for the tier's whole TTL.
+        use_replica = self.local_cache is None
+        stmt = select(PopulationCache).where(PopulationCache.address_key == cache_key).execution_options(use_replica=use_replica)
         result = await db.execute(stmt)
         cached_data = result.scalars().first()
 
@@ -40,28 +115,93 @@ class CacheManager:
             # This prevents serving stale data if the schema has changed.
             validated_response = PopulationDataResponse.model_validate(cached_data.response_data)
             logger.success(f"Cache HIT and validation successful for key: {cache_key}")
-            return validated_response
+            variants = {"gzip": cached_data.response_gzip} if cached_data.response_gzip else None
+            body = EncodedBody.from_model(
+                validated_response, variants, etag=cached_data.etag, last_modified=cached_data.updated_at
+            )
+            entry = CachedResponse(validated_response, body)
+            if self.local_cache is not None:
+                self.local_cache.set(cache_key, entry)
+            return entry
         except ValidationError as e:
             logger.warning(f"Cache data for key '{cache_key}' is invalid. Refetching will be required. Error: {e}")
             # The data is corrupt or outdated, so we treat it as a cache miss.
             return None
 
-    async def set_cached_response(self, address: str, response_data: PopulationDataResponse, db: AsyncSession) -> None:
-        """Saves a new response to the cache."""
+    async def set_cached_response(
+        self, address: str, response_data: PopulationDataResponse, db: AsyncSession, etag_version: str = ""
+    ) -> CachedResponse:
+        """
+        Saves a response to the cache. With write-behind enabled this only queues the
+        entry, so the caller never waits on the database; otherwise it upserts inline.
+        Returns the cache entry, whose body is shared with the local tier. `etag_version`
+        is carried in the stored ETag (see `content_etag`).
+        """
         cache_key = self._generate_cache_key(address)
+        entry = CachedResponse.from_response(response_data, etag_version)
+        if self.local_cache is not None:
+            self.local_cache.set(cache_key, entry)
+        if self.writer and self.writer.enqueue(cache_key, entry):
+            logger.info(f"Queued cache write for key: {cache_key}")
+            return entry
+
         logger.info(f"Saving new data to cache with key: {cache_key}")
-        
-        # The response_data is a Pydantic model, so we need to dump it to a dict
-        # that can be serialized to JSON.
-        response_dict = json.loads(response_data.model_dump_json(by_alias=True))
+        await self.upsert_entries([(cache_key, entry)], db)
+        logger.success(f"Successfully saved data to cache for key: {cache_key}")
+        return entry
 
-        new_cache_entry = PopulationCache(
-            address_key=cache_key,
-            response_data=response_dict
+    @staticmethod
+    async def upsert_entries(entries: List[Tuple[str, CachedResponse]], db: AsyncSession) -> None:
+        """
+        Inserts or refreshes cache entries in one statement and commits.
+        ON CONFLICT makes concurrent saves of the same address_key safe: the last write wins
+        instead of failing with an IntegrityError. Other workers are told to drop their
+        local copies of these keys once the transaction commits.
+        """
+        # The body is already serialized JSON; the gzip variant is built here (off the
+        # request path under write-behind) and shared with the local tier's copy.
+        rows = [
+            {
+                "address_key": cache_key,
+                "response_data": json.loads(entry.body.identity),
+                "response_gzip": entry.body.ensure("gzip"),
+                "etag": entry.body.etag,
+            }
+            for cache_key, entry in entries
+        ]
+        stmt = pg_insert(PopulationCache).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PopulationCache.address_key],
+            set_={
+                "response_data": stmt.excluded.response_data,
+                "response_gzip": stmt.excluded.response_gzip,
+                "etag": stmt.excluded.etag,
+                "updated_at": func.now(),
+            },
         )
-        db.add(new_cache_entry)
+        await db.execute(stmt)
+        await publish_invalidation(db, RESPONSE_CACHE_NAMESPACE, [cache_key for cache_key, _ in entries])
         await db.commit()
-        logger.success(f"Successfully saved data to cache for key: {cache_key}")
+
+    @staticmethod
+    async def expire_county_validators(county_fips: str, db: AsyncSession) -> int:
+        """
+        Clears the stored ETags of every cached response in a county and evicts their
+        local copies (in the caller's transaction), so conditional requests for them go
+        through a full read, which refreshes the county's precomputed sections.
+        """
+        stmt = (
+            update(PopulationCache)
+            .where(
+                PopulationCache.response_data[("fips", "state")].as_string() == county_fips[:2],
+                PopulationCache.response_data[("fips", "county")].as_string() == county_fips[2:],
+            )
+            .values(etag=None)
+            .returning(PopulationCache.address_key)
+        )
+        keys = list((await db.execute(stmt)).scalars())
+        await publish_invalidation(db, RESPONSE_CACHE_NAMESPACE, keys)
+        return len(keys)
 
     async def get_all_cached_addresses(self, db: AsyncSession) -> List[str]:
         """Retrieves a distinct list of all user-facing addresses from the cache."""
@@ -70,7 +210,7 @@ class CacheManager:
         # JSONB query to extract the 'search_address' field from the response_data column.
         address_column = PopulationCache.response_data['search_address'].as_string().label("search_address")
         
-        stmt = select(address_column).distinct().order_by(address_column)
+        stmt = select(address_column).distinct().order_by(address_column).execution_options(use_replica=True)
         
         result = await db.execute(stmt)
         addresses = result.scalars().all()
@@ -83,9 +223,18 @@ class CacheManager:
         cache_key = self._generate_cache_key(address)
         logger.info(f"Attempting to delete cache entry for key: {cache_key}")
 
+        if self.writer is not None:
+            # A queued write for this key would otherwise recreate the entry after the delete.
+            await self.writer.discard(cache_key)
+
         stmt = delete(PopulationCache).where(PopulationCache.address_key == cache_key)
         result = await db.execute(stmt)
+        await publish_invalidation(db, RESPONSE_CACHE_NAMESPACE, [cache_key])
         await db.commit()
+        # Evicted only once the delete is visible: this worker ignores its own NOTIFY, so a
+        # read racing the transaction would otherwise put the row straight back.
+        if self.local_cache is not None:
+            self.local_cache.delete(cache_key)
 
         if result.rowcount > 0:
             logger.success(f"Successfully deleted {result.rowcount} cache entry for key: {cache_key}")
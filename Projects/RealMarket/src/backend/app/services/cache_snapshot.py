@@ -0,0 +1,190 @@
+import json
+import typing
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+from pydantic import BaseModel
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.population import PopulationCache
+from app.schemas.population import PopulationDataResponse
+from app.services.cache_invalidation import publish_clear
+from app.services.cache_manager import RESPONSE_CACHE_NAMESPACE
+
+# Columns every snapshot starts with; the full response is kept so imports are lossless.
+KEY_COLUMNS = ("address_key", "updated_at", "response_data")
+
+_ARROW_SUFFIXES = {".arrow", ".feather", ".ipc"}
+
+# Column path (keys in the by-alias response JSON) and its Arrow type.
+ColumnSpec = Tuple[Tuple[str, ...], pa.DataType]
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    args = [a for a in typing.get_args(annotation) if a is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        return args[0]
+    return annotation
+
+
+def _arrow_type(annotation: Any) -> pa.DataType:
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        # Union[int, float] values (ValueWithMoe.value) are stored as doubles.
+        return pa.float64() if float in typing.get_args(annotation) else pa.string()
+    if annotation is bool:
+        return pa.bool_()
+    if annotation is int:
+        return pa.int64()
+    if annotation is float:
+        return pa.float64()
+    # Strings, Literals, and lists (trend series) encoded as JSON text.
+    return pa.string()
+
+
+def _leaf_columns(model: type, prefix: Tuple[str, ...] = ()) -> Iterator[ColumnSpec]:
+    """Walks a response model and yields one column per scalar leaf, in field order."""
+    for name, field in model.model_fields.items():
+        path = prefix + (field.alias or name,)
+        annotation = _unwrap_optional(field.annotation)
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            yield from _leaf_columns(annotation, path)
+        else:
+            yield path, _arrow_type(annotation)
+
+
+def snapshot_columns() -> List[ColumnSpec]:
+    return list(_leaf_columns(PopulationDataResponse))
+
+
+def snapshot_schema() -> pa.Schema:
+    """
+    One column per metric, named by its dotted path in the response
+    (e.g. `total_population.value`, `housing.median_home_value.relative_moe`).
+    Derived from the response model, so every batch of a stream has the same schema.
+    """
+    fields = [
+        pa.field("address_key", pa.string(), nullable=False),
+        pa.field("updated_at", pa.timestamp("us", tz="UTC")),
+        pa.field("response_data", pa.string(), nullable=False),
+    ]
+    fields += [pa.field(".".join(path), arrow_type) for path, arrow_type in snapshot_columns()]
+    return pa.schema(fields)
+
+
+def _leaf_value(data: Any, path: Sequence[str]) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    if isinstance(data, (list, dict)):
+        return json.dumps(data, separators=(",", ":"))
+    return data
+
+
+def _record_batch(rows: Sequence[Any], schema: pa.Schema, columns: List[ColumnSpec]) -> pa.RecordBatch:
+    arrays: Dict[str, List[Any]] = {
+        "address_key": [row.address_key for row in rows],
+        "updated_at": [row.updated_at for row in rows],
+        "response_data": [json.dumps(row.response_data, separators=(",", ":")) for row in rows],
+    }
+    for path, _ in columns:
+        arrays[".".join(path)] = [_leaf_value(row.response_data, path) for row in rows]
+    return pa.RecordBatch.from_pydict(arrays, schema=schema)
+
+
+def _is_arrow(path: Path) -> bool:
+    return path.suffix.lower() in _ARROW_SUFFIXES
+
+
+async def export_cache_snapshot(db: AsyncSession, path: Path, batch_size: int = 5000) -> int:
+    """
+    Streams every population_cache row into a columnar file and returns the row count.
+    `.parquet` paths get zstd-compressed Parquet; `.arrow`/`.feather`/`.ipc` get an Arrow
+    IPC file. Rows are fetched with a server-side cursor `batch_size` at a time, so memory
+    stays flat however large the cache is.
+    """
+    schema = snapshot_schema()
+    columns = snapshot_columns()
+    if _is_arrow(path):
+        writer = pa.ipc.new_file(str(path), schema)
+    else:
+        writer = pq.ParquetWriter(str(path), schema, compression="zstd")
+
+    stmt = (
+        select(PopulationCache.address_key, PopulationCache.updated_at, PopulationCache.response_data)
+        .order_by(PopulationCache.id)
+        .execution_options(yield_per=batch_size)
+    )
+    total = 0
+    try:
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            writer.write_batch(_record_batch(rows, schema, columns))
+            total += len(rows)
+            logger.debug(f"Exported {total} cache rows to {path}.")
+    finally:
+        writer.close()
+    logger.success(f"Exported {total} cache rows to {path}.")
+    return total
+
+
+def _read_batches(path: Path, batch_size: int) -> Iterator[pa.RecordBatch]:
+    if _is_arrow(path):
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).select(list(KEY_COLUMNS))
+    else:
+        yield from pq.ParquetFile(str(path)).iter_batches(batch_size=batch_size, columns=list(KEY_COLUMNS))
+
+
+_CREATE_STAGING = text(
+    "CREATE TEMP TABLE population_cache_import "
+    "(address_key text NOT NULL, updated_at timestamptz, response_data json NOT NULL) ON COMMIT DROP"
+)
+
+# Duplicate keys in a snapshot keep their newest row; an existing entry is only
+# replaced when the snapshot's copy is newer. Its stored gzip body and ETag belong to
+# the old JSON, so they are cleared and rebuilt from response_data when next read.
+_MERGE_STAGING = text("""
+    INSERT INTO population_cache (address_key, response_data, created_at, updated_at)
+    SELECT DISTINCT ON (address_key)
+           address_key, response_data, coalesce(updated_at, now()), coalesce(updated_at, now())
+    FROM population_cache_import
+    ORDER BY address_key, updated_at DESC NULLS LAST
+    ON CONFLICT (address_key) DO UPDATE
+        SET response_data = EXCLUDED.response_data, updated_at = EXCLUDED.updated_at,
+            response_gzip = NULL, etag = NULL
+        WHERE population_cache.updated_at < EXCLUDED.updated_at
+""")
+
+
+async def import_cache_snapshot(db: AsyncSession, path: Path, batch_size: int = 5000) -> int:
+    """
+    Bulk-loads a snapshot written by `export_cache_snapshot` and returns the number of
+    rows inserted or refreshed. Rows are COPY'd into a temporary staging table and merged
+    in one statement, all in a single transaction; local caches in every worker are
+    cleared on commit.
+    """
+    connection = await db.connection()
+    raw = (await connection.get_raw_connection()).driver_connection
+    await db.execute(_CREATE_STAGING)
+
+    staged = 0
+    for batch in _read_batches(path, batch_size):
+        data = batch.to_pydict()
+        records = zip(data["address_key"], data["updated_at"], data["response_data"])
+        await raw.copy_records_to_table("population_cache_import", records=records, columns=list(KEY_COLUMNS))
+        staged += batch.num_rows
+        logger.debug(f"Staged {staged} cache rows from {path}.")
+
+    result = await db.execute(_MERGE_STAGING)
+    await publish_clear(db, RESPONSE_CACHE_NAMESPACE)
+    await db.commit()
+    logger.success(f"Imported {result.rowcount} of {staged} cache rows from {path}.")
+    return result.rowcount
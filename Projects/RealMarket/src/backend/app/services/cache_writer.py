@@ -0,0 +1,120 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.services.cache_manager import CacheManager, CachedResponse
+
+# Pushed onto the queue by stop() so the worker flushes what it has and exits.
+_STOP = object()
+
+PendingWrite = Tuple[str, CachedResponse]
+
+
+class CacheWriteBehind:
+    """
+    Persists cache entries off the request path.
+    Entries are queued by CacheManager and written by a single background task
+    that batches up to `batch_size` entries (or whatever arrived within
+    `flush_interval` seconds) into one upsert transaction.
+
+    Only the newest queued entry per key is written, and `discard` withdraws a key's
+    pending write (waiting out a flush already writing it), so a cache delete is never
+    undone by an older queued write landing after it.
+    """
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        batch_size: int,
+        flush_interval: float,
+        max_queue_size: int,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        # Newest queued entry per key; queue items whose entry is no longer here are skipped.
+        self._pending: Dict[str, CachedResponse] = {}
+        # Keys in the flush currently running, and a signal when it finishes.
+        self._flushing: Set[str] = set()
+        self._flushed = asyncio.Event()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="cache-write-behind")
+        logger.info(f"Cache write-behind started (batch_size={self.batch_size}, flush_interval={self.flush_interval}s).")
+
+    def enqueue(self, cache_key: str, entry: CachedResponse) -> bool:
+        """Queues an entry for persistence. Returns False if the queue is full or the writer is stopped."""
+        if self._task is None or self._task.done():
+            return False
+        try:
+            self._queue.put_nowait((cache_key, entry))
+            self._pending[cache_key] = entry
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Cache write-behind queue is full; writing '{cache_key}' inline.")
+            return False
+
+    async def discard(self, cache_key: str) -> None:
+        """Drops any pending write for `cache_key` and waits until no flush is writing it."""
+        self._pending.pop(cache_key, None)
+        while cache_key in self._flushing:
+            self._flushed.clear()
+            await self._flushed.wait()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[PendingWrite] = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingWrite]) -> None:
+        # A key may be queued twice (Postgres rejects an upsert that touches the same row
+        # twice) or discarded since; write only the newest entry still pending per key.
+        latest = {
+            cache_key: entry for cache_key, entry in batch if self._pending.get(cache_key) is entry
+        }
+        for cache_key in latest:
+            del self._pending[cache_key]
+        if not latest:
+            return
+        self._flushing = set(latest)
+        try:
+            async with self.session_factory() as db:
+                await CacheManager.upsert_entries(list(latest.items()), db)
+            logger.success(f"Write-behind flushed {len(latest)} cache entr{'y' if len(latest) == 1 else 'ies'}.")
+        except Exception as e:
+            # The cache is best-effort: a failed flush only means a future miss.
+            logger.error(f"Cache write-behind flush of {len(latest)} entries failed: {e}")
+        finally:
+            self._flushing = set()
+            self._flushed.set()
+
+    async def stop(self) -> None:
+        """Flushes everything still queued, then stops the worker."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+        logger.info("Cache write-behind stopped.")
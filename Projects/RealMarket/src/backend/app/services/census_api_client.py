@@ -1,14 +1,22 @@
 import asyncio
-from typing import Dict, List, Any, Literal, Optional
-from httpx import AsyncClient, HTTPStatusError
+from typing import TYPE_CHECKING, Dict, List, Any, Literal, Optional
+from httpx import HTTPStatusError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from fastapi import HTTPException
 from loguru import logger
 
 from app.schemas.population import FipsCode
+from app.core.census_keys import CensusKeyPool, get_census_key_pool
 from app.core.config import settings
+from app.core.upstream_clients import UpstreamClients
+from app.core.tracing import span
+from app.services.migration_flows import flow_totals
+
+if TYPE_CHECKING:
+    from app.services.acs_batcher import AcsBatchPlanner
 
 LATEST_PEP_YEAR = 2019 # NOTE: PEP data is not updated as frequently as ACS
+MIGRATION_FLOWS_YEAR = 2022
 
 # Define a retry strategy for network-related or server-side errors
 retry_strategy = retry(
@@ -23,15 +31,22 @@ class CensusAPIClient:
     A client for interacting with various U.S. Census Bureau APIs.
     Handles request creation, error handling, and data parsing.
     """
-    def __init__(self, http_client: AsyncClient):
+    def __init__(
+        self,
+        http_client: UpstreamClients,
+        key_pool: Optional[CensusKeyPool] = None,
+        batcher: Optional["AcsBatchPlanner"] = None,
+    ):
         self.http_client = http_client
-        self.api_key = settings.CENSUS_API_KEY
+        self.batcher = batcher
+        # Every Census API request is signed by the key pool, which spreads load and backs off exhausted keys.
+        self.key_pool = key_pool or get_census_key_pool()
 
     @retry_strategy
     async def _make_request(self, url: str, params: Dict[str, Any]) -> List[List[Any]]:
         """A generic, retryable method to make requests to the Census API."""
         try:
-            response = await self.http_client.get(url, params=params)
+            response = await self.key_pool.get(self.http_client, url, params)
             response.raise_for_status()
 
             # Handle 204 No Content response from Census API, which indicates no data is available.
@@ -84,11 +99,14 @@ class CensusAPIClient:
         variables: List[str],
         endpoint: Literal["acs/acs5", "acs/acs5/subject", "acs/acs5/profile"] = "acs/acs5"
     ) -> Dict[str, Any]:
-        base_url = f"https://api.census.gov/data/{year}/{endpoint}"
+        if geo_level == 'tract' and self.batcher is not None:
+            # Concurrent single-tract requests are merged into multi-tract calls.
+            return await self.batcher.fetch(fips.state, fips.county, fips.tract, year, endpoint, variables)
+
+        base_url = f"{settings.CENSUS_API_BASE_URL}/data/{year}/{endpoint}"
         params = {
             "get": ",".join(('NAME', *variables)),
             **self._get_geo_params(fips, geo_level),
-            "key": self.api_key,
         }
 
         logger.info(
@@ -125,7 +143,8 @@ class CensusAPIClient:
         for i in range(0, len(all_vars), chunk_size):
             chunk = all_vars[i:i + chunk_size]
             try:
-                result = await self.fetch_acs_data(fips, year, geo_level, chunk)
+                with span("census.acs_chunk", year=year, geo_level=geo_level, chunk=i // chunk_size, variables=len(chunk)):
+                    result = await self.fetch_acs_data(fips, year, geo_level, chunk)
                 if result:
                     merged_results.update(result)
             except HTTPException as e:
@@ -133,24 +152,136 @@ class CensusAPIClient:
                 logger.warning(f"Failed to fetch a chunk of ACS data: {e.detail}")
         return merged_results
 
+    async def fetch_acs_rows(
+        self,
+        state: str,
+        county: str,
+        tracts: List[str],
+        year: int,
+        variables: List[str],
+        endpoint: Literal["acs/acs5", "acs/acs5/subject", "acs/acs5/profile"] = "acs/acs5",
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches ACS variables for several tracts of one county in a single request
+        (`for=tract:a,b,...`), keyed by tract code. Raises like `_make_request` on failure.
+        """
+        base_url = f"{settings.CENSUS_API_BASE_URL}/data/{year}/{endpoint}"
+        params = {
+            "get": ",".join(('NAME', *variables)),
+            "for": f"tract:{','.join(tracts)}",
+            "in": f"state:{state}+county:{county}",
+        }
+        data = await self._make_request(base_url, params)
+        results: Dict[str, Dict[str, Any]] = {}
+        if not data:
+            return results
+        header = data[0]
+        for values in data[1:]:
+            raw_data = dict(zip(header, values))
+            row = results.setdefault(raw_data["tract"], {"NAME": raw_data.get("NAME")})
+            for var in variables:
+                row[var] = self._parse_census_value(raw_data.get(var))
+        return results
+
+    async def fetch_acs_for_tracts(
+        self,
+        state: str,
+        county: str,
+        tracts: List[str],
+        year: int,
+        variables: List[str],
+        endpoint: Literal["acs/acs5", "acs/acs5/subject", "acs/acs5/profile"] = "acs/acs5",
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches ACS variables for many tracts of one county, keyed by tract code.
+        Variables and tracts are chunked to respect the API's variable limit and keep
+        URLs short; a failed chunk is logged and skipped.
+        """
+        var_chunk_size, tract_chunk_size = 45, 50
+        requests = [
+            self.fetch_acs_rows(state, county, tracts[j:j + tract_chunk_size], year, variables[i:i + var_chunk_size], endpoint)
+            for i in range(0, len(variables), var_chunk_size)
+            for j in range(0, len(tracts), tract_chunk_size)
+        ]
+        logger.info(f"Fetching {endpoint} data for year {year}, {len(tracts)} tracts in {state}{county} with {len(requests)} request(s).")
+        responses = await asyncio.gather(*requests, return_exceptions=True)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for rows in responses:
+            if isinstance(rows, Exception):
+                logger.warning(f"Failed to fetch a multi-tract ACS chunk for {state}{county}: {rows}")
+                continue
+            for tract, row in rows.items():
+                results.setdefault(tract, {}).update(row)
+        return results
+
+    async def fetch_acs_tracts_in_state(
+        self,
+        state: str,
+        year: int,
+        variables: List[str],
+        endpoint: Literal["acs/acs5", "acs/acs5/subject", "acs/acs5/profile"] = "acs/acs5",
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches ACS variables for every tract of a state (`for=tract:*&in=state:SS`),
+        keyed by 11-digit GEOID. Variables are chunked to the API's limit; a failed
+        chunk raises, since a partial state would leave silent gaps in bulk extracts.
+        """
+        base_url = f"{settings.CENSUS_API_BASE_URL}/data/{year}/{endpoint}"
+        var_chunk_size = 45
+        results: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(variables), var_chunk_size):
+            chunk = variables[i:i + var_chunk_size]
+            params = {"get": ",".join(('NAME', *chunk)), "for": "tract:*", "in": f"state:{state}"}
+            data = await self._make_request(base_url, params)
+            if not data:
+                continue
+            header = data[0]
+            for values in data[1:]:
+                raw_data = dict(zip(header, values))
+                geoid = f"{raw_data['state']}{raw_data['county']}{raw_data['tract']}"
+                row = results.setdefault(geoid, {"NAME": raw_data.get("NAME")})
+                for var in chunk:
+                    row[var] = self._parse_census_value(raw_data.get(var))
+        return results
+
+    async def fetch_states(self, year: int) -> List[str]:
+        """Lists the state FIPS codes (including DC and Puerto Rico) in the ACS state geography."""
+        base_url = f"{settings.CENSUS_API_BASE_URL}/data/{year}/acs/acs5"
+        data = await self._make_request(base_url, {"get": "NAME", "for": "state:*"})
+        if not data:
+            return []
+        state_index = data[0].index("state")
+        return sorted(row[state_index] for row in data[1:])
+
+    async def fetch_counties_in_state(self, state: str, year: int) -> List[str]:
+        """Lists the county FIPS codes of a state from the ACS county geography."""
+        base_url = f"{settings.CENSUS_API_BASE_URL}/data/{year}/acs/acs5"
+        params = {"get": "NAME", "for": "county:*", "in": f"state:{state}"}
+        data = await self._make_request(base_url, params)
+        if not data:
+            return []
+        county_index = data[0].index("county")
+        return sorted(row[county_index] for row in data[1:])
+
     async def fetch_pep_county_components(self, fips: FipsCode) -> Optional[Dict[str, Any]]:
         """
         Fetches county-level population and components of change from the Census PEP datasets.
         This requires two separate API calls as POP and components are in different datasets.
         """
         # --- Population ---
-        pop_url = f"https://api.census.gov/data/{LATEST_PEP_YEAR}/pep/population"
+        pop_url = f"{settings.CENSUS_API_BASE_URL}/data/{LATEST_PEP_YEAR}/pep/population"
         pop_params = {
             "get": "POP",
-            "for": f"county:{fips.county}", "in": f"state:{fips.state}", "key": self.api_key
+            "for": f"county:{fips.county}", "in": f"state:{fips.state}"
         }
 
         # --- Components ---
-        comp_url = f"https://api.census.gov/data/{LATEST_PEP_YEAR}/pep/components"
+        comp_url = f"{settings.CENSUS_API_BASE_URL}/data/{LATEST_PEP_YEAR}/pep/components"
         comp_vars = "BIRTHS,DEATHS,DOMESTICMIG,INTERNATIONALMIG,NATURALINC"
         comp_params = {
             "get": comp_vars,
-            "for": f"county:{fips.county}", "in": f"state:{fips.state}", "key": self.api_key
+            "for": f"county:{fips.county}", "in": f"state:{fips.state}"
         }
 
         try:
@@ -187,21 +318,42 @@ class CensusAPIClient:
             return None
 
     async def fetch_migration_flows(self, fips: FipsCode) -> Optional[Dict[str, Any]]:
-        """Fetches county-to-county migration flow data."""
-        base_url = f"https://api.census.gov/data/2022/acs/flows"
-        variables = "MOVEDIN,MOVEDOUT,MOVEDNET"
-        # Note: This API requires querying for the specific county
-        params = {"get": variables, "for": f"county:{fips.county}", "in": f"state:{fips.state}", "key": self.api_key}
+        """
+        Fetches a county's migration totals (MOVEDIN/MOVEDOUT/MOVEDNET). The API returns one
+        row per partner county or region, so the totals are summed over them exactly as
+        the migration flows store does.
+        """
+        rows = await self._fetch_flow_rows("GEOID1,GEOID2,MOVEDIN,MOVEDOUT", f"county:{fips.county}", fips.state, MIGRATION_FLOWS_YEAR)
+        return flow_totals(rows).get(f"{fips.state}{fips.county}")
+
+    async def fetch_county_flows_in_state(self, state: str, year: int = MIGRATION_FLOWS_YEAR) -> List[Dict[str, Any]]:
+        """
+        Fetches every county-to-county flow row for the counties of a state: one row per
+        (county, partner) with GEOID1/GEOID2, names and MOVEDIN (partner -> county) and
+        MOVEDOUT (county -> partner). Partners abroad have no county GEOID2.
+        """
+        return await self._fetch_flow_rows("GEOID1,GEOID2,FULL1_NAME,FULL2_NAME,MOVEDIN,MOVEDOUT", "county:*", state, year)
+
+    async def _fetch_flow_rows(self, variables: str, counties: str, state: str, year: int) -> List[Dict[str, Any]]:
+        base_url = f"{settings.CENSUS_API_BASE_URL}/data/{year}/acs/flows"
+        params = {"get": variables, "for": counties, "in": f"state:{state}"}
         data = await self._make_request(base_url, params)
-        if not data: return None
-        header, values = data[0], data[1]
-        return dict(zip(header, [self._parse_census_value(v) for v in values]))
+        if not data:
+            return []
+        header = data[0]
+        rows = []
+        for values in data[1:]:
+            row = dict(zip(header, values))
+            row["MOVEDIN"] = self._parse_census_value(row.get("MOVEDIN"))
+            row["MOVEDOUT"] = self._parse_census_value(row.get("MOVEDOUT"))
+            rows.append(row)
+        return rows
 
     async def fetch_walkability_scores(self, address: str, lat: float, lon: float) -> Dict[str, Any] | None:
         if not settings.WALKSCORE_API_KEY:
             logger.warning("WALKSCORE_API_KEY not set. Skipping walkability scores.")
             return None
-        base_url = "https://api.walkscore.com/score"
+        base_url = f"{settings.WALKSCORE_BASE_URL}/score"
         params = {
             "format": "json",
             "address": address,
@@ -225,9 +377,63 @@ class CensusAPIClient:
             logger.error(f"Could not fetch Walk Score data: {e}")
             return None
 
+    async def fetch_tracts_in_radius(self, lat: float, lon: float, radius_miles: float) -> List[Dict[str, Any]]:
+        """
+        Fetches GeoJSON features for every tract whose boundary intersects a circle,
+        using a TIGERweb spatial query. Pages through results when the server caps them.
+        """
+        params = {
+            "geometry": f"{lon},{lat}",
+            "geometryType": "esriGeometryPoint",
+            "inSR": 4326,
+            "spatialRel": "esriSpatialRelIntersects",
+            "distance": radius_miles,
+            "units": "esriSRUnit_StatuteMile",
+            "outFields": "STATE,COUNTY,TRACT",
+            "returnGeometry": "true",
+            "outSR": 4326,
+        }
+        try:
+            return await self._query_tract_features(params)
+        except Exception as e:
+            logger.error(f"Failed to query tracts within {radius_miles} mi of ({lat}, {lon}): {e}")
+            raise HTTPException(status_code=503, detail="Could not retrieve geographic data for the trade area.")
+
+    async def fetch_tract_boundaries_in_state(self, state: str) -> List[Dict[str, Any]]:
+        """
+        Fetches the GeoJSON boundary of every tract in a state (the same TIGERweb layer as
+        `fetch_tract_geojson`), with coordinates at a fixed precision so tracts that share a
+        boundary report identical vertices.
+        """
+        params = {
+            "where": f"STATE='{state}'",
+            "outFields": "STATE,COUNTY,TRACT",
+            "returnGeometry": "true",
+            "outSR": 4326,
+            "geometryPrecision": 6,
+        }
+        return await self._query_tract_features(params, page_size=250)
+
+    async def _query_tract_features(self, params: Dict[str, Any], page_size: int = 500) -> List[Dict[str, Any]]:
+        """Runs a TIGERweb tract query as GeoJSON, paging through results when the server caps them."""
+        base_url = f"{settings.TIGERWEB_BASE_URL}/arcgis/rest/services/TIGERweb/Tracts_Blocks/MapServer/2/query"
+        features: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            page_params = {**params, "resultOffset": offset, "resultRecordCount": page_size, "f": "geojson"}
+            response = await self.http_client.get(base_url, params=page_params)
+            response.raise_for_status()
+            data = response.json()
+            page = data.get("features") or []
+            features.extend(page)
+            exceeded = data.get("exceededTransferLimit") or (data.get("properties") or {}).get("exceededTransferLimit")
+            if not exceeded or not page:
+                return features
+            offset += len(page)
+
     async def fetch_tract_geojson(self, state: str, county: str, tract: str) -> Dict[str, Any]:
         """Fetches the GeoJSON boundary for a specific census tract from the Census TIGERweb API."""
-        base_url = "https://tigerweb.geo.census.gov/arcgis/rest/services/TIGERweb/Tracts_Blocks/MapServer/2/query"
+        base_url = f"{settings.TIGERWEB_BASE_URL}/arcgis/rest/services/TIGERweb/Tracts_Blocks/MapServer/2/query"
         params = {
             "where": f"STATE='{state}' AND COUNTY='{county}' AND TRACT='{tract}'",
             "outFields": "STATE,COUNTY,TRACT",
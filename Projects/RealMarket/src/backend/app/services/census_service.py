@@ -1,18 +1,32 @@
 import asyncio
-from typing import Dict, List, Any
+import datetime
+import hashlib
+import json
+from contextlib import AsyncExitStack
+from typing import Dict, List, Any, Optional, Tuple
 
-from httpx import AsyncClient
 from fastapi import HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
 from app.schemas.population import (
-    PopulationDataResponse, WalkabilityScores, BenchmarkData, PopulationTrendPoint, MigrationData, NaturalIncreaseData, PopulationDensity, Coordinates
+    PopulationDataResponse, WalkabilityScores, BenchmarkData, PopulationTrendPoint, MigrationData, NaturalIncreaseData, NeighborComparison, PopulationDensity, Coordinates
 )
-from app.services.cache_manager import CacheManager
+from app.services.cache_manager import CacheManager, CachedResponse
 from app.services.geocoding_service import GeocodingService
 from app.services.census_api_client import CensusAPIClient
 from app.services.data_processor import DataProcessor
+from app.services.county_percentiles import CountyPercentileStore
+from app.services.tract_matrix import TractMatrix
+from app.services.migration_flows import MigrationFlows
+from app.services.tract_adjacency import TractAdjacency, compare_neighbors
+from app.core.admission import AdmissionController
+from app.core.compression import EncodedBody
+from app.core.overload import AdaptiveLimiter, Overloaded
+from app.core.config import settings
+from app.core.http_caching import etag_version
+from app.core.local_cache import LocalCache
+from app.core.tracing import span, traced
 
 # --- Constants ---
 LATEST_ACS_YEAR = 2023
@@ -35,6 +49,16 @@ ACS_VARS = {
 SUBJECT_VARS = {"S1701_C03_001E": "poverty_rate_percent"}
 PROFILE_VARS = {"DP03_0025E": "mean_commute_time"}
 
+async def _resolved(value: Any) -> Any:
+    """Wraps an already-known section so it can sit in the task table with the fetches."""
+    return value
+
+def _stores_version(stores: List[Any]) -> str:
+    """A short tag naming the given store builds ('' for none), for `content_etag`."""
+    builds = [f"{type(store).__name__}:{store.version}" for store in stores if store is not None]
+    return hashlib.blake2b("|".join(builds).encode(), digest_size=4).hexdigest() if builds else ""
+
+
 def _expand_vars_with_moe(var_dict: Dict[str, str]) -> List[str]:
     """Expands a dict of estimate variables to include margin of error variables."""
     all_vars = []
@@ -51,43 +75,161 @@ class CensusService:
         geocoding_service: GeocodingService = Depends(),
         api_client: CensusAPIClient = Depends(),
         data_processor: DataProcessor = Depends(),
+        percentile_store: Optional[CountyPercentileStore] = None,
+        tract_matrix: Optional[TractMatrix] = None,
+        boundary_cache: Optional[LocalCache[EncodedBody]] = None,
+        admission: Optional[AdmissionController] = None,
+        miss_limiter: Optional[AdaptiveLimiter] = None,
+        migration_flows: Optional[MigrationFlows] = None,
+        tract_adjacency: Optional[TractAdjacency] = None,
     ):
         self.cache = cache_manager
         self.geocoder = geocoding_service
         self.api_client = api_client
         self.processor = data_processor
+        self.percentiles = percentile_store
+        # National ACS extract; when it covers the tract, the latest-year sections need no upstream calls.
+        self.tract_matrix = tract_matrix if tract_matrix is not None and tract_matrix.year == LATEST_ACS_YEAR else None
+        # Serialized tract boundaries (with compressed variants); boundaries only change between vintages.
+        self.boundaries = boundary_cache
+        # Per-user limits on cache misses, the only path that spends upstream capacity.
+        self.admission = admission
+        # Worker-wide adaptive cap on misses; sheds cold work when upstreams or the loop are saturated.
+        self.miss_limiter = miss_limiter
+        # County-to-county ACS flows; covered counties need no live flows call and get top partners.
+        self.migration_flows = migration_flows
+        # Tracts sharing a boundary; with the tract matrix, neighbors are compared without any fetches.
+        self.tract_adjacency = tract_adjacency
+        # Tags every ETag with the builds of the mapped stores that derived sections come from.
+        derived_from = [self.migration_flows]
+        if self.tract_adjacency is not None and self.tract_matrix is not None:
+            derived_from += [self.tract_adjacency, self.tract_matrix]
+        self.etag_version = _stores_version(derived_from)
         logger.info("CensusService initialized with all sub-services.")
 
     async def get_market_data_for_address(self, address: str, db: AsyncSession) -> PopulationDataResponse:
-        cached_response = await self.cache.get_cached_response(address, db)
-        if cached_response:
-            return cached_response
+        return (await self.get_market_data_entry(address, db)).response
+
+    async def get_market_data_validators(self, address: str, db: AsyncSession) -> Optional[Tuple[str, datetime.datetime]]:
+        """
+        ETag and last-modified time of the cached response, without loading it. None when
+        the ETag was issued against other builds of the file-backed stores, whose sections
+        may have changed; the full lookup then refreshes the entry. (A rebuilt county
+        percentile table clears its county's ETags itself.)
+        """
+        validators = await self.cache.get_validators(address, db)
+        if validators is None or etag_version(validators[0]) != self.etag_version:
+            return None
+        return validators
+
+    async def get_cached_market_data_entry(self, address: str, db: AsyncSession) -> Optional[CachedResponse]:
+        """The cached response for an address, or None; never fetches."""
+        with span("cache.lookup"):
+            entry = await self.cache.get_cached_entry(address, db)
+        if entry is None:
+            return None
+        return await self._refresh_derived_sections(address, entry, db)
+
+    async def _derived_sections(self, response: PopulationDataResponse, db: AsyncSession) -> Dict[str, Any]:
+        """
+        Sections served from precomputed stores. They are lookups, so they are redone on
+        every read rather than trusted from the cache, which would keep them as they were
+        when the entry was built. A store that fails leaves its section as cached.
+        """
+        fips = response.fips
+        sections: Dict[str, Any] = {}
+        if self.percentiles is not None:
+            try:
+                sections["county_percentiles"] = await self.percentiles.get(fips.state, fips.county, fips.tract, db)
+            except Exception as e:
+                logger.warning(f"County percentiles lookup failed; serving the cached ones. Error: {e}")
+        if self.migration_flows is not None and response.migration is not None:
+            sections["migration"] = response.migration.model_copy(update=self._top_counties(fips))
+        if self.tract_adjacency is not None and self.tract_matrix is not None:
+            sections["neighbors"] = self._compare_neighbors(fips)
+        return sections
+
+    async def _refresh_derived_sections(self, address: str, entry: CachedResponse, db: AsyncSession) -> CachedResponse:
+        """
+        The entry with current derived sections. It is re-cached (with a new ETag) when they
+        changed or its ETag names other store builds, so validator-only revalidation works again.
+        """
+        with span("cache.refresh_derived"):
+            sections = await self._derived_sections(entry.response, db)
+        unchanged = all(getattr(entry.response, name) == value for name, value in sections.items())
+        if unchanged and etag_version(entry.body.etag) == self.etag_version:
+            return entry
+        logger.info(f"Precomputed data changed since '{address}' was cached; refreshing its entry.")
+        return await self.cache.set_cached_response(
+            address, entry.response.model_copy(update=sections), db, etag_version=self.etag_version
+        )
+
+    async def get_market_data_entry(self, address: str, db: AsyncSession, user_id: Optional[str] = None) -> CachedResponse:
+        """
+        The response for an address together with its serialized (and precompressed) body.
+        A miss made on behalf of `user_id` is subject to that user's admission limits.
+        """
+        cached_entry = await self.get_cached_market_data_entry(address, db)
+        if cached_entry:
+            return cached_entry
+
+        async with AsyncExitStack() as stack:
+            if self.miss_limiter is not None:
+                # Shed before charging the user or queueing for a slot.
+                self.miss_limiter.check()
+            if self.admission is not None and user_id is not None:
+                await stack.enter_async_context(self.admission.miss(user_id))
+            if self.miss_limiter is not None:
+                try:
+                    await stack.enter_async_context(self.miss_limiter.slot())
+                except Overloaded:
+                    # The limit can fill while this miss waited for admission; shed, it is not charged.
+                    if self.admission is not None:
+                        self.admission.refund_miss(user_id)
+                    raise
+            return await self._build_market_data_entry(address, db)
 
-        geo_info = await self.geocoder.geocode_address(address)
+    async def _build_market_data_entry(self, address: str, db: AsyncSession) -> CachedResponse:
+        with span("geocode"):
+            geo_info = await self.geocoder.geocode_address(address)
         fips, coords_dict, aland = geo_info['fips'], geo_info['coords'], geo_info['aland']
         coords = Coordinates(**coords_dict)
 
         historical_years = list(range(LATEST_ACS_YEAR - HISTORICAL_YEARS_COUNT + 1, LATEST_ACS_YEAR + 1))
         
         async def fetch_historical_trend(geo_level: str, years: List[int]):
-            tasks = [self.api_client.fetch_acs_data(fips, year, geo_level, ["B01003_001E"]) for year in years]
+            tasks = [
+                traced("census.trend_year", self.api_client.fetch_acs_data(fips, year, geo_level, ["B01003_001E"]), year=year, geo_level=geo_level)
+                for year in years
+            ]
             results = await asyncio.gather(*tasks)
             return sorted(
                 [PopulationTrendPoint(year=years[i], population=res["B01003_001E"]) for i, res in enumerate(results) if res and res.get("B01003_001E")],
                 key=lambda x: x.year
             )
 
-        tasks = {
-            "latest_year_data": self.api_client.fetch_large_acs_dataset(fips, LATEST_ACS_YEAR, 'tract', _expand_vars_with_moe(ACS_VARS)),
-            "subject_data": self.api_client.fetch_acs_data(fips, LATEST_ACS_YEAR, 'tract', _expand_vars_with_moe(SUBJECT_VARS), endpoint="acs/acs5/subject"),
-            "profile_data": self.api_client.fetch_acs_data(fips, LATEST_ACS_YEAR, 'tract', _expand_vars_with_moe(PROFILE_VARS), endpoint="acs/acs5/profile"),
+        latest_sections = self._latest_sections_from_matrix(fips)
+        if latest_sections is not None:
+            tasks = {name: _resolved(section) for name, section in latest_sections.items()}
+        else:
+            tasks = {
+                "latest_year_data": self.api_client.fetch_large_acs_dataset(fips, LATEST_ACS_YEAR, 'tract', _expand_vars_with_moe(ACS_VARS)),
+                "subject_data": self.api_client.fetch_acs_data(fips, LATEST_ACS_YEAR, 'tract', _expand_vars_with_moe(SUBJECT_VARS), endpoint="acs/acs5/subject"),
+                "profile_data": self.api_client.fetch_acs_data(fips, LATEST_ACS_YEAR, 'tract', _expand_vars_with_moe(PROFILE_VARS), endpoint="acs/acs5/profile"),
+            }
+        tasks.update({
             "tract_trend": fetch_historical_trend('tract', historical_years),
             "county_trend": fetch_historical_trend('county', historical_years),
             "county_drivers": self.api_client.fetch_pep_county_components(fips),
-            "migration_flows": self.api_client.fetch_migration_flows(fips),
+            "migration_flows": self._migration_flows_task(fips),
             "walkability_data": self.api_client.fetch_walkability_scores(address, lat=coords.lat, lon=coords.lon),
-        }
-        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        })
+        if self.percentiles is not None:
+            # Precomputed by app.jobs.county_percentiles; a table read, never a county-wide fetch.
+            tasks["county_percentiles"] = self.percentiles.get(fips.state, fips.county, fips.tract, db)
+        results = await asyncio.gather(
+            *(traced(f"task.{name}", task) for name, task in tasks.items()), return_exceptions=True
+        )
         task_results = dict(zip(tasks.keys(), results))
 
         for name, result in task_results.items():
@@ -124,6 +266,7 @@ class CensusService:
                     gross_migration=moved_in + moved_out,
                     domestic_migration=pep_drivers.get("DOMESTICMIG") or 0,
                     international_migration=pep_drivers.get("INTERNATIONALMIG") or 0,
+                    **self._top_counties(fips),
                 )
             natural_inc = pep_drivers.get("NATURALINC") or 0
             natural_increase_data = NaturalIncreaseData(
@@ -142,21 +285,68 @@ class CensusService:
         
         population_density = PopulationDensity(people_per_sq_mile=current_density, change_over_period=density_change)
 
-        response_data = self.processor.format_response_data(
-            address=address, geo_level='tract', coordinates=coords, aland=aland,
-            fips=fips, # <-- UPDATED
-            acs_data=acs_data,
-            subject_data=task_results["subject_data"],
-            profile_data=task_results["profile_data"],
-            trend=tract_trend,
-            projection=self.processor.project_tract_population(acs_data, county_trend),
-            benchmarks=BenchmarkData(county_trend=county_trend),
-            walkability=walkability, migration=migration_data, natural_increase=natural_increase_data,
-            population_density=population_density,
-        )
+        with span("processor.project"):
+            projection = self.processor.project_tract_population(acs_data, county_trend, tract_trend)
+
+        with span("processor.assemble"):
+            response_data = self.processor.format_response_data(
+                address=address, geo_level='tract', coordinates=coords, aland=aland,
+                fips=fips, # <-- UPDATED
+                acs_data=acs_data,
+                subject_data=task_results["subject_data"],
+                profile_data=task_results["profile_data"],
+                trend=tract_trend,
+                projection=projection,
+                projection_model=settings.PROJECTION_MODEL if projection else None,
+                benchmarks=BenchmarkData(county_trend=county_trend),
+                walkability=walkability, migration=migration_data, natural_increase=natural_increase_data,
+                population_density=population_density,
+                county_percentiles=task_results.get("county_percentiles"),
+                neighbors=self._compare_neighbors(fips),
+            )
+
+        with span("cache.store"):
+            return await self.cache.set_cached_response(address, response_data, db, etag_version=self.etag_version)
 
-        await self.cache.set_cached_response(address, response_data, db)
-        return response_data
+    def _latest_sections_from_matrix(self, fips) -> Optional[Dict[str, Dict[str, Any]]]:
+        """The three latest-year ACS sections from the tract matrix, or None to fetch them upstream."""
+        if self.tract_matrix is None:
+            return None
+        with span("tract_matrix.lookup"):
+            sections = {
+                "latest_year_data": self.tract_matrix.section(fips, _expand_vars_with_moe(ACS_VARS)),
+                "subject_data": self.tract_matrix.section(fips, _expand_vars_with_moe(SUBJECT_VARS)),
+                "profile_data": self.tract_matrix.section(fips, _expand_vars_with_moe(PROFILE_VARS)),
+            }
+        if any(section is None for section in sections.values()):
+            logger.info(f"Tract {fips.state}{fips.county}{fips.tract} is not in the tract matrix; fetching ACS upstream.")
+            return None
+        return sections
+
+    def _compare_neighbors(self, fips) -> Optional[NeighborComparison]:
+        if self.tract_adjacency is None or self.tract_matrix is None:
+            return None
+        with span("tract_adjacency.compare"):
+            return compare_neighbors(fips, self.tract_adjacency, self.tract_matrix)
+
+    def _migration_flows_task(self, fips):
+        """County migration totals from the flows store when it covers the county, else fetched live."""
+        county_fips = f"{fips.state}{fips.county}"
+        if self.migration_flows is not None:
+            totals = self.migration_flows.county_totals(county_fips)
+            if totals is not None:
+                return _resolved(totals)
+        return self.api_client.fetch_migration_flows(fips)
+
+    def _top_counties(self, fips) -> Dict[str, Any]:
+        county_fips = f"{fips.state}{fips.county}"
+        if self.migration_flows is None or settings.MIGRATION_TOP_COUNTIES <= 0 or not self.migration_flows.covers(county_fips):
+            return {"top_inbound_counties": None, "top_outbound_counties": None}
+        with span("migration_flows.lookup"):
+            return {
+                "top_inbound_counties": self.migration_flows.top(county_fips, "inbound", settings.MIGRATION_TOP_COUNTIES),
+                "top_outbound_counties": self.migration_flows.top(county_fips, "outbound", settings.MIGRATION_TOP_COUNTIES),
+            }
 
     async def get_all_cached_addresses(self, db: AsyncSession) -> List[str]:
         return await self.cache.get_all_cached_addresses(db)
@@ -171,3 +361,16 @@ class CensusService:
         except Exception as e:
             logger.exception("Failed to fetch tract GeoJSON.")
             raise HTTPException(status_code=503, detail="Could not retrieve geographic data for the tract.")
+
+    async def get_tract_geojson_body(self, state: str, county: str, tract: str) -> EncodedBody:
+        """The tract boundary as a serialized body, served from the boundary cache when possible."""
+        key = f"{state}{county}{tract}"
+        body = self.boundaries.get(key) if self.boundaries is not None else None
+        if body is not None:
+            return body
+        geojson = await self.get_tract_geojson(state, county, tract)
+        body = EncodedBody(json.dumps(geojson, separators=(",", ":")).encode())
+        # An empty collection may be a transient upstream gap; only real boundaries are kept.
+        if self.boundaries is not None and geojson.get("features"):
+            self.boundaries.set(key, body)
+        return body
@@ -0,0 +1,179 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.local_cache import LocalCache
+from app.models.population import CountyPercentileTable
+from app.schemas.population import CountyPercentiles
+from app.services.cache_invalidation import publish_invalidation
+from app.services.cache_manager import CacheManager
+from app.services.census_api_client import CensusAPIClient
+from app.services.data_processor import LATEST_ACS_YEAR
+
+# Invalidation namespace for the in-process table tier.
+PERCENTILE_CACHE_NAMESPACE = "county_percentiles"
+
+GROWTH_BASE_YEAR = LATEST_ACS_YEAR - 4
+# Cached in place of a table for counties that have not been precomputed.
+_NOT_COMPUTED = object()
+# Rank stored for a tract whose metric is unavailable (suppressed or zero denominator).
+MISSING_RANK = 255
+
+Columns = Dict[str, np.ndarray]
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator * 100, np.nan)
+
+
+# Each metric is computed for a whole county at once from arrays of ACS columns,
+# using the same definitions as DataProcessor.format_response_data.
+PERCENTILE_METRICS: Dict[str, Callable[[Columns], np.ndarray]] = {
+    "median_household_income": lambda c: c["B19013_001E"],
+    "median_home_value": lambda c: c["B25077_001E"],
+    "median_gross_rent": lambda c: c["B25064_001E"],
+    "median_age": lambda c: c["B01002_001E"],
+    "avg_household_size": lambda c: c["B25010_001E"],
+    "percent_bachelors_or_higher": lambda c: _ratio(
+        c["B15003_022E"] + c["B15003_023E"] + c["B15003_024E"] + c["B15003_025E"], c["B15003_001E"]
+    ),
+    "percent_renter_occupied": lambda c: _ratio(c["B25003_003E"], c["B25003_001E"]),
+    "vacancy_rate": lambda c: _ratio(c["B25002_003E"], c["B25002_001E"]),
+    "labor_force_participation_rate": lambda c: _ratio(c["B23025_002E"], c["B23025_001E"]),
+    "poverty_rate": lambda c: c["S1701_C03_001E"],
+    "population_cagr": lambda c: np.where(
+        c["B01003_001E_base"] > 0,
+        ((c["B01003_001E"] / c["B01003_001E_base"]) ** (1 / (LATEST_ACS_YEAR - GROWTH_BASE_YEAR)) - 1) * 100,
+        np.nan,
+    ),
+}
+DETAILED_VARS = [
+    "B19013_001E", "B25077_001E", "B25064_001E", "B01002_001E", "B25010_001E", "B01003_001E",
+    "B15003_001E", "B15003_022E", "B15003_023E", "B15003_024E", "B15003_025E",
+    "B25003_001E", "B25003_003E", "B25002_001E", "B25002_003E", "B23025_001E", "B23025_002E",
+]
+SUBJECT_VARS = ["S1701_C03_001E"]
+
+
+def percentile_ranks(values: np.ndarray) -> np.ndarray:
+    """
+    Column-wise percentile ranks (0-100) of an (n_tracts, n_metrics) matrix, as uint8.
+    Ties share their mid-rank; NaNs are excluded from the ranking and stored as MISSING_RANK.
+    """
+    ranks = np.full(values.shape, MISSING_RANK, dtype=np.uint8)
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        valid = ~np.isnan(column)
+        n = np.count_nonzero(valid)
+        if n == 0:
+            continue
+        ordered = np.sort(column[valid])
+        below = np.searchsorted(ordered, column[valid], side="left")
+        at_or_below = np.searchsorted(ordered, column[valid], side="right")
+        # Mid-rank percentile: the share of tracts below, plus half of the ties.
+        ranks[valid, j] = np.rint((below + at_or_below) / 2 / n * 100).astype(np.uint8)
+    return ranks
+
+
+@dataclass
+class CountyPercentileMatrix:
+    """A decoded county table: a uint8 rank matrix plus a tract -> row index."""
+    county_fips: str
+    data_year: int
+    metrics: List[str]
+    tracts: List[str]
+    ranks: np.ndarray
+
+    def __post_init__(self):
+        self._rows = {tract: i for i, tract in enumerate(self.tracts)}
+
+    @classmethod
+    def from_row(cls, row: CountyPercentileTable) -> "CountyPercentileMatrix":
+        ranks = np.frombuffer(row.ranks, dtype=np.uint8).reshape(len(row.tracts), len(row.metrics))
+        return cls(row.county_fips, row.data_year, row.metrics, row.tracts, ranks)
+
+    def for_tract(self, tract: str) -> Optional[CountyPercentiles]:
+        i = self._rows.get(tract)
+        if i is None:
+            return None
+        values = {m: (None if r == MISSING_RANK else int(r)) for m, r in zip(self.metrics, self.ranks[i])}
+        return CountyPercentiles(data_year=self.data_year, tract_count=len(self.tracts), **values)
+
+
+async def compute_county_percentiles(api_client: CensusAPIClient, state: str, county: str) -> Optional[CountyPercentileMatrix]:
+    """Fetches every tract in a county (three county-wide calls) and ranks all metrics."""
+    detailed, subject, base = await asyncio.gather(
+        api_client.fetch_acs_for_tracts(state, county, ["*"], LATEST_ACS_YEAR, DETAILED_VARS),
+        api_client.fetch_acs_for_tracts(state, county, ["*"], LATEST_ACS_YEAR, SUBJECT_VARS, endpoint="acs/acs5/subject"),
+        api_client.fetch_acs_for_tracts(state, county, ["*"], GROWTH_BASE_YEAR, ["B01003_001E"]),
+    )
+    tracts = sorted(detailed)
+    if not tracts:
+        logger.warning(f"No tracts returned for county {state}{county}; skipping percentiles.")
+        return None
+
+    def column(rows: Dict[str, dict], var: str) -> np.ndarray:
+        return np.array([np.nan if rows.get(t, {}).get(var) is None else rows[t][var] for t in tracts], dtype=float)
+
+    columns: Columns = {var: column(detailed, var) for var in DETAILED_VARS}
+    columns.update({var: column(subject, var) for var in SUBJECT_VARS})
+    columns["B01003_001E_base"] = column(base, "B01003_001E")
+
+    metrics = list(PERCENTILE_METRICS)
+    values = np.column_stack([PERCENTILE_METRICS[m](columns) for m in metrics])
+    return CountyPercentileMatrix(f"{state}{county}", LATEST_ACS_YEAR, metrics, tracts, percentile_ranks(values))
+
+
+async def save_county_percentiles(matrix: CountyPercentileMatrix, db: AsyncSession) -> None:
+    """
+    Upserts a county table and tells every worker to drop its decoded copy, along with
+    its cached responses' ETags, which would otherwise revalidate the old percentiles.
+    """
+    row = {
+        "county_fips": matrix.county_fips,
+        "data_year": matrix.data_year,
+        "metrics": matrix.metrics,
+        "tracts": matrix.tracts,
+        "ranks": np.ascontiguousarray(matrix.ranks, dtype=np.uint8).tobytes(),
+    }
+    stmt = pg_insert(CountyPercentileTable).values(row)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CountyPercentileTable.county_fips],
+        set_={**{k: stmt.excluded[k] for k in ("data_year", "metrics", "tracts", "ranks")}, "computed_at": func.now()},
+    )
+    await db.execute(stmt)
+    await publish_invalidation(db, PERCENTILE_CACHE_NAMESPACE, [matrix.county_fips])
+    await CacheManager.expire_county_validators(matrix.county_fips, db)
+    await db.commit()
+
+
+class CountyPercentileStore:
+    """
+    Serves a tract's county percentiles without any upstream calls: one primary-key
+    read of the county's compact table, decoded once per worker and kept in a LocalCache.
+    """
+    def __init__(self, local_cache: Optional[LocalCache[object]] = None):
+        self.local_cache = local_cache
+
+    async def get(self, state: str, county: str, tract: str, db: AsyncSession) -> Optional[CountyPercentiles]:
+        county_fips = f"{state}{county}"
+        matrix = self.local_cache.get(county_fips) if self.local_cache is not None else None
+        if matrix is None:
+            row = (await db.execute(
+                select(CountyPercentileTable).where(CountyPercentileTable.county_fips == county_fips)
+            )).scalars().first()
+            # Counties that have not been precomputed are remembered too, so they cost one read per TTL.
+            matrix = CountyPercentileMatrix.from_row(row) if row else _NOT_COMPUTED
+            if self.local_cache is not None:
+                self.local_cache.set(county_fips, matrix)
+        if matrix is _NOT_COMPUTED:
+            logger.debug(f"No precomputed percentiles for county {county_fips}.")
+            return None
+        return matrix.for_tract(tract)
@@ -4,19 +4,26 @@ import numpy as np
 from fastapi import HTTPException
 from loguru import logger
 
+from app.core.config import settings
 from app.schemas.population import (
     PopulationDataResponse, AgeDistribution, Demographics, Coordinates,
     GrowthMetrics, PopulationDensity, PopulationTrend,
     PopulationTrendPoint, BenchmarkData, SexDistribution, HousingMetrics,
     HouseholdComposition, RaceAndEthnicity, EconomicContext, ValueWithMoe
 )
+from app.services.projection_engine import ProjectionEngine, ProjectionModel
 
 LATEST_ACS_YEAR = 2023
 
 class DataProcessor:
     """Contains business logic for calculations, projections, and data formatting."""
 
-    def _create_value_with_moe(self, estimate: Optional[Union[int, float]], moe: Optional[Union[int, float]]) -> ValueWithMoe:
+    def __init__(self, projection_engine: Optional[ProjectionEngine] = None):
+        self.projection_engine = projection_engine or ProjectionEngine(
+            horizon=settings.PROJECTION_HORIZON_YEARS, confidence=settings.PROJECTION_CONFIDENCE
+        )
+
+    def create_value_with_moe(self, estimate: Optional[Union[int, float]], moe: Optional[Union[int, float]]) -> ValueWithMoe:
         """Creates a ValueWithMoe object and calculates the relative MOE."""
         relative_moe = None
         if estimate is not None and moe is not None and estimate != 0:
@@ -36,35 +43,39 @@ class DataProcessor:
                 moe_sum_sq += moe**2
 
         moe = math.sqrt(moe_sum_sq) if moe_sum_sq > 0 else None
-        return self._create_value_with_moe(estimate, moe)
+        return self.create_value_with_moe(estimate, moe)
 
     def project_tract_population(
-        self, latest_tract_data: Optional[Dict[str, Any]], county_trend: List[PopulationTrendPoint]
+        self,
+        latest_tract_data: Optional[Dict[str, Any]],
+        county_trend: List[PopulationTrendPoint],
+        tract_trend: Optional[List[PopulationTrendPoint]] = None,
+        model: Optional[ProjectionModel] = None,
     ) -> List[PopulationTrendPoint]:
-        """Projects future tract population based on historical county growth rates."""
-        logger.info("Starting tract population projection.")
-        if not latest_tract_data or not latest_tract_data.get("B01003_001E") or len(county_trend) < 2:
+        """Projects future tract population with the configured model (see ProjectionEngine)."""
+        model = model or settings.PROJECTION_MODEL
+        logger.info(f"Starting tract population projection (model={model}).")
+        needs_county = model in ("county_growth", "county_share")
+        if not latest_tract_data or not latest_tract_data.get("B01003_001E") or (needs_county and len(county_trend) < 2):
             logger.warning("Not enough historical data to perform projection. Returning empty list.")
             return []
 
-        base_population = latest_tract_data.get("B01003_001E") or 0
-        county_growth_rates = [
-            county_trend[i].population / county_trend[i-1].population
-            for i in range(1, len(county_trend)) if county_trend[i-1].population > 0
-        ]
-        
-        if not county_growth_rates:
-            logger.warning("Could not calculate any county growth rates. Returning empty projection.")
-            return []
-
-        avg_growth_factor = np.mean(county_growth_rates)
-        projections = []
-        current_pop = float(base_population)
-        
-        for year in range(LATEST_ACS_YEAR + 1, LATEST_ACS_YEAR + 4):
-            current_pop *= avg_growth_factor
-            projections.append(PopulationTrendPoint(year=year, population=int(round(current_pop)), is_projection=True))
-        
+        # Align the tract and county series on one year axis ending at the latest ACS year.
+        tract_trend = tract_trend or []
+        years = sorted({p.year for p in county_trend} | {p.year for p in tract_trend} | {LATEST_ACS_YEAR})
+        column = {year: i for i, year in enumerate(years)}
+        tract_series = np.full(len(years), np.nan)
+        county_series = np.full(len(years), np.nan)
+        for point in tract_trend:
+            tract_series[column[point.year]] = point.population
+        for point in county_trend:
+            county_series[column[point.year]] = point.population
+        tract_series[column[LATEST_ACS_YEAR]] = latest_tract_data["B01003_001E"]
+
+        result = self.projection_engine.project(years, tract_series, model=model, county_populations=county_series)
+        projections = result.to_trend_points()
+        if not projections:
+            logger.warning(f"Projection model '{model}' could not project this tract. Returning empty projection.")
         logger.info(f"Tract population projection finished with {len(projections)} data points.")
         return projections
 
@@ -117,8 +128,8 @@ class DataProcessor:
         male_total = all_census_data.get("B01001_002E")
         female_total = all_census_data.get("B01001_026E")
         sex_distribution = SexDistribution(
-            male=self._create_value_with_moe(male_total, all_census_data.get("B01001_002M")),
-            female=self._create_value_with_moe(female_total, all_census_data.get("B01001_026M")),
+            male=self.create_value_with_moe(male_total, all_census_data.get("B01001_002M")),
+            female=self.create_value_with_moe(female_total, all_census_data.get("B01001_026M")),
             percent_male=safe_div_percent(male_total, (male_total or 0) + (female_total or 0)),
             percent_female=safe_div_percent(female_total, (male_total or 0) + (female_total or 0))
         )
@@ -130,7 +141,7 @@ class DataProcessor:
         # Household Comp
         total_households = all_census_data.get("B11001_001E")
         household_comp = HouseholdComposition(
-            total_households=self._create_value_with_moe(total_households, all_census_data.get("B11001_001M")),
+            total_households=self.create_value_with_moe(total_households, all_census_data.get("B11001_001M")),
             percent_family_households=safe_div_percent(all_census_data.get("B11001_002E"), total_households),
             percent_married_couple_family=safe_div_percent(all_census_data.get("B11001_003E"), total_households),
             percent_non_family_households=safe_div_percent(all_census_data.get("B11001_007E"), total_households)
@@ -148,9 +159,9 @@ class DataProcessor:
         )
 
         demographics = Demographics(
-            median_household_income=self._create_value_with_moe(all_census_data.get("B19013_001E"), all_census_data.get("B19013_001M")),
+            median_household_income=self.create_value_with_moe(all_census_data.get("B19013_001E"), all_census_data.get("B19013_001M")),
             percent_bachelors_or_higher=safe_div_percent(bachelors_or_higher, total_pop_25_over),
-            avg_household_size=self._create_value_with_moe(all_census_data.get("B25010_001E"), all_census_data.get("B25010_001M")),
+            avg_household_size=self.create_value_with_moe(all_census_data.get("B25010_001E"), all_census_data.get("B25010_001M")),
             household_composition=household_comp,
             race_and_ethnicity=race_ethnicity
         )
@@ -161,15 +172,15 @@ class DataProcessor:
         economic_context = EconomicContext(
             poverty_rate=all_census_data.get("S1701_C03_001E"),
             labor_force_participation_rate=safe_div_percent(in_labor_force, lf_total_pop),
-            mean_commute_time_minutes=self._create_value_with_moe(all_census_data.get("DP03_0025E"), all_census_data.get("DP03_0025M"))
+            mean_commute_time_minutes=self.create_value_with_moe(all_census_data.get("DP03_0025E"), all_census_data.get("DP03_0025M"))
         )
 
         # Housing
         housing_metrics = HousingMetrics(
             percent_renter_occupied=safe_div_percent(all_census_data.get("B25003_003E"), all_census_data.get("B25003_001E")),
-            median_home_value=self._create_value_with_moe(all_census_data.get("B25077_001E"), all_census_data.get("B25077_001M")),
-            median_gross_rent=self._create_value_with_moe(all_census_data.get("B25064_001E"), all_census_data.get("B25064_001M")),
-            median_year_structure_built=self._create_value_with_moe(all_census_data.get("B25035_001E"), all_census_data.get("B25035_001M")),
+            median_home_value=self.create_value_with_moe(all_census_data.get("B25077_001E"), all_census_data.get("B25077_001M")),
+            median_gross_rent=self.create_value_with_moe(all_census_data.get("B25064_001E"), all_census_data.get("B25064_001M")),
+            median_year_structure_built=self.create_value_with_moe(all_census_data.get("B25035_001E"), all_census_data.get("B25035_001M")),
             vacancy_rate=safe_div_percent(all_census_data.get("B25002_003E"), all_census_data.get("B25002_001E")),
             rental_vacancy_rate=safe_div_percent(all_census_data.get("B25004_002E"), (all_census_data.get("B25003_003E", 0) or 0) + (all_census_data.get("B25004_002E", 0) or 0)),
             homeowner_vacancy_rate=safe_div_percent(all_census_data.get("B25004_004E"), (all_census_data.get("B25003_002E", 0) or 0) + (all_census_data.get("B25004_004E", 0) or 0))
@@ -184,8 +195,8 @@ class DataProcessor:
             geography_level=kwargs["geo_level"],
             coordinates=kwargs["coordinates"],
             tract_area_sq_meters=kwargs["aland"],
-            total_population=self._create_value_with_moe(total_pop_estimate, all_census_data.get("B01003_001M")),
-            median_age=self._create_value_with_moe(all_census_data.get("B01002_001E"), all_census_data.get("B01002_001M")),
+            total_population=self.create_value_with_moe(total_pop_estimate, all_census_data.get("B01003_001M")),
+            median_age=self.create_value_with_moe(all_census_data.get("B01002_001E"), all_census_data.get("B01002_001M")),
             growth=self._calculate_growth_metrics(trend),
             migration=kwargs.get("migration"),
             natural_increase=kwargs.get("natural_increase"),
@@ -196,5 +207,9 @@ class DataProcessor:
             housing=housing_metrics,
             economic_context=economic_context,
             walkability=kwargs.get("walkability"),
-            population_trends=PopulationTrend(trend=trend, projection=projection, benchmark=kwargs.get("benchmarks"))
+            county_percentiles=kwargs.get("county_percentiles"),
+            neighbors=kwargs.get("neighbors"),
+            population_trends=PopulationTrend(
+                trend=trend, projection=projection, projection_model=kwargs.get("projection_model"), benchmark=kwargs.get("benchmarks")
+            )
         )
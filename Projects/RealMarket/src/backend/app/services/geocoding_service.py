@@ -1,15 +1,25 @@
-from typing import Dict, Any
-from httpx import AsyncClient, HTTPStatusError
+import asyncio
+import csv
+import io
+import re
+from typing import Dict, Any, List, Optional, Tuple
+from httpx import HTTPStatusError, TransportError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from fastapi import HTTPException
 from loguru import logger
 
 from app.schemas.population import FipsCode
+from app.core.census_keys import CensusKeyPool, get_census_key_pool
 from app.core.config import settings
+from app.core.upstream_clients import UpstreamClients
+from app.core.tracing import span
 
 # Use the latest available ACS 5-year data release year for geocoding vintages.
 LATEST_ACS_YEAR = 2023
 
+# Splits "City, ST 12345" style tails of one-line addresses for the batch CSV.
+_STATE_ZIP = re.compile(r"^\s*([A-Za-z]{2})\s*(\d{5}(?:-\d{4})?)?\s*$")
+
 # Define a retry strategy for network-related or server-side errors
 retry_strategy = retry(
     stop=stop_after_attempt(3),
@@ -17,14 +27,23 @@ retry_strategy = retry(
     retry=retry_if_exception_type(HTTPStatusError),
 )
 
+# A batch file is worth more attempts, and timeouts are its usual failure.
+batch_retry_strategy = retry(
+    stop=stop_after_attempt(settings.GEOCODER_BATCH_ATTEMPTS),
+    wait=wait_exponential(multiplier=2, min=5, max=60),
+    retry=retry_if_exception_type((HTTPStatusError, TransportError)),
+    reraise=True,
+)
+
 
 class GeocodingService:
     """
     Handles geocoding addresses to find Census FIPS codes.
     Includes a fallback mechanism for increased reliability.
     """
-    def __init__(self, http_client: AsyncClient):
+    def __init__(self, http_client: UpstreamClients, key_pool: Optional[CensusKeyPool] = None):
         self.http_client = http_client
+        self.key_pool = key_pool or get_census_key_pool()
 
     async def geocode_address(self, address: str) -> Dict[str, Any]:
         """
@@ -33,11 +52,13 @@ class GeocodingService:
         """
         try:
             logger.info(f"Attempting to geocode '{address}' with primary hybrid geocoder.")
-            return await self._hybrid_geocode_nominatim_first(address)
+            with span("geocode.hybrid"):
+                return await self._hybrid_geocode_nominatim_first(address)
         except Exception as e:
             logger.warning(f"Primary hybrid geocoder failed for '{address}': {e}. Attempting fallback.")
             try:
-                return await self._oneline_address_geocode_fallback(address)
+                with span("geocode.fallback"):
+                    return await self._oneline_address_geocode_fallback(address)
             except Exception as final_e:
                 logger.error(f"All geocoding attempts failed for '{address}': {final_e}")
                 raise HTTPException(status_code=404, detail="Address could not be geocoded. Please check for typos or try a more specific address.")
@@ -53,11 +74,12 @@ class GeocodingService:
         logger.info(f"Starting hybrid geocoding for address: '{address}'")
 
         # Step 1: Get coordinates from Nominatim
-        nominatim_url = "https://nominatim.openstreetmap.org/search"
+        nominatim_url = f"{settings.NOMINATIM_BASE_URL}/search"
         params1 = {"q": address, "format": "json", "addressdetails": 1, "limit": 1}
         headers = {"User-Agent": "CapMatch/1.0"}
         try:
-            res1 = await self.http_client.get(nominatim_url, params=params1, headers=headers)
+            with span("geocode.nominatim"):
+                res1 = await self.http_client.get(nominatim_url, params=params1, headers=headers)
             res1.raise_for_status()
             data1 = res1.json()
             if not data1:
@@ -69,11 +91,12 @@ class GeocodingService:
             raise ValueError("Nominatim geocoding failed.") from e
 
         # Step 2: Get geographies (FIPS) using coordinates from Census API
-        geo_url = "https://geocoding.geo.census.gov/geocoder/geographies/coordinates"
+        geo_url = f"{settings.CENSUS_GEOCODER_BASE_URL}/geocoder/geographies/coordinates"
         vintage = f"ACS{LATEST_ACS_YEAR}_Current"
         params2 = {"format": "json", "benchmark": "Public_AR_Current", "vintage": vintage, "x": lon, "y": lat}
 
-        res2 = await self.http_client.get(geo_url, params=params2)
+        with span("geocode.census_coordinates"):
+            res2 = await self.http_client.get(geo_url, params=params2)
         res2.raise_for_status()
         geos = res2.json().get("result", {}).get("geographies", {})
 
@@ -87,15 +110,15 @@ class GeocodingService:
         aland = int(tract.get("ALAND", 0) or 0)
 
         # Step 3: Get tract land area (AREALAND) from Census GEOINFO API for better accuracy
-        geo_info_url = f"https://api.census.gov/data/{LATEST_ACS_YEAR}/geoinfo"
+        geo_info_url = f"{settings.CENSUS_API_BASE_URL}/data/{LATEST_ACS_YEAR}/geoinfo"
         geo_params = {
             "get": "AREALAND",
             "for": f"tract:{fips_dict['tract']}",
             "in": f"state:{fips_dict['state']} county:{fips_dict['county']}",
-            "key": settings.CENSUS_API_KEY
         }
         try:
-            res3 = await self.http_client.get(geo_info_url, params=geo_params)
+            with span("geocode.geoinfo"):
+                res3 = await self.key_pool.get(self.http_client, geo_info_url, geo_params)
             res3.raise_for_status()
             geo_data = res3.json()
             if len(geo_data) > 1:
@@ -112,7 +135,7 @@ class GeocodingService:
     @retry_strategy
     async def _oneline_address_geocode_fallback(self, address: str) -> Dict[str, Any]:
         """Fallback geocoder using the Census Geocoding API (onelineaddress)."""
-        base_url = "https://geocoding.geo.census.gov/geocoder/locations/onelineaddress"
+        base_url = f"{settings.CENSUS_GEOCODER_BASE_URL}/geocoder/locations/onelineaddress"
         params = {
             "address": address,
             "benchmark": "2020",
@@ -139,3 +162,165 @@ class GeocodingService:
 
         logger.info(f"Successfully geocoded '{address}' with fallback to FIPS {fips.state}-{fips.county}-{fips.tract}")
         return {"fips": fips, "coords": {"lon": coords.get("x"), "lat": coords.get("y")}, "aland": aland}
+
+    # --- Bulk geocoding ---
+
+    @staticmethod
+    def _split_address(address: str) -> Tuple[str, str, str, str]:
+        """Best-effort split of a one-line address into street, city, state and ZIP."""
+        parts = [p.strip() for p in address.split(",") if p.strip()]
+        street, city, state, zip_code = address.strip(), "", "", ""
+        if len(parts) >= 2:
+            match = _STATE_ZIP.match(parts[-1])
+            if match:
+                state, zip_code = match.group(1).upper(), match.group(2) or ""
+                parts = parts[:-1]
+            street = parts[0]
+            city = parts[1] if len(parts) > 1 else ""
+        return street, city, state, zip_code
+
+    async def _geocode_census_first(self, address: str) -> Dict[str, Any]:
+        """
+        `geocode_address` with the sources swapped: the Census one-line geocoder first and
+        Nominatim only for what it cannot match, so bulk work stays off Nominatim.
+        """
+        try:
+            with span("geocode.census_oneline"):
+                return await self._oneline_address_geocode_fallback(address)
+        except Exception as e:
+            logger.debug(f"Census one-line geocoder found no match for '{address}': {e}. Trying Nominatim.")
+        try:
+            with span("geocode.hybrid"):
+                return await self._hybrid_geocode_nominatim_first(address)
+        except Exception as e:
+            logger.warning(f"All geocoding attempts failed for '{address}': {e}")
+            raise HTTPException(status_code=404, detail="Address could not be geocoded.")
+
+    @batch_retry_strategy
+    async def _submit_address_batch(self, addresses: List[str]) -> Dict[int, Dict[str, Any]]:
+        """
+        Sends one chunk to the Census `addressbatch` CSV geocoder and returns the
+        matches by position in `addresses`, without land area.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for i, address in enumerate(addresses):
+            writer.writerow([i, *self._split_address(address)])
+
+        url = f"{settings.CENSUS_GEOCODER_BASE_URL}/geocoder/geographies/addressbatch"
+        response = await self.http_client.post(
+            url,
+            data={"benchmark": "Public_AR_Current", "vintage": f"ACS{LATEST_ACS_YEAR}_Current"},
+            files={"addressFile": ("addresses.csv", buffer.getvalue().encode(), "text/csv")},
+            timeout=settings.GEOCODER_BATCH_TIMEOUT,
+        )
+        response.raise_for_status()
+
+        # Columns: id, input, match status, match type, matched address, "lon,lat",
+        # TIGER line id, side, state, county, tract, block.
+        matches: Dict[int, Dict[str, Any]] = {}
+        for row in csv.reader(io.StringIO(response.text)):
+            if len(row) < 11 or row[2] != "Match" or not all(row[8:11]):
+                continue
+            try:
+                lon, lat = (float(v) for v in row[5].split(","))
+                index = int(row[0])
+            except ValueError:
+                continue
+            matches[index] = {
+                "fips": FipsCode(state=row[8], county=row[9], tract=row[10]),
+                "coords": {"lat": lat, "lon": lon},
+                "aland": 0,
+            }
+        return matches
+
+    async def _fetch_tract_land_areas(self, tracts: List[FipsCode]) -> Dict[Tuple[str, str, str], int]:
+        """Looks up AREALAND for many tracts with one GEOINFO call per county (and 50 tracts)."""
+        by_county: Dict[Tuple[str, str], List[str]] = {}
+        for fips in tracts:
+            codes = by_county.setdefault((fips.state, fips.county), [])
+            if fips.tract not in codes:
+                codes.append(fips.tract)
+
+        url = f"{settings.CENSUS_API_BASE_URL}/data/{LATEST_ACS_YEAR}/geoinfo"
+
+        async def fetch(state: str, county: str, codes: List[str]) -> Dict[Tuple[str, str, str], int]:
+            params = {"get": "AREALAND", "for": f"tract:{','.join(codes)}", "in": f"state:{state} county:{county}"}
+            try:
+                response = await self.key_pool.get(self.http_client, url, params)
+                response.raise_for_status()
+                data = response.json()
+            except Exception as e:
+                logger.warning(f"GEOINFO land area lookup failed for {state}{county}: {e}")
+                return {}
+            header = data[0] if data else []
+            rows = (dict(zip(header, values)) for values in data[1:])
+            return {(state, county, r["tract"]): int(r.get("AREALAND") or 0) for r in rows}
+
+        results = await asyncio.gather(*(
+            fetch(state, county, codes[i:i + 50])
+            for (state, county), codes in by_county.items()
+            for i in range(0, len(codes), 50)
+        ))
+        return {key: aland for result in results for key, aland in result.items()}
+
+    async def geocode_addresses(self, addresses: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Geocodes many addresses at once. Addresses are sent in chunks of
+        GEOCODER_BATCH_SIZE through the Census batch geocoder (each chunk retried up to
+        GEOCODER_BATCH_ATTEMPTS times); only the ones it answered without a match are
+        geocoded one by one, Census one-line geocoder first. Addresses in a chunk that
+        kept failing are reported and left unresolved rather than sent individually.
+        Returns one result per input (same shape as `geocode_address`), or None where
+        geocoding failed.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(addresses)
+        failed_chunks: List[int] = []
+        chunk_size = settings.GEOCODER_BATCH_SIZE
+        semaphore = asyncio.Semaphore(settings.GEOCODER_BATCH_CONCURRENCY)
+
+        async def submit(offset: int) -> None:
+            chunk = addresses[offset:offset + chunk_size]
+            async with semaphore:
+                try:
+                    with span("geocode.batch", addresses=len(chunk)):
+                        matches = await self._submit_address_batch(chunk)
+                except Exception as e:
+                    logger.error(f"Batch geocoding of {len(chunk)} addresses at offset {offset} failed: {e}")
+                    failed_chunks.append(offset)
+                    return
+            for index, match in matches.items():
+                if 0 <= index < len(chunk):
+                    results[offset + index] = match
+
+        await asyncio.gather(*(submit(offset) for offset in range(0, len(addresses), chunk_size)))
+        matched = [r for r in results if r is not None]
+        logger.info(f"Census batch geocoder matched {len(matched)} of {len(addresses)} addresses.")
+
+        with span("geocode.batch_land_area"):
+            land_areas = await self._fetch_tract_land_areas([r["fips"] for r in matched])
+        for result in matched:
+            fips = result["fips"]
+            result["aland"] = land_areas.get((fips.state, fips.county, fips.tract), 0)
+
+        unresolved = {i for offset in failed_chunks for i in range(offset, min(offset + chunk_size, len(addresses)))}
+        if unresolved:
+            logger.error(
+                f"{len(unresolved)} addresses in {len(failed_chunks)} failed batch(es) were not geocoded; "
+                f"rerun them (offsets: {', '.join(map(str, sorted(failed_chunks)))})."
+            )
+        unmatched = [i for i, r in enumerate(results) if r is None and i not in unresolved]
+        if unmatched:
+            logger.info(f"Geocoding {len(unmatched)} unmatched addresses individually.")
+            fallback_semaphore = asyncio.Semaphore(settings.GEOCODER_FALLBACK_CONCURRENCY)
+
+            async def geocode_one(i: int) -> None:
+                async with fallback_semaphore:
+                    try:
+                        results[i] = await self._geocode_census_first(addresses[i])
+                    except HTTPException:
+                        results[i] = None
+
+            await asyncio.gather(*(geocode_one(i) for i in unmatched))
+        return results
+
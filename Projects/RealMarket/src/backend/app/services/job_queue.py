@@ -0,0 +1,305 @@
+import asyncio
+import datetime
+import json
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from loguru import logger
+from sqlalchemy import and_, delete, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.priority import priority
+from app.models.population import MarketDataJob
+from app.schemas.population import JobStatus
+from app.services.census_service import CensusService
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def job_status(job: MarketDataJob) -> JobStatus:
+    return JobStatus(
+        job_id=job.id,
+        status=job.status,
+        address=job.address,
+        attempts=job.attempts,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        error_status=job.error_status,
+        result=job.result,
+    )
+
+
+class MarketDataJobQueue:
+    """
+    Runs cold /market-data requests off the HTTP path.
+
+    Jobs live in the market_data_jobs table, so any worker process can report on them
+    and they outlive the process that accepted them. Each process runs `workers` tasks
+    that claim the oldest runnable job with FOR UPDATE SKIP LOCKED (so workers never
+    block on or double-run each other's jobs), keep a heartbeat while it runs, and
+    store the response (or error) on the row. A running job whose heartbeat is older
+    than `stale_after` belongs to a dead worker and is claimed again; failures other
+    than 4xx are retried up to `max_attempts` times.
+    """
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        service_factory: Callable[[], CensusService],
+        workers: int,
+        poll_interval: float,
+        heartbeat_interval: float,
+        stale_after: float,
+        max_attempts: int,
+        retry_delay: float,
+        retention: float,
+    ):
+        self.session_factory = session_factory
+        self.service_factory = service_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention = retention
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Jobs this process is running, requeued on a clean shutdown.
+        self._running: Set[str] = set()
+        # Waiters for a job's next state change in this process, with a reference count.
+        self._changes: Dict[str, Tuple[asyncio.Event, int]] = {}
+
+    @classmethod
+    def from_settings(
+        cls, session_factory: async_sessionmaker[AsyncSession], service_factory: Callable[[], CensusService]
+    ) -> "MarketDataJobQueue":
+        return cls(
+            session_factory,
+            service_factory,
+            workers=settings.JOB_WORKERS,
+            poll_interval=settings.JOB_POLL_INTERVAL,
+            heartbeat_interval=settings.JOB_HEARTBEAT_INTERVAL,
+            stale_after=settings.JOB_STALE_AFTER,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            retry_delay=settings.JOB_RETRY_DELAY,
+            retention=settings.JOB_RETENTION,
+        )
+
+    async def submit(self, address: str, address_key: str, user_id: Optional[str], db: AsyncSession) -> MarketDataJob:
+        """Queues a job for `address`, or returns the job already queued or running for the same address."""
+        for _ in range(3):
+            stmt = (
+                pg_insert(MarketDataJob)
+                .values(id=uuid.uuid4().hex, address=address, address_key=address_key, user_id=user_id)
+                .on_conflict_do_nothing(
+                    # Literal, so Postgres can match it to the partial unique index's predicate.
+                    index_elements=[MarketDataJob.address_key],
+                    index_where=text("status IN ('queued', 'running')"),
+                )
+                .returning(MarketDataJob.id)
+            )
+            job_id = (await db.execute(stmt)).scalar_one_or_none()
+            await db.commit()
+            if job_id is not None:
+                logger.info(f"Queued market-data job {job_id} for '{address}'.")
+                self._wakeup.set()
+            else:
+                # Another request already queued this address; share its job.
+                existing = select(MarketDataJob.id).where(
+                    MarketDataJob.address_key == address_key, MarketDataJob.status.in_(ACTIVE_STATUSES)
+                )
+                job_id = (await db.execute(existing)).scalar_one_or_none()
+            if job_id is not None:
+                job = await self.get(job_id, db)
+                if job is not None:
+                    return job
+            # The other job finished between the two statements; queue a new one.
+        raise HTTPException(status_code=503, detail="Could not queue the request; please retry.")
+
+    async def get(self, job_id: str, db: Optional[AsyncSession] = None) -> Optional[MarketDataJob]:
+        stmt = select(MarketDataJob).where(MarketDataJob.id == job_id)
+        if db is not None:
+            return (await db.execute(stmt)).scalars().first()
+        async with self.session_factory() as session:
+            return (await session.execute(stmt)).scalars().first()
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """
+        Returns when this process changes the job's state, or after `timeout`. Jobs run by
+        other processes are only seen when the caller reads the row again.
+        """
+        event, waiters = self._changes.get(job_id, (asyncio.Event(), 0))
+        self._changes[job_id] = (event, waiters + 1)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # A state change already removed the entry; otherwise drop our reference.
+            current = self._changes.get(job_id)
+            if current is not None and current[0] is event:
+                if current[1] <= 1:
+                    del self._changes[job_id]
+                else:
+                    self._changes[job_id] = (event, current[1] - 1)
+
+    def _changed(self, job_id: str) -> None:
+        entry = self._changes.pop(job_id, None)
+        if entry is not None:
+            entry[0].set()
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work(n), name=f"market-data-job-worker-{n}") for n in range(self.workers)]
+        logger.info(f"Market-data job queue started with {self.workers} worker(s).")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running:
+            # Hand interrupted jobs straight back instead of waiting for their heartbeat to go stale.
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(MarketDataJob)
+                        .where(MarketDataJob.id.in_(self._running), MarketDataJob.status == "running")
+                        # A clean shutdown does not count against the job's attempts.
+                        .values(status="queued", attempts=MarketDataJob.attempts - 1, heartbeat_at=None, available_at=func.now())
+                    )
+                    await db.commit()
+                logger.info(f"Requeued {len(self._running)} interrupted market-data job(s).")
+            except Exception as e:
+                logger.warning(f"Could not requeue interrupted jobs; they will be reclaimed when stale. Error: {e}")
+            self._running.clear()
+        logger.info("Market-data job queue stopped.")
+
+    async def _work(self, n: int) -> None:
+        loop = asyncio.get_running_loop()
+        pruned_at = 0.0
+        while True:
+            if n == 0 and loop.time() - pruned_at > 600:
+                pruned_at = loop.time()
+                await self._prune()
+            try:
+                claimed = await self._claim()
+            except Exception as e:
+                logger.warning(f"Claiming a market-data job failed: {e}")
+                claimed = None
+            if claimed is not None:
+                await self._run(*claimed)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim(self) -> Optional[Tuple[str, str, int]]:
+        """Marks the oldest runnable (or abandoned) job as running and returns (id, address, attempts)."""
+        stale = func.now() - datetime.timedelta(seconds=self.stale_after)
+        candidate = (
+            select(MarketDataJob.id)
+            .where(or_(
+                and_(MarketDataJob.status == "queued", MarketDataJob.available_at <= func.now()),
+                and_(MarketDataJob.status == "running", MarketDataJob.heartbeat_at < stale),
+            ))
+            .order_by(MarketDataJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(MarketDataJob)
+            .where(MarketDataJob.id == candidate)
+            .values(status="running", attempts=MarketDataJob.attempts + 1, started_at=func.now(), heartbeat_at=func.now())
+            .returning(MarketDataJob.id, MarketDataJob.address, MarketDataJob.attempts)
+        )
+        async with self.session_factory() as db:
+            row = (await db.execute(stmt)).first()
+            await db.commit()
+        if row is None:
+            return None
+        self._running.add(row.id)
+        self._changed(row.id)
+        return row.id, row.address, row.attempts
+
+    async def _run(self, job_id: str, address: str, attempts: int) -> None:
+        values: Dict[str, Any]
+        if attempts > self.max_attempts:
+            # Claimed again after its worker died on the last allowed attempt.
+            values = {"status": "failed", "error": "The job was interrupted too many times.", "error_status": 503}
+        else:
+            logger.info(f"Running market-data job {job_id} for '{address}' (attempt {attempts}).")
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                # Nobody is waiting on the connection, so the job yields upstream capacity to live requests.
+                with priority("background"):
+                    async with self.session_factory() as db:
+                        entry = await self.service_factory().get_market_data_entry(address, db)
+                values = {"status": "succeeded", "result": json.loads(entry.body.identity), "error": None, "error_status": None}
+            except HTTPException as e:
+                retry = e.status_code >= 500 and attempts < self.max_attempts
+                values = {"status": "queued" if retry else "failed", "error": str(e.detail), "error_status": e.status_code}
+            except Exception:
+                logger.exception(f"Market-data job {job_id} failed unexpectedly.")
+                retry = attempts < self.max_attempts
+                values = {
+                    "status": "queued" if retry else "failed",
+                    "error": "An unexpected internal error occurred.",
+                    "error_status": 500,
+                }
+            finally:
+                heartbeat.cancel()
+        if values["status"] == "queued":
+            values["available_at"] = func.now() + datetime.timedelta(seconds=self.retry_delay * attempts)
+            values["heartbeat_at"] = None
+            logger.warning(f"Market-data job {job_id} failed ({values['error']}); retrying.")
+        else:
+            values["finished_at"] = func.now()
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(MarketDataJob).where(MarketDataJob.id == job_id, MarketDataJob.status == "running").values(**values)
+                )
+                await db.commit()
+        except Exception as e:
+            # Left running; it is reclaimed (and rerun) once its heartbeat goes stale.
+            logger.error(f"Could not record the outcome of market-data job {job_id}: {e}")
+        self._running.discard(job_id)
+        self._changed(job_id)
+        if values["status"] != "queued":
+            logger.info(f"Market-data job {job_id} {values['status']}.")
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(MarketDataJob)
+                        .where(MarketDataJob.id == job_id, MarketDataJob.status == "running")
+                        .values(heartbeat_at=func.now())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Heartbeat for market-data job {job_id} failed: {e}")
+
+    async def _prune(self) -> None:
+        cutoff = func.now() - datetime.timedelta(seconds=self.retention)
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    delete(MarketDataJob).where(MarketDataJob.status.in_(FINISHED_STATUSES), MarketDataJob.finished_at < cutoff)
+                )
+                await db.commit()
+            if result.rowcount:
+                logger.info(f"Pruned {result.rowcount} finished market-data job(s).")
+        except Exception as e:
+            logger.warning(f"Pruning market-data jobs failed: {e}")
@@ -0,0 +1,215 @@
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.schemas.population import CountyFlow, MigrationFlowsResponse
+from app.services.store_files import publish_store
+
+# Files of a flows directory. Everything but meta.json is memory-mapped read-only.
+COUNTIES_FILE = "counties.npy"
+NAMES_FILE = "names.npy"
+TOTALS_FILE = "totals.npy"
+META_FILE = "meta.json"
+# Two CSR structures over the same county index: rows are origins (outbound) or
+# destinations (inbound), each row sorted by movers, largest first.
+CSR_FILES = {
+    direction: {part: f"{direction}_{part}.npy" for part in ("indptr", "indices", "values")}
+    for direction in ("outbound", "inbound")
+}
+
+
+class MigrationFlows:
+    """
+    County-to-county ACS migration flows for one vintage, built by
+    `python -m app.jobs.migration_flows`.
+
+    Counties are indexed by sorted five-digit FIPS. For each direction a CSR structure
+    (indptr/indices/values) holds the nonzero flows of every county, sorted by movers,
+    so a county's top partners are the head of its row and a pair lookup is a scan of
+    one short row. Totals (moved in, moved out, net) exist only for counties whose own
+    rows were fetched; partners outside the built states appear in rows but are not
+    covered themselves.
+    """
+    def __init__(self, path: Path, year: int, counties: np.ndarray, names: np.ndarray, totals: np.ndarray, csr: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]], version: str = ""):
+        self.path = path
+        self.year = year
+        # Changes with every rebuild; cached responses derived from the store carry it in their ETag.
+        self.version = version
+        self.counties = counties
+        self.names = names
+        self.totals = totals
+        self.csr = csr
+
+    @classmethod
+    def open(cls, path: str | Path) -> "MigrationFlows":
+        # Resolved once, so every file comes from the same published version.
+        path = Path(path).resolve()
+        with open(path / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        load = lambda name: np.load(path / name, mmap_mode="r")
+        csr = {
+            direction: (load(files["indptr"]), load(files["indices"]), load(files["values"]))
+            for direction, files in CSR_FILES.items()
+        }
+        version = str(os.stat(path / META_FILE).st_mtime_ns)
+        flows = cls(path, meta["year"], load(COUNTIES_FILE), load(NAMES_FILE), load(TOTALS_FILE), csr, version)
+        if any(len(indptr) != len(flows.counties) + 1 for indptr, _, _ in csr.values()):
+            raise ValueError(f"Migration flows at {path} are inconsistent.")
+        logger.info(f"Mapped migration flows {path} ({len(flows.counties)} counties, {len(csr['outbound'][1])} flows, ACS {flows.year}).")
+        return flows
+
+    def index(self, county_fips: str) -> Optional[int]:
+        key = county_fips.encode()
+        i = int(np.searchsorted(self.counties, key))
+        return i if i < len(self.counties) and self.counties[i] == key else None
+
+    def covers(self, county_fips: str) -> bool:
+        i = self.index(county_fips)
+        return i is not None and not math.isnan(self.totals[i, 0])
+
+    def name(self, county_fips: str) -> Optional[str]:
+        i = self.index(county_fips)
+        return self.names[i].decode("utf-8") if i is not None else None
+
+    def county_totals(self, county_fips: str) -> Optional[Dict[str, int]]:
+        """MOVEDIN/MOVEDOUT/MOVEDNET shaped like `CensusAPIClient.fetch_migration_flows`, or None if not covered."""
+        if not self.covers(county_fips):
+            return None
+        moved_in, moved_out, moved_net = (int(v) for v in self.totals[self.index(county_fips)])
+        return {"MOVEDIN": moved_in, "MOVEDOUT": moved_out, "MOVEDNET": moved_net}
+
+    def top(self, county_fips: str, direction: str, limit: int) -> List[CountyFlow]:
+        """The `limit` largest partners, inbound (origins of movers in) or outbound (destinations)."""
+        i = self.index(county_fips)
+        if i is None or limit <= 0:
+            return []
+        indptr, indices, values = self.csr[direction]
+        start, end = int(indptr[i]), int(indptr[i + 1])
+        end = min(end, start + limit)
+        return [
+            CountyFlow(fips=self.counties[j].decode(), name=self.names[j].decode("utf-8"), movers=int(v))
+            for j, v in zip(indices[start:end], values[start:end])
+        ]
+
+    def flow(self, origin_fips: str, destination_fips: str) -> Optional[int]:
+        """Movers from `origin` to `destination` (0 if none were estimated), or None for an unknown county."""
+        origin, destination = self.index(origin_fips), self.index(destination_fips)
+        if origin is None or destination is None:
+            return None
+        indptr, indices, values = self.csr["outbound"]
+        start, end = int(indptr[origin]), int(indptr[origin + 1])
+        hits = np.flatnonzero(indices[start:end] == destination)
+        return int(values[start + hits[0]]) if len(hits) else 0
+
+    def summary(self, county_fips: str, limit: int, partner_fips: Optional[str] = None) -> Optional[MigrationFlowsResponse]:
+        """Everything /migration-flows reports for a covered county, or None."""
+        totals = self.county_totals(county_fips)
+        if totals is None:
+            return None
+        partner, partner_outbound = None, None
+        if partner_fips is not None and self.index(partner_fips) is not None:
+            partner = CountyFlow(fips=partner_fips, name=self.name(partner_fips), movers=self.flow(partner_fips, county_fips))
+            partner_outbound = self.flow(county_fips, partner_fips)
+        return MigrationFlowsResponse(
+            fips=county_fips,
+            name=self.name(county_fips),
+            data_year=self.year,
+            moved_in=totals["MOVEDIN"],
+            moved_out=totals["MOVEDOUT"],
+            moved_net=totals["MOVEDNET"],
+            top_inbound=self.top(county_fips, "inbound", limit),
+            top_outbound=self.top(county_fips, "outbound", limit),
+            partner=partner,
+            partner_outbound=partner_outbound,
+        )
+
+
+def _is_county(geoid: Any) -> bool:
+    return isinstance(geoid, str) and len(geoid) == 5 and geoid.isdigit()
+
+
+def flow_totals(rows: Iterable[Mapping[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """
+    MOVEDIN/MOVEDOUT/MOVEDNET per county from flows rows (GEOID1 the county, GEOID2 the
+    partner): the sum over every partner, including regions abroad (which only have
+    MOVEDIN), but not moves within the county itself. Both the store and the live
+    fetch report these totals.
+    """
+    totals: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        county, partner = row.get("GEOID1"), row.get("GEOID2")
+        if not _is_county(county) or partner == county:
+            continue
+        county_totals = totals.setdefault(county, {"MOVEDIN": 0, "MOVEDOUT": 0, "MOVEDNET": 0})
+        county_totals["MOVEDIN"] += row.get("MOVEDIN") or 0
+        county_totals["MOVEDOUT"] += row.get("MOVEDOUT") or 0
+        county_totals["MOVEDNET"] = county_totals["MOVEDIN"] - county_totals["MOVEDOUT"]
+    return totals
+
+
+def _csr(n: int, pairs: Mapping[Tuple[int, int], int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR over `n` rows from {(row, column): value}, each row sorted by value descending."""
+    rows: List[List[Tuple[int, int]]] = [[] for _ in range(n)]
+    for (row, column), value in pairs.items():
+        rows[row].append((value, column))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indices = np.empty(len(pairs), dtype=np.int32)
+    values = np.empty(len(pairs), dtype=np.int32)
+    position = 0
+    for row, entries in enumerate(rows):
+        entries.sort(key=lambda e: (-e[0], e[1]))
+        for value, column in entries:
+            indices[position], values[position] = column, value
+            position += 1
+        indptr[row + 1] = position
+    return indptr, indices, values
+
+
+def write_migration_flows(path: str | Path, year: int, rows: Iterable[Mapping[str, Any]]) -> Tuple[int, int]:
+    """
+    Writes a flows directory from `CensusAPIClient.fetch_county_flows_in_state` rows and
+    returns (counties, flows). Totals are `flow_totals` of the rows. Published with
+    `publish_store`.
+    """
+    path = Path(path)
+    rows = list(rows)
+    names: Dict[str, str] = {}
+    directed: Dict[Tuple[str, str], int] = {}
+    for row in rows:
+        county, partner = row.get("GEOID1"), row.get("GEOID2")
+        if not _is_county(county):
+            continue
+        names[county] = row.get("FULL1_NAME") or county
+        moved_in, moved_out = row.get("MOVEDIN") or 0, row.get("MOVEDOUT") or 0
+        if _is_county(partner) and partner != county:
+            names.setdefault(partner, row.get("FULL2_NAME") or partner)
+            if moved_in > 0:
+                directed[(partner, county)] = moved_in
+            if moved_out > 0:
+                directed[(county, partner)] = moved_out
+
+    counties = sorted(names)
+    position = {county: i for i, county in enumerate(counties)}
+    totals_array = np.full((len(counties), 3), np.nan, dtype=np.float64)
+    for county, totals in flow_totals(rows).items():
+        totals_array[position[county]] = (totals["MOVEDIN"], totals["MOVEDOUT"], totals["MOVEDNET"])
+    outbound = {(position[o], position[d]): v for (o, d), v in directed.items()}
+    inbound = {(d, o): v for (o, d), v in outbound.items()}
+    encoded_names = [names[c].encode("utf-8") for c in counties]
+
+    with publish_store(path) as staging:
+        np.save(staging / COUNTIES_FILE, np.array([c.encode() for c in counties], dtype="S5"))
+        np.save(staging / NAMES_FILE, np.array(encoded_names, dtype=f"S{max((len(n) for n in encoded_names), default=1)}"))
+        np.save(staging / TOTALS_FILE, totals_array)
+        for direction, pairs in (("outbound", outbound), ("inbound", inbound)):
+            for part, array in zip(("indptr", "indices", "values"), _csr(len(counties), pairs)):
+                np.save(staging / CSR_FILES[direction][part], array)
+        with open(staging / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({"year": year, "counties": len(counties), "flows": len(outbound)}, f)
+
+    return len(counties), len(outbound)
@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+from typing import List, Literal, Optional, Sequence, get_args
+
+import numpy as np
+
+from app.schemas.population import PopulationTrendPoint
+
+ProjectionModel = Literal["county_growth", "cagr", "linear", "log_linear", "county_share"]
+PROJECTION_MODELS = get_args(ProjectionModel)
+
+# Two-sided Student-t critical values by confidence and degrees of freedom (1-10);
+# larger samples use the normal value. Trend series here have at most a handful of points.
+_T_CRITICAL = {
+    0.80: [3.078, 1.886, 1.638, 1.533, 1.476, 1.440, 1.415, 1.397, 1.383, 1.372],
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228],
+}
+_Z_CRITICAL = {0.80: 1.282, 0.90: 1.645, 0.95: 1.960}
+
+
+def _t_critical(confidence: float, dof: np.ndarray) -> np.ndarray:
+    table = np.asarray(_T_CRITICAL[confidence])
+    dof = np.asarray(dof)
+    index = np.clip(dof - 1, 0, len(table) - 1).astype(int)
+    # dof < 1 leaves no residual variance to estimate, so no band.
+    return np.where(dof < 1, np.nan, np.where(dof > len(table), _Z_CRITICAL[confidence], table[index]))
+
+
+@dataclass
+class ProjectionResult:
+    """Projections for n series over h future years; every array is (n, h)."""
+    model: str
+    years: np.ndarray
+    estimate: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+    def to_trend_points(self, row: int = 0) -> List[PopulationTrendPoint]:
+        """Converts one series to response points, skipping years that could not be projected."""
+        points = []
+        for year, est, lo, hi in zip(self.years, self.estimate[row], self.lower[row], self.upper[row]):
+            if np.isnan(est):
+                continue
+            points.append(PopulationTrendPoint(
+                year=int(year), population=int(round(est)), is_projection=True,
+                lower=None if np.isnan(lo) else int(round(lo)),
+                upper=None if np.isnan(hi) else int(round(hi)),
+            ))
+        return points
+
+
+def _fit_lines(x: np.ndarray, y: np.ndarray):
+    """
+    Row-wise least squares of y (n, t) on x (t,), ignoring NaNs.
+    Returns intercept, slope, residual std, point count, x mean and Sxx, each (n,).
+    """
+    mask = ~np.isnan(y)
+    n = mask.sum(axis=1)
+    xs = np.where(mask, x, 0.0)
+    ys = np.where(mask, y, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = xs.sum(axis=1) / n
+        y_mean = ys.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        dy = np.where(mask, y - y_mean[:, None], 0.0)
+        sxx = (dx ** 2).sum(axis=1)
+        slope = (dx * dy).sum(axis=1) / sxx
+        intercept = y_mean - slope * x_mean
+        residuals = np.where(mask, y - (intercept[:, None] + slope[:, None] * x), 0.0)
+        resid_std = np.sqrt((residuals ** 2).sum(axis=1) / (n - 2))
+    return intercept, slope, resid_std, n, x_mean, sxx
+
+
+def _last_valid(y: np.ndarray) -> np.ndarray:
+    """The most recent non-NaN value of each row (NaN if the row is empty)."""
+    mask = ~np.isnan(y)
+    last = y.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+    return np.where(mask.any(axis=1), y[np.arange(y.shape[0]), last], np.nan)
+
+
+class ProjectionEngine:
+    """
+    Projects population series with a selectable model, for one tract or thousands at
+    once. Inputs are arrays (years along the last axis, NaN for missing years) and every
+    model is evaluated with whole-array NumPy operations; only `to_trend_points`
+    allocates response objects.
+
+    Models:
+      county_growth  tract's latest population grown by the mean county growth factor
+      cagr           the tract's own compound growth, first to last observation
+      linear         least-squares line through the tract series
+      log_linear     least-squares line through log population (constant % growth)
+      county_share   the tract keeps its historical share of the county's projected change
+    Bands are `confidence` intervals: prediction intervals for the regression models,
+    and growth-rate uncertainty compounded over the horizon for the growth models.
+    """
+    def __init__(self, horizon: int = 3, confidence: float = 0.90):
+        if confidence not in _T_CRITICAL:
+            raise ValueError(f"Unsupported projection confidence {confidence}; use one of {sorted(_T_CRITICAL)}.")
+        self.horizon = horizon
+        self.confidence = confidence
+
+    def project(
+        self,
+        years: Sequence[int],
+        populations: np.ndarray,
+        model: ProjectionModel = "county_growth",
+        county_populations: Optional[np.ndarray] = None,
+    ) -> ProjectionResult:
+        """
+        years: (t,) observation years; populations: (n, t) or (t,) tract series.
+        county_populations: (t,) county series, required by county_growth and county_share.
+        """
+        if model not in PROJECTION_MODELS:
+            raise ValueError(f"Unknown projection model '{model}'.")
+        x = np.asarray(years, dtype=float)
+        y = np.atleast_2d(np.asarray(populations, dtype=float))
+        future = x[-1] + np.arange(1, self.horizon + 1)
+        if model in ("county_growth", "county_share"):
+            if county_populations is None:
+                raise ValueError(f"Projection model '{model}' needs the county series.")
+            county = np.asarray(county_populations, dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            if model == "county_growth":
+                estimate, lower, upper = self._county_growth(y, county)
+            elif model == "cagr":
+                estimate, lower, upper = self._cagr(x, y)
+            elif model == "linear":
+                estimate, lower, upper = self._regression(x, y, future)
+            elif model == "log_linear":
+                estimate, lower, upper = (np.exp(a) for a in self._regression(x, np.log(np.where(y > 0, y, np.nan)), future))
+            else:
+                estimate, lower, upper = self._county_share(x, y, county, future)
+        return ProjectionResult(model, future.astype(int), estimate, lower, upper)
+
+    def _steps(self) -> np.ndarray:
+        return np.arange(1, self.horizon + 1, dtype=float)[None, :]
+
+    def _county_growth(self, y: np.ndarray, county: np.ndarray):
+        factors = county[1:] / county[:-1]
+        factors = factors[np.isfinite(factors) & (county[:-1] > 0)]
+        base = _last_valid(y)[:, None]
+        if factors.size == 0:
+            nan = np.full((y.shape[0], self.horizon), np.nan)
+            return nan, nan, nan
+        growth = factors.mean()
+        # Uncertainty of the mean factor, compounded over the horizon.
+        margin = _t_critical(self.confidence, factors.size - 1) * factors.std(ddof=1) / np.sqrt(factors.size) if factors.size > 1 else np.nan
+        steps = self._steps()
+        return base * growth ** steps, base * (growth - margin) ** steps, base * (growth + margin) ** steps
+
+    def _cagr(self, x: np.ndarray, y: np.ndarray):
+        mask = ~np.isnan(y) & (y > 0)
+        first = np.argmax(mask, axis=1)
+        last = y.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+        rows = np.arange(y.shape[0])
+        start, end = y[rows, first], y[rows, last]
+        periods = x[last] - x[first]
+        log_rate = np.where(mask.any(axis=1) & (periods > 0), np.log(end / start) / periods, np.nan)
+        # Spread of the year-over-year log growth; the band widens like a random walk with drift.
+        log_changes = np.diff(np.log(np.where(mask, y, np.nan)), axis=1) / np.diff(x)
+        has_change = ~np.isnan(log_changes)
+        valid_changes = has_change.sum(axis=1)
+        mean_change = np.where(has_change, log_changes, 0.0).sum(axis=1) / valid_changes
+        deviations = np.where(has_change, log_changes - mean_change[:, None], 0.0)
+        sigma = np.sqrt((deviations ** 2).sum(axis=1) / (valid_changes - 1))
+        margin = (_t_critical(self.confidence, valid_changes - 1) * sigma)[:, None] * np.sqrt(self._steps())
+        steps = self._steps()
+        center = np.log(end)[:, None] + log_rate[:, None] * steps
+        return np.exp(center), np.exp(center - margin), np.exp(center + margin)
+
+    def _regression(self, x: np.ndarray, y: np.ndarray, future: np.ndarray):
+        intercept, slope, resid_std, n, x_mean, sxx = _fit_lines(x, y)
+        estimate = intercept[:, None] + slope[:, None] * future[None, :]
+        # Prediction interval for a new observation at each future year.
+        se = resid_std[:, None] * np.sqrt(1 + 1 / n[:, None] + (future[None, :] - x_mean[:, None]) ** 2 / sxx[:, None])
+        margin = _t_critical(self.confidence, n - 2)[:, None] * se
+        return estimate, estimate - margin, estimate + margin
+
+    def _county_share(self, x: np.ndarray, y: np.ndarray, county: np.ndarray, future: np.ndarray):
+        county_log = np.log(np.where(county > 0, county, np.nan))[None, :]
+        c_est, c_lo, c_hi = (np.exp(a) for a in self._regression(x, county_log, future))
+        county_last = _last_valid(county[None, :])[0]
+        county_change = county_last - county[~np.isnan(county)][0] if np.any(~np.isnan(county)) else np.nan
+
+        tract_last = _last_valid(y)
+        mask = ~np.isnan(y)
+        tract_first = y[np.arange(y.shape[0]), np.argmax(mask, axis=1)]
+        if np.isfinite(county_change) and county_change != 0:
+            # Each tract captures the same share of county growth it captured historically.
+            share = ((tract_last - tract_first) / county_change)[:, None]
+            project = lambda county_future: tract_last[:, None] + share * (county_future - county_last)
+        else:
+            # A flat county gives no growth to share out; hold each tract's share of the total.
+            share = (tract_last / county_last)[:, None]
+            project = lambda county_future: share * county_future
+        estimate, a, b = project(c_est), project(c_lo), project(c_hi)
+        # A negative share maps the county's upper bound to the tract's lower bound.
+        return estimate, np.minimum(a, b), np.maximum(a, b)
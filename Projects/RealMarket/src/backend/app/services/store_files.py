@@ -0,0 +1,50 @@
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+@contextmanager
+def publish_store(path: str | Path) -> Iterator[Path]:
+    """
+    Yields an empty directory to write a memory-mapped store into and, once the block
+    succeeds, publishes it at `path` atomically.
+
+    `path` is a symlink to a versioned sibling (`<name>.v<ns>`). Publishing renames a new
+    symlink over it, so anything opening `path` sees the old store or the new one, never
+    a missing or half-written directory. The version it replaces is kept because a worker
+    may be opening it right now; older versions are removed (workers that already mapped
+    their files keep reading them until they reopen). A `path` that is still a plain
+    directory is moved aside once on its first publish, which is not atomic.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    version = path.with_name(f"{path.name}.v{time.time_ns()}")
+    version.mkdir()
+    try:
+        yield version
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+
+    previous: Optional[str] = None
+    if path.is_symlink():
+        previous = Path(os.readlink(path)).name
+    elif path.exists():
+        legacy = path.with_name(f"{path.name}.v0")
+        shutil.rmtree(legacy, ignore_errors=True)
+        os.replace(path, legacy)
+        previous = legacy.name
+
+    link = path.with_name(f"{path.name}.link")
+    if link.is_symlink() or link.exists():
+        link.unlink()
+    # Relative target, so the store keeps working if its parent directory is moved.
+    os.symlink(version.name, link)
+    os.replace(link, path)
+
+    for stale in path.parent.glob(f"{path.name}.v*"):
+        if stale.name not in (version.name, previous):
+            shutil.rmtree(stale, ignore_errors=True)
@@ -0,0 +1,267 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.schemas.population import FipsCode, NeighborComparison, NeighborMetric, NeighborTract
+from app.services.county_percentiles import PERCENTILE_METRICS, Columns
+from app.services.store_files import publish_store
+from app.services.tract_matrix import TractMatrix, _to_census_value
+
+# Files of an adjacency directory. The .npy arrays are memory-mapped read-only.
+GEOIDS_FILE = "geoids.npy"
+INDPTR_FILE = "indptr.npy"
+INDICES_FILE = "indices.npy"
+META_FILE = "meta.json"
+
+# Vertices are matched on coordinates rounded to 1e-6 degrees (about 10 cm), the
+# precision the boundaries are requested at.
+COORDINATE_SCALE = 1_000_000
+# Tracts sharing a single vertex only touch at a corner; a shared edge has at least two.
+MIN_SHARED_VERTICES = 2
+
+# Metrics compared with the neighbors, with the same definitions as the county percentiles.
+NEIGHBOR_METRICS: Dict[str, Callable[[Columns], np.ndarray]] = {
+    "total_population": lambda c: c["B01003_001E"],
+    **{
+        name: PERCENTILE_METRICS[name]
+        for name in (
+            "median_household_income", "median_home_value", "median_gross_rent", "median_age",
+            "percent_bachelors_or_higher", "percent_renter_occupied", "vacancy_rate", "poverty_rate",
+        )
+    },
+}
+NEIGHBOR_VARS = [
+    "B01003_001E", "B19013_001E", "B25077_001E", "B25064_001E", "B01002_001E",
+    "B15003_001E", "B15003_022E", "B15003_023E", "B15003_024E", "B15003_025E",
+    "B25003_001E", "B25003_003E", "B25002_001E", "B25002_003E", "S1701_C03_001E",
+]
+
+
+class TractAdjacency:
+    """
+    Which tracts share a boundary, built from TIGERweb tract polygons by
+    `python -m app.jobs.tract_adjacency`.
+
+    Tracts are sorted by GEOID and the graph is stored as CSR: the neighbors of tract i
+    are `indices[indptr[i]:indptr[i + 1]]`. Adjacency is symmetric and crosses county
+    and state lines. The national graph is a few megabytes.
+    """
+    def __init__(self, path: Path, year: int, geoids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, version: str = ""):
+        self.path = path
+        self.year = year
+        # Changes with every rebuild; cached responses derived from the store carry it in their ETag.
+        self.version = version
+        self.geoids = geoids
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def open(cls, path: str | Path) -> "TractAdjacency":
+        # Resolved once, so every file comes from the same published version.
+        path = Path(path).resolve()
+        with open(path / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        geoids = np.load(path / GEOIDS_FILE, mmap_mode="r")
+        indptr = np.load(path / INDPTR_FILE, mmap_mode="r")
+        indices = np.load(path / INDICES_FILE, mmap_mode="r")
+        if len(indptr) != len(geoids) + 1 or indptr[-1] != len(indices):
+            raise ValueError(f"Tract adjacency at {path} is inconsistent.")
+        adjacency = cls(path, meta["year"], geoids, indptr, indices, str(os.stat(path / META_FILE).st_mtime_ns))
+        logger.info(f"Mapped tract adjacency {path} ({len(geoids)} tracts, {len(indices) // 2} shared boundaries).")
+        return adjacency
+
+    def __len__(self) -> int:
+        return len(self.geoids)
+
+    def index(self, geoid: str) -> Optional[int]:
+        key = geoid.encode()
+        i = int(np.searchsorted(self.geoids, key))
+        return i if i < len(self.geoids) and self.geoids[i] == key else None
+
+    def neighbors(self, geoid: str) -> Optional[List[str]]:
+        """GEOIDs of the tracts sharing a boundary with `geoid`, or None if it is not in the index."""
+        i = self.index(geoid)
+        if i is None:
+            return None
+        return [g.decode() for g in self.geoids[self.indices[int(self.indptr[i]):int(self.indptr[i + 1])]]]
+
+
+def _metric(values: np.ndarray) -> Optional[NeighborMetric]:
+    """Compares values[0] (the tract) with values[1:] (its neighbors); NaN is unavailable."""
+    tract, others = float(values[0]), values[1:][~np.isnan(values[1:])]
+    if np.isnan(tract) and not len(others):
+        return None
+    median = float(np.median(others)) if len(others) else None
+    known = not np.isnan(tract)
+    return NeighborMetric(
+        tract=round(tract, 2) if known else None,
+        neighbors_median=round(median, 2) if median is not None else None,
+        difference_percent=round((tract - median) / abs(median) * 100, 2) if known and median else None,
+        rank=int((others > tract).sum()) + 1 if known else None,
+    )
+
+
+def compare_neighbors(fips: FipsCode, adjacency: TractAdjacency, matrix: TractMatrix) -> Optional[NeighborComparison]:
+    """
+    The tract against its adjacent tracts, entirely from the adjacency index and the
+    tract matrix. None if either does not cover the tract or it has no neighbors in the matrix.
+    """
+    geoid = f"{fips.state}{fips.county}{fips.tract}"
+    neighbor_geoids = adjacency.neighbors(geoid)
+    row = matrix.geoid_row(geoid)
+    if not neighbor_geoids or row is None:
+        return None
+    neighbor_rows = [(g, r) for g, r in ((g, matrix.geoid_row(g)) for g in neighbor_geoids) if r is not None]
+    if not neighbor_rows:
+        return None
+    try:
+        columns = [matrix.columns[var] for var in NEIGHBOR_VARS]
+    except KeyError:
+        return None
+    rows = [row] + [r for _, r in neighbor_rows]
+    values = np.asarray(matrix.values[rows][:, columns], dtype=np.float64)
+    table: Columns = {var: values[:, i] for i, var in enumerate(NEIGHBOR_VARS)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = {name: _metric(np.asarray(compute(table), dtype=np.float64)) for name, compute in NEIGHBOR_METRICS.items()}
+
+    def value(var: str, i: int) -> Optional[int]:
+        v = _to_census_value(table[var][i])
+        return None if v is None else int(v)
+
+    neighbors = [
+        NeighborTract(
+            geoid=g,
+            name=matrix.names[r].decode("utf-8"),
+            total_population=value("B01003_001E", i),
+            median_household_income=value("B19013_001E", i),
+            median_home_value=value("B25077_001E", i),
+            median_gross_rent=value("B25064_001E", i),
+        )
+        for i, (g, r) in enumerate(neighbor_rows, start=1)
+    ]
+    return NeighborComparison(data_year=matrix.year, neighbor_count=len(neighbors), neighbors=neighbors, **metrics)
+
+
+def _polygon_rings(geometry: Dict[str, Any]) -> List[List[List[float]]]:
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return geometry["coordinates"]
+    if geometry.get("type") == "MultiPolygon":
+        return [ring for polygon in geometry["coordinates"] for ring in polygon]
+    return []
+
+
+def _vertex_keys(ring: List[List[float]]) -> np.ndarray:
+    points = np.rint(np.asarray(ring, dtype=np.float64)[:, :2] * COORDINATE_SCALE).astype(np.int64)
+    # Longitude and latitude (offset to be non-negative) packed into one int64.
+    return ((points[:, 0] + 180 * COORDINATE_SCALE) << 29) | (points[:, 1] + 90 * COORDINATE_SCALE)
+
+
+def _group_starts(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start offsets and sizes of the runs of equal rows in sorted `keys`."""
+    changed = np.any(keys[1:] != keys[:-1], axis=1) if keys.ndim == 2 else keys[1:] != keys[:-1]
+    starts = np.flatnonzero(np.r_[True, changed])
+    return starts, np.diff(np.r_[starts, len(keys)])
+
+
+def _shared_vertices(keys: np.ndarray, owners: np.ndarray) -> np.ndarray:
+    """The (a, b) owner pairs that share at least MIN_SHARED_VERTICES vertex keys."""
+    pairs = np.unique(np.column_stack((keys, owners)), axis=0)
+    owners = pairs[:, 1]
+    starts, sizes = _group_starts(pairs[:, 0])
+    edges = []
+    # Groups are tiny (a vertex is shared by a handful of tracts), so pair them up by size.
+    for size in np.unique(sizes[sizes > 1]):
+        group_starts = starts[sizes == size]
+        for a in range(size):
+            for b in range(a + 1, size):
+                edges.append(np.column_stack((owners[group_starts + a], owners[group_starts + b])))
+    if not edges:
+        return np.empty((0, 2), dtype=np.int64)
+    edges, counts = np.unique(np.vstack(edges), axis=0, return_counts=True)
+    return edges[counts >= MIN_SHARED_VERTICES]
+
+
+def _outline_vertices(segments: np.ndarray, owners: np.ndarray) -> np.ndarray:
+    """
+    (key, owner) rows for the endpoints of boundary segments with a single owner. Tracts
+    tile their state, so those segments trace the state's outline.
+    """
+    rows = np.unique(np.column_stack((segments, owners)), axis=0)
+    starts, sizes = _group_starts(rows[:, :2])
+    single = rows[np.repeat(sizes == 1, sizes)]
+    return np.unique(np.vstack((single[:, [0, 2]], single[:, [1, 2]])), axis=0)
+
+
+class TractAdjacencyBuilder:
+    """
+    Accumulates tract boundaries state by state. Adjacency within a state is resolved as
+    each state is added; only vertices on the state's outline are kept to find neighbors
+    across state lines when the index is written.
+    """
+    def __init__(self) -> None:
+        self.geoids: List[str] = []
+        self._edges: List[np.ndarray] = []
+        self._outline: List[np.ndarray] = []
+
+    def add_state(self, features: List[Dict[str, Any]]) -> int:
+        """Adds one state's GeoJSON tract features and returns the number of tracts added."""
+        keys, segments, owners = [], [], []
+        first = len(self.geoids)
+        for feature in features:
+            props = feature.get("properties") or {}
+            rings = [r for r in _polygon_rings(feature.get("geometry")) if len(r) >= 3]
+            if not rings or not all(props.get(k) for k in ("STATE", "COUNTY", "TRACT")):
+                continue
+            owner = len(self.geoids)
+            self.geoids.append(f"{props['STATE']}{props['COUNTY']}{props['TRACT']}")
+            for ring in rings:
+                ring_keys = _vertex_keys(ring)
+                keys.append(ring_keys)
+                # Rings are closed, so consecutive vertices are the ring's segments.
+                segments.append(np.sort(np.column_stack((ring_keys[:-1], ring_keys[1:])), axis=1))
+                owners.append(np.full(len(ring_keys), owner, dtype=np.int64))
+        if not keys:
+            return 0
+        self._edges.append(_shared_vertices(np.concatenate(keys), np.concatenate(owners)))
+        self._outline.append(_outline_vertices(np.vstack(segments), np.concatenate([o[:-1] for o in owners])))
+        return len(self.geoids) - first
+
+    def write(self, path: str | Path, year: int) -> Tuple[int, int]:
+        """Writes the adjacency directory and returns (tracts, shared boundaries)."""
+        edges = list(self._edges)
+        if self._outline:
+            outline = np.vstack(self._outline)
+            edges.append(_shared_vertices(outline[:, 0], outline[:, 1]))
+        edges = np.vstack(edges) if edges else np.empty((0, 2), dtype=np.int64)
+        return write_tract_adjacency(path, year, self.geoids, edges)
+
+
+def write_tract_adjacency(path: str | Path, year: int, geoids: List[str], edges: np.ndarray) -> Tuple[int, int]:
+    """
+    Writes an adjacency directory from GEOIDs and undirected (i, j) edges over their
+    positions, and returns (tracts, edges). Published with `publish_store`.
+    """
+    path = Path(path)
+    order = np.argsort(np.array(geoids, dtype="S11"), kind="stable")
+    position = np.empty(len(geoids), dtype=np.int64)
+    position[order] = np.arange(len(geoids))
+    edges = np.unique(np.sort(position[edges], axis=1), axis=0) if len(edges) else np.empty((0, 2), dtype=np.int64)
+    directed = np.vstack((edges, edges[:, ::-1]))
+    directed = directed[np.lexsort((directed[:, 1], directed[:, 0]))]
+    indptr = np.zeros(len(geoids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(directed[:, 0], minlength=len(geoids)), out=indptr[1:])
+
+    with publish_store(path) as staging:
+        np.save(staging / GEOIDS_FILE, np.array([geoids[i].encode() for i in order], dtype="S11"))
+        np.save(staging / INDPTR_FILE, indptr)
+        np.save(staging / INDICES_FILE, directed[:, 1].astype(np.int32))
+        with open(staging / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({"year": year, "tracts": len(geoids), "edges": len(edges)}, f)
+
+    return len(geoids), len(edges)
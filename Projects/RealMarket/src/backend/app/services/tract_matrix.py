@@ -0,0 +1,122 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.schemas.population import FipsCode
+from app.services.store_files import publish_store
+
+# Files of a matrix directory. The two .npy arrays are memory-mapped read-only, so
+# every worker on a host shares one copy through the page cache.
+VALUES_FILE = "values.npy"
+GEOIDS_FILE = "geoids.npy"
+NAMES_FILE = "names.npy"
+META_FILE = "meta.json"
+
+
+def _to_census_value(value: float) -> int | float | None:
+    """Mirrors CensusAPIClient._parse_census_value: NaN is missing, whole numbers are ints."""
+    if np.isnan(value):
+        return None
+    return int(value) if float(value).is_integer() else float(value)
+
+
+class TractMatrix:
+    """
+    A national table of ACS tract estimates and MOEs for one vintage, built by
+    `python -m app.jobs.tract_matrix`.
+
+    Rows are tracts sorted by GEOID, columns are Census variables, and missing or
+    suppressed values are NaN. A GEOID lookup goes through a small per-county row range
+    (about 3,200 entries) and a binary search over that county's tracts in the mapped
+    GEOID array, so the only per-worker memory is the county index.
+    """
+    def __init__(self, path: Path, year: int, variables: List[str], values: np.ndarray, geoids: np.ndarray, names: np.ndarray, version: str = ""):
+        self.path = path
+        self.year = year
+        # Changes with every rebuild; cached responses derived from the store carry it in their ETag.
+        self.version = version
+        self.variables = variables
+        self.columns = {var: i for i, var in enumerate(variables)}
+        self.values = values
+        self.geoids = geoids
+        self.names = names
+        counties, starts = np.unique(geoids.astype("S5"), return_index=True)
+        ends = np.append(starts[1:], len(geoids))
+        self._county_rows: Dict[bytes, Tuple[int, int]] = {
+            county: (int(start), int(end)) for county, start, end in zip(counties, starts, ends)
+        }
+
+    @classmethod
+    def open(cls, path: str | Path) -> "TractMatrix":
+        # Resolved once, so every file comes from the same published version.
+        path = Path(path).resolve()
+        with open(path / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        values = np.load(path / VALUES_FILE, mmap_mode="r")
+        geoids = np.load(path / GEOIDS_FILE, mmap_mode="r")
+        names = np.load(path / NAMES_FILE, mmap_mode="r")
+        if values.shape != (len(geoids), len(meta["variables"])):
+            raise ValueError(f"Tract matrix at {path} is inconsistent: {values.shape} values for {len(geoids)} tracts.")
+        matrix = cls(path, meta["year"], meta["variables"], values, geoids, names, str(os.stat(path / META_FILE).st_mtime_ns))
+        logger.info(f"Mapped tract matrix {path} ({len(geoids)} tracts x {len(matrix.variables)} variables, ACS {matrix.year}).")
+        return matrix
+
+    def __len__(self) -> int:
+        return len(self.geoids)
+
+    def row_index(self, fips: FipsCode) -> Optional[int]:
+        return self.geoid_row(f"{fips.state}{fips.county}{fips.tract}")
+
+    def geoid_row(self, geoid: str) -> Optional[int]:
+        bounds = self._county_rows.get(geoid[:5].encode())
+        if bounds is None:
+            return None
+        start, end = bounds
+        key = geoid.encode()
+        i = start + int(np.searchsorted(self.geoids[start:end], key))
+        return i if i < end and self.geoids[i] == key else None
+
+    def section(self, fips: FipsCode, variables: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """
+        The tract's values for `variables`, shaped like `CensusAPIClient.fetch_acs_data`
+        (NAME plus parsed numbers). None if the tract or any variable is not in the matrix.
+        """
+        row = self.row_index(fips)
+        if row is None:
+            return None
+        try:
+            columns = [self.columns[var] for var in variables]
+        except KeyError:
+            return None
+        values = self.values[row, columns]
+        section: Dict[str, Any] = {"NAME": self.names[row].decode("utf-8")}
+        section.update({var: _to_census_value(v) for var, v in zip(variables, values)})
+        return section
+
+
+def write_tract_matrix(path: str | Path, year: int, variables: List[str], rows: Mapping[str, Mapping[str, Any]]) -> int:
+    """
+    Writes a matrix directory from `{geoid: {"NAME": ..., var: value}}` and returns the
+    tract count. Published with `publish_store`, so readers never see a partial matrix;
+    workers that already mapped the old files keep reading them until they reopen.
+    """
+    path = Path(path)
+    geoids = sorted(rows)
+    values = np.full((len(geoids), len(variables)), np.nan, dtype=np.float64)
+    for i, geoid in enumerate(geoids):
+        row = rows[geoid]
+        values[i] = [np.nan if row.get(var) is None else row[var] for var in variables]
+    names = [(rows[geoid].get("NAME") or "").encode("utf-8") for geoid in geoids]
+
+    with publish_store(path) as staging:
+        np.save(staging / VALUES_FILE, values)
+        np.save(staging / GEOIDS_FILE, np.array([g.encode() for g in geoids], dtype="S11"))
+        np.save(staging / NAMES_FILE, np.array(names, dtype=f"S{max((len(n) for n in names), default=1)}"))
+        with open(staging / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({"year": year, "variables": variables, "tracts": len(geoids)}, f)
+
+    return len(geoids)
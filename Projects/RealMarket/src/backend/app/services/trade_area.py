@@ -0,0 +1,243 @@
+import asyncio
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from loguru import logger
+
+from app.core.tracing import span
+from app.schemas.population import Coordinates, TradeAreaResponse, TradeAreaTract, ValueWithMoe
+from app.services.census_api_client import CensusAPIClient
+from app.services.census_service import LATEST_ACS_YEAR, _expand_vars_with_moe
+from app.services.data_processor import DataProcessor
+
+MILES_PER_DEGREE_LAT = 69.0
+# Partially covered tracts are sampled on GRID x GRID lattices (see TractGeometryIndex.coverage).
+COVERAGE_GRID = 48
+
+# Count variables are apportioned by the share of each tract's area inside the radius.
+COUNT_VARS = {
+    "B01003_001E": "total_population",
+    "B11001_001E": "total_households",
+    "B25002_001E": "total_housing_units",
+    "B25002_003E": "vacant_units",
+    "B25003_002E": "owner_occupied_units",
+    "B25003_003E": "renter_occupied_units",
+    "B15003_001E": "edu_total_pop_25_over",
+    "B15003_022E": "edu_bachelors",
+    "B15003_023E": "edu_masters",
+    "B15003_024E": "edu_professional",
+    "B15003_025E": "edu_doctorate",
+}
+# Medians cannot be summed; each is averaged across tracts weighted by its universe
+# (apportioned households for income, owner units for home value, and so on).
+MEDIAN_VARS = {
+    "B19013_001E": "B11001_001E",
+    "B25077_001E": "B25003_002E",
+    "B25064_001E": "B25003_003E",
+    "B01002_001E": "B01003_001E",
+}
+
+
+def _feature_rings(geometry: Dict[str, Any]) -> List[List[List[float]]]:
+    """Flattens a Polygon/MultiPolygon into its rings. Even-odd testing handles holes."""
+    if not geometry:
+        return []
+    if geometry.get("type") == "Polygon":
+        return geometry["coordinates"]
+    if geometry.get("type") == "MultiPolygon":
+        return [ring for polygon in geometry["coordinates"] for ring in polygon]
+    return []
+
+
+class TractGeometryIndex:
+    """
+    Tract polygons projected to a local plane (miles, centered on the trade area)
+    with an (n, 4) bounding-box array used to classify tracts in bulk before any
+    per-polygon work is done.
+    """
+    def __init__(self, features: List[Dict[str, Any]], lat: float, lon: float):
+        self.geoids: List[str] = []
+        self.rings: List[List[np.ndarray]] = []
+        x_scale = MILES_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        bboxes = []
+        for feature in features:
+            props = feature.get("properties") or {}
+            rings = [np.asarray(r, dtype=float) for r in _feature_rings(feature.get("geometry")) if len(r) >= 3]
+            if not rings or not all(props.get(k) for k in ("STATE", "COUNTY", "TRACT")):
+                continue
+            projected = [np.column_stack(((r[:, 0] - lon) * x_scale, (r[:, 1] - lat) * MILES_PER_DEGREE_LAT)) for r in rings]
+            points = np.vstack(projected)
+            self.geoids.append(f"{props['STATE']}{props['COUNTY']}{props['TRACT']}")
+            self.rings.append(projected)
+            bboxes.append((points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()))
+        self.bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+
+    @staticmethod
+    def _points_in_rings(px: np.ndarray, py: np.ndarray, rings: List[np.ndarray]) -> np.ndarray:
+        """Vectorized even-odd point-in-polygon test over all rings of one tract."""
+        crossings = np.zeros(px.shape, dtype=np.int32)
+        for ring in rings:
+            x1, y1 = ring[:, 0], ring[:, 1]
+            x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+            straddles = (y1[None, :] > py[:, None]) != (y2[None, :] > py[:, None])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = x1[None, :] + (py[:, None] - y1[None, :]) * (x2 - x1)[None, :] / (y2 - y1)[None, :]
+            crossings += np.count_nonzero(straddles & (px[:, None] < x_cross), axis=1)
+        return crossings % 2 == 1
+
+    def coverage(self, radius: float) -> np.ndarray:
+        """Returns, per tract, the share of its area that lies inside the radius (0-1)."""
+        if not self.geoids:
+            return np.zeros(0)
+        min_x, min_y, max_x, max_y = self.bboxes.T
+        nearest = np.hypot(np.clip(0.0, min_x, max_x), np.clip(0.0, min_y, max_y))
+        farthest = np.hypot(np.maximum(np.abs(min_x), np.abs(max_x)), np.maximum(np.abs(min_y), np.abs(max_y)))
+
+        weights = np.zeros(len(self.geoids))
+        weights[farthest <= radius] = 1.0
+        partial = np.flatnonzero((nearest < radius) & (farthest > radius))
+
+        for i in partial:
+            # The tract's area comes from a lattice over its own bounding box; the covered part
+            # from a second lattice over just the part of that box within the circle's box, so a
+            # small radius inside a large tract is still sampled at full resolution.
+            tract_area = self._sampled_area(i, min_x[i], min_y[i], max_x[i], max_y[i])
+            if tract_area <= 0:
+                continue
+            box = (max(min_x[i], -radius), max(min_y[i], -radius), min(max_x[i], radius), min(max_y[i], radius))
+            weights[i] = min(1.0, self._sampled_area(i, *box, radius=radius) / tract_area)
+        return weights
+
+    def _sampled_area(
+        self, i: int, min_x: float, min_y: float, max_x: float, max_y: float, radius: Optional[float] = None
+    ) -> float:
+        """Area of tract `i` inside a box (and, if given, within `radius` of the center), by lattice sampling."""
+        width, height = max_x - min_x, max_y - min_y
+        if width <= 0 or height <= 0:
+            return 0.0
+        steps = (np.arange(COVERAGE_GRID) + 0.5) / COVERAGE_GRID
+        px, py = (a.ravel() for a in np.meshgrid(min_x + steps * width, min_y + steps * height))
+        inside = self._points_in_rings(px, py, self.rings[i])
+        if radius is not None:
+            inside &= np.hypot(px, py) <= radius
+        return np.count_nonzero(inside) * width * height / COVERAGE_GRID ** 2
+
+
+def _matrix(rows: List[Dict[str, Any]], variables: List[str]) -> np.ndarray:
+    return np.array(
+        [[np.nan if row.get(v) is None else row[v] for v in variables] for row in rows], dtype=float
+    ).reshape(len(rows), len(variables))
+
+
+class TradeAreaService:
+    """Aggregates ACS estimates over every tract intersecting a radius around a point."""
+
+    def __init__(self, api_client: CensusAPIClient, data_processor: DataProcessor):
+        self.api_client = api_client
+        self.processor = data_processor
+
+    async def _fetch_tract_rows(self, geoids: List[str]) -> Dict[str, Dict[str, Any]]:
+        by_county: Dict[tuple, List[str]] = {}
+        for geoid in geoids:
+            by_county.setdefault((geoid[:2], geoid[2:5]), []).append(geoid[5:])
+        variables = _expand_vars_with_moe({**COUNT_VARS, **{v: v for v in MEDIAN_VARS}})
+        results = await asyncio.gather(*(
+            self.api_client.fetch_acs_for_tracts(state, county, tracts, LATEST_ACS_YEAR, variables)
+            for (state, county), tracts in by_county.items()
+        ))
+        rows = {}
+        for (state, county), county_rows in zip(by_county, results):
+            for tract, row in county_rows.items():
+                rows[f"{state}{county}{tract}"] = row
+        return rows
+
+    def _value(self, estimate: float, moe: float) -> ValueWithMoe:
+        if math.isnan(estimate):
+            return ValueWithMoe()
+        estimate = round(float(estimate), 1)
+        return self.processor.create_value_with_moe(estimate, float(moe) if moe > 0 else None)
+
+    def _aggregate(self, weights: np.ndarray, rows: List[Dict[str, Any]]) -> Dict[str, ValueWithMoe]:
+        count_vars = list(COUNT_VARS)
+        estimates = _matrix(rows, count_vars)
+        moes = _matrix(rows, [v[:-1] + "M" for v in count_vars])
+        w = weights[:, None]
+        # Apportioned sums, with MOEs combined by root-sum-square as in DataProcessor._create_sum_with_moe.
+        count_est = np.nansum(w * estimates, axis=0)
+        count_moe = np.sqrt(np.nansum((w * moes) ** 2, axis=0))
+        totals = {name: self._value(count_est[j], count_moe[j]) for j, name in enumerate(COUNT_VARS.values())}
+
+        medians = {}
+        for median_var, base_var in MEDIAN_VARS.items():
+            values = _matrix(rows, [median_var, median_var[:-1] + "M"])
+            base = weights * estimates[:, count_vars.index(base_var)]
+            valid = ~np.isnan(values[:, 0]) & (base > 0)
+            total_base = base[valid].sum()
+            if total_base <= 0:
+                medians[median_var] = ValueWithMoe()
+                continue
+            estimate = (base[valid] * values[valid, 0]).sum() / total_base
+            # Treats the weighted mean of medians as a linear combination for its MOE.
+            moe = np.sqrt(np.nansum((base[valid] * values[valid, 1]) ** 2)) / total_base
+            medians[median_var] = self._value(estimate, moe)
+        return {**totals, **medians}
+
+    async def get_trade_area(self, lat: float, lon: float, radius_miles: float) -> TradeAreaResponse:
+        with span("trade_area.tracts"):
+            features = await self.api_client.fetch_tracts_in_radius(lat, lon, radius_miles)
+        with span("trade_area.coverage", tracts=len(features)):
+            index = TractGeometryIndex(features, lat, lon)
+            weights = index.coverage(radius_miles)
+
+        covered = np.flatnonzero(weights > 0)
+        if covered.size == 0:
+            raise HTTPException(status_code=404, detail="No census tracts found within the trade area.")
+        geoids = [index.geoids[i] for i in covered]
+        weights = weights[covered]
+
+        with span("trade_area.acs", tracts=len(geoids)):
+            rows_by_geoid = await self._fetch_tract_rows(geoids)
+        present = [i for i, geoid in enumerate(geoids) if geoid in rows_by_geoid]
+        if not present:
+            raise HTTPException(status_code=404, detail="No ACS demographic data found for the trade area.")
+        geoids = [geoids[i] for i in present]
+        weights = weights[present]
+        rows = [rows_by_geoid[g] for g in geoids]
+        logger.info(f"Aggregating {len(geoids)} tracts within {radius_miles} mi of ({lat}, {lon}).")
+
+        with span("trade_area.aggregate"):
+            metrics = self._aggregate(weights, rows)
+
+        def share(numerator: ValueWithMoe, denominator: ValueWithMoe) -> Optional[float]:
+            if not numerator.value or not denominator.value:
+                return None
+            return round(numerator.value / denominator.value * 100, 1)
+
+        bachelors_or_higher = sum(
+            metrics[k].value or 0 for k in ("edu_bachelors", "edu_masters", "edu_professional", "edu_doctorate")
+        )
+        return TradeAreaResponse(
+            center=Coordinates(lat=lat, lon=lon),
+            radius_miles=radius_miles,
+            data_year=LATEST_ACS_YEAR,
+            tract_count=len(geoids),
+            tracts=[TradeAreaTract(geoid=g, coverage=round(float(w), 4)) for g, w in zip(geoids, weights)],
+            total_population=metrics["total_population"],
+            total_households=metrics["total_households"],
+            total_housing_units=metrics["total_housing_units"],
+            owner_occupied_units=metrics["owner_occupied_units"],
+            renter_occupied_units=metrics["renter_occupied_units"],
+            vacant_units=metrics["vacant_units"],
+            median_household_income=metrics["B19013_001E"],
+            median_home_value=metrics["B25077_001E"],
+            median_gross_rent=metrics["B25064_001E"],
+            median_age=metrics["B01002_001E"],
+            percent_renter_occupied=share(
+                metrics["renter_occupied_units"],
+                ValueWithMoe(value=(metrics["renter_occupied_units"].value or 0) + (metrics["owner_occupied_units"].value or 0)),
+            ),
+            vacancy_rate=share(metrics["vacant_units"], metrics["total_housing_units"]),
+            percent_bachelors_or_higher=share(ValueWithMoe(value=bachelors_or_higher), metrics["edu_total_pop_25_over"]),
+        )
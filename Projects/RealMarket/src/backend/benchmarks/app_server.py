@@ -0,0 +1,30 @@
+"""
+Serves the API for benchmarking. Firebase auth is replaced by a benchmark user (the
+X-Benchmark-User header, so the harness can act as many users); everything else (DB,
+cache, services) is the real app. Upstream base URLs are expected to be pointed at the
+stand-in through the environment by `benchmarks.run`.
+"""
+import argparse
+
+import uvicorn
+from fastapi import Request
+
+from app.api.deps import get_current_user
+from app.main import app
+
+
+async def _benchmark_user(request: Request) -> dict:
+    return {"uid": request.headers.get("x-benchmark-user", "benchmark-user")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with benchmark auth overrides.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    args = parser.parse_args()
+    app.dependency_overrides[get_current_user] = _benchmark_user
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
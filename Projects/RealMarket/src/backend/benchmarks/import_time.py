@@ -0,0 +1,105 @@
+"""
+Import-time budget for the API process.
+
+Imports a module (default `app.main`) in fresh interpreters under `python -X importtime`,
+reports the median cumulative import time and the heaviest top-level packages, and exits
+non-zero if the median exceeds the budget or if a package that must stay lazy (Firebase,
+the asyncpg driver, pyarrow) was imported. Run it in CI or before a release:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 1200 --runs 9 --top 15
+    python -m benchmarks.import_time --module app.jobs.tract_matrix --forbid firebase_admin
+
+No database or upstream is needed: importing the app must not connect to anything.
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Imported on first use (lifespan, first request or job), never by `import app.main`.
+LAZY_PACKAGES = ("firebase_admin", "asyncpg", "pyarrow")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def measure(module: str) -> Tuple[float, Dict[str, float], List[str]]:
+    """
+    One fresh-interpreter import of `module`. Returns its cumulative import time in ms,
+    self time in ms per top-level package, and every module name that was imported.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_ms = 0.0
+    by_package: Dict[str, float] = defaultdict(float)
+    names: List[str] = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        names.append(name)
+        by_package[name.split(".")[0]] += int(self_us) / 1000
+        if name == module:
+            total_ms = int(cumulative_us) / 1000
+    return total_ms, dict(by_package), names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (the median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Fail if the median import time exceeds this")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest top-level packages to list")
+    parser.add_argument(
+        "--forbid", action="append", default=None,
+        help=f"Package that must not be imported (repeatable; default: {', '.join(LAZY_PACKAGES)})",
+    )
+    args = parser.parse_args()
+    forbidden = tuple(args.forbid) if args.forbid else LAZY_PACKAGES
+
+    # One untimed run first, so .pyc compilation is not counted.
+    measure(args.module)
+    totals: List[float] = []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    imported: set = set()
+    for _ in range(args.runs):
+        total_ms, by_package, names = measure(args.module)
+        totals.append(total_ms)
+        for package, ms in by_package.items():
+            packages[package].append(ms)
+        imported.update(names)
+
+    median = statistics.median(totals)
+    print(f"import {args.module}: median {median:.0f}ms over {args.runs} runs (min {min(totals):.0f}ms, max {max(totals):.0f}ms); budget {args.budget_ms:.0f}ms")
+    print(f"{'package':<24}{'self ms':>10}")
+    heaviest = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)[: args.top]
+    for package, samples in heaviest:
+        print(f"{package:<24}{statistics.median(samples):>10.1f}")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"median import time {median:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+    leaked = sorted(name for name in imported if any(name == p or name.startswith(f"{p}.") for p in forbidden))
+    if leaked:
+        failures.append(f"eagerly imported: {', '.join(leaked[:10])}{' ...' if len(leaked) > 10 else ''}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
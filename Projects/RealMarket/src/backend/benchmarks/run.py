@@ -0,0 +1,272 @@
+"""
+Offline benchmark harness.
+
+Starts the upstream stand-in and the API (each in its own process so neither shares
+the load generator's event loop), drives a set of workloads against /market-data and
+writes latency percentiles and throughput to a JSON results file.
+
+The API still needs a reachable Postgres (the usual POSTGRES_* settings); all upstream
+traffic goes to the stand-in.
+
+    python -m benchmarks.run --profile benchmarks/profiles/default.json
+    python -m benchmarks.run --workloads cache_hit,burst --requests 500 --compare benchmarks/results/baseline.json
+
+Per-user admission and the adaptive miss limit are off by default, so cold workloads
+measure the miss path rather than rejections. With --admission they stay on and every
+virtual client is its own user; 429s and shed 503s are reported apart from errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+WORKLOADS = ("cache_hit", "cache_miss", "same_tract", "burst")
+
+
+@dataclass
+class WorkloadResult:
+    name: str
+    requests: int
+    concurrency: int
+    errors: int
+    # Turned away by per-user admission (429) or shed by the miss limiter (503 with Retry-After).
+    rejected: int
+    shed: int
+    status_codes: Dict[str, int]
+    duration_s: float
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    max_ms: float
+    upstream_requests: Dict[str, int] = field(default_factory=dict)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower, upper = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+async def _wait_until_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=BACKEND_DIR, env=env)
+
+
+# --- Load generation ---
+
+async def _drive(
+    client: httpx.AsyncClient, addresses: List[str], concurrency: int
+) -> tuple[List[float], Dict[str, int], int, float]:
+    """Sends the addresses from `concurrency` virtual clients, each its own user (see app_server)."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for address in addresses:
+        queue.put_nowait(address)
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    shed = 0
+
+    async def virtual_client(n: int) -> None:
+        nonlocal shed
+        headers = {"X-Benchmark-User": f"benchmark-user-{n}"}
+        while not queue.empty():
+            address = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/market-data", json={"address": address}, headers=headers)
+                code = str(response.status_code)
+                # The miss limiter's 503s carry Retry-After; upstream failures do not.
+                shed += response.status_code == 503 and "retry-after" in response.headers
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_client(n) for n in range(min(concurrency, len(addresses)))))
+    return latencies, status_codes, shed, time.perf_counter() - start
+
+
+def _summarize(
+    name: str, latencies: List[float], status_codes: Dict[str, int], shed: int, duration: float, concurrency: int
+) -> WorkloadResult:
+    ordered = sorted(latencies)
+    rejected = status_codes.get("429", 0)
+    errors = sum(count for code, count in status_codes.items() if code != "200") - rejected - shed
+    return WorkloadResult(
+        name=name,
+        requests=len(latencies),
+        concurrency=concurrency,
+        errors=errors,
+        rejected=rejected,
+        shed=shed,
+        status_codes=status_codes,
+        duration_s=round(duration, 3),
+        rps=round(len(latencies) / duration, 2) if duration > 0 else 0.0,
+        p50_ms=round(_percentile(ordered, 50), 2),
+        p95_ms=round(_percentile(ordered, 95), 2),
+        p99_ms=round(_percentile(ordered, 99), 2),
+        mean_ms=round(statistics.fmean(ordered), 2) if ordered else 0.0,
+        max_ms=round(ordered[-1], 2) if ordered else 0.0,
+    )
+
+
+def _workload_addresses(name: str, run_id: str, requests: int) -> tuple[List[str], List[str]]:
+    """Returns (warm-up addresses, measured addresses) for a workload."""
+    if name == "cache_hit":
+        address = f"1 Hit Street {run_id}, Bench City"
+        return [address], [address] * requests
+    if name == "same_tract":
+        return [], [f"{i} Same Tract Street {run_id}, Tract 42" for i in range(requests)]
+    # cache_miss and burst: every address is new for this run.
+    return [], [f"{i} {name.title()} Street {run_id}, Bench City" for i in range(requests)]
+
+
+async def run_workloads(base_url: str, stats_url: str, workloads: List[str], requests: int, concurrency: int) -> List[WorkloadResult]:
+    run_id = uuid.uuid4().hex[:8]
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client, httpx.AsyncClient() as stats_client:
+        for name in workloads:
+            warmup, addresses = _workload_addresses(name, run_id, requests)
+            if warmup:
+                await _drive(client, warmup, 1)
+            workload_concurrency = len(addresses) if name == "burst" else concurrency
+
+            before = (await stats_client.get(stats_url)).json()
+            latencies, status_codes, shed, duration = await _drive(client, addresses, workload_concurrency)
+            after = (await stats_client.get(stats_url)).json()
+
+            result = _summarize(name, latencies, status_codes, shed, duration, workload_concurrency)
+            result.upstream_requests = {k: after[k] - before.get(k, 0) for k in after}
+            print(
+                f"{name:<11} n={result.requests:<5} c={workload_concurrency:<4} "
+                f"p50={result.p50_ms:>8.1f}ms p95={result.p95_ms:>8.1f}ms p99={result.p99_ms:>8.1f}ms "
+                f"rps={result.rps:>7.1f} errors={result.errors} rejected={result.rejected} shed={result.shed} "
+                f"upstream={sum(result.upstream_requests.values())}"
+            )
+            results.append(result)
+    return results
+
+
+def _compare(results: List[WorkloadResult], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {w["name"]: w for w in json.load(f)["workloads"]}
+    print(f"\nComparison with {baseline_path}:")
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            old, new = base[metric], getattr(result, metric)
+            change = ((new - old) / old * 100) if old else 0.0
+            print(f"  {result.name:<11} {metric:<6} {old:>9.1f} -> {new:>9.1f} ({change:+.1f}%)")
+
+
+async def main_async(args: argparse.Namespace) -> Path:
+    stand_in_port, app_port = _free_port(), _free_port()
+    stand_in_url = f"http://127.0.0.1:{stand_in_port}"
+    env = {
+        **os.environ,
+        "CENSUS_API_BASE_URL": stand_in_url,
+        "CENSUS_GEOCODER_BASE_URL": stand_in_url,
+        "NOMINATIM_BASE_URL": stand_in_url,
+        "WALKSCORE_BASE_URL": stand_in_url,
+        "TIGERWEB_BASE_URL": stand_in_url,
+        "WALKSCORE_API_KEY": os.environ.get("WALKSCORE_API_KEY") or "benchmark",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        # The stand-in has no usage policy; Nominatim's 1 req/s would make every miss wait.
+        "UPSTREAM_CLIENT_OVERRIDES": os.environ.get("UPSTREAM_CLIENT_OVERRIDES") or '{"nominatim": {"rate_limit": 0}}',
+    }
+    if not args.admission:
+        env["ADMISSION_ENABLED"] = "false"
+        env["ADAPTIVE_LIMIT_ENABLED"] = "false"
+
+    stand_in_args = ["benchmarks.stand_in", "--port", str(stand_in_port)]
+    if args.profile:
+        stand_in_args += ["--profile", args.profile]
+    processes = [
+        _start_process(stand_in_args, env),
+        _start_process(["benchmarks.app_server", "--port", str(app_port)], env),
+    ]
+    try:
+        await _wait_until_ready(f"{stand_in_url}/_stats")
+        await _wait_until_ready(f"http://127.0.0.1:{app_port}/")
+        results = await run_workloads(
+            f"http://127.0.0.1:{app_port}", f"{stand_in_url}/_stats", args.workloads, args.requests, args.concurrency
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "profile": args.profile,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "admission": args.admission,
+        "workloads": [asdict(r) for r in results],
+    }, indent=2))
+    print(f"\nResults written to {output}")
+    if args.compare:
+        _compare(results, args.compare)
+    return output
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API against a local upstream stand-in.")
+    parser.add_argument("--profile", help="Stand-in latency/error profile (JSON).")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), type=lambda s: s.split(","),
+                        help=f"Comma-separated subset of {', '.join(WORKLOADS)}.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per workload.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients (burst sends everything at once).")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep per-user admission and the adaptive miss limit on (one user per virtual client).")
+    parser.add_argument("--output", help="Results file. Defaults to benchmarks/results/<timestamp>.json.")
+    parser.add_argument("--compare", help="Previous results file to diff against.")
+    args = parser.parse_args()
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"Unknown workloads: {', '.join(sorted(unknown))}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
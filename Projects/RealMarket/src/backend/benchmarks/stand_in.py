@@ -0,0 +1,369 @@
+"""
+A local stand-in for every upstream the backend talks to: the Census Data API
+(ACS, PEP, flows, GEOINFO), the Census geocoder, Nominatim, Walk Score and TIGERweb.
+
+All upstreams share one port and are told apart by path, so the app only needs its
+*_BASE_URL settings pointed at this server. Responses are deterministic for a given
+address/tract, and every upstream has its own latency distribution and error rate.
+
+Run standalone:
+    python -m benchmarks.stand_in --port 8900 --profile benchmarks/profiles/default.json
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import random
+import re
+import zlib
+from dataclasses import dataclass, field
+from email import policy
+from email.parser import BytesParser
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+STATE_FIPS = "06"
+COUNTY_FIPS = "075"
+TRACTS_PER_COUNTY = 500
+BASE_LAT, BASE_LON = 37.70, -122.50
+TRACT_SPACING_DEG = 0.001
+
+UPSTREAMS = ("census_api", "census_geocoder", "nominatim", "walkscore", "tigerweb")
+
+
+# --- Latency and error profile ---
+
+@dataclass
+class LatencyModel:
+    """Latency distribution in milliseconds: fixed, uniform or lognormal."""
+    kind: str = "lognormal"
+    median_ms: float = 40.0
+    sigma: float = 0.4
+    min_ms: float = 0.0
+    max_ms: float = 2000.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.median_ms
+        elif self.kind == "uniform":
+            value = rng.uniform(self.min_ms, self.max_ms)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(0, self.sigma) * self.median_ms
+        else:
+            raise ValueError(f"Unsupported latency model: {self.kind}")
+        return max(self.min_ms, min(self.max_ms, value))
+
+
+@dataclass
+class UpstreamProfile:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+@dataclass
+class StandInProfile:
+    upstreams: Dict[str, UpstreamProfile] = field(
+        default_factory=lambda: {name: UpstreamProfile() for name in UPSTREAMS}
+    )
+    seed: int = 1234
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StandInProfile":
+        profile = cls(seed=data.get("seed", 1234))
+        for name, cfg in data.get("upstreams", {}).items():
+            if name not in UPSTREAMS:
+                raise ValueError(f"Unknown upstream '{name}'. Expected one of {UPSTREAMS}.")
+            profile.upstreams[name] = UpstreamProfile(
+                latency=LatencyModel(**cfg.get("latency", {})),
+                error_rate=cfg.get("error_rate", 0.0),
+                error_status=cfg.get("error_status", 503),
+            )
+        return profile
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "StandInProfile":
+        if not path:
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+# --- Deterministic fake data ---
+
+def _stable_int(*parts: Any, modulo: int) -> int:
+    return zlib.crc32("|".join(str(p) for p in parts).encode()) % modulo
+
+
+def tract_code(index: int) -> str:
+    return f"{index + 1:04d}00"
+
+
+def tract_index(code: str) -> int:
+    return int(code[:4]) - 1
+
+
+def tract_centroid(index: int) -> tuple[float, float]:
+    return BASE_LAT + index * TRACT_SPACING_DEG, BASE_LON
+
+
+def address_to_coords(address: str) -> tuple[float, float]:
+    """Addresses containing 'Tract <n>' land in tract n, others are spread by hash."""
+    match = re.search(r"tract\s+(\d+)", address, re.IGNORECASE)
+    index = int(match.group(1)) % TRACTS_PER_COUNTY if match else _stable_int(address, modulo=TRACTS_PER_COUNTY)
+    lat, lon = tract_centroid(index)
+    jitter = (_stable_int(address, "jitter", modulo=600) - 300) / 1_000_000
+    return lat + jitter, lon + jitter
+
+
+def coords_to_tract(lat: float, lon: float) -> int:
+    return max(0, min(TRACTS_PER_COUNTY - 1, round((lat - BASE_LAT) / TRACT_SPACING_DEG)))
+
+
+def census_value(var: str, geoid: str, year: int) -> Any:
+    if var == "B01003_001E":
+        base = 2000 + _stable_int(geoid, var, modulo=6000)
+        return str(int(base * (1 + 0.012 * (year - 2019))))
+    if var == "B01003_001M":
+        return str(50 + _stable_int(geoid, var, modulo=300))
+    if var.endswith("M"):
+        return str(5 + _stable_int(geoid, var, year, modulo=400))
+    if var.startswith(("S1701", "DP03")):
+        return f"{5 + _stable_int(geoid, var, year, modulo=300) / 10:.1f}"
+    return str(10 + _stable_int(geoid, var, year, modulo=5000))
+
+
+def _county_values(var: str, year: int) -> str:
+    if var == "B01003_001E":
+        return str(int(850_000 * (1 + 0.008 * (year - 2019))))
+    return census_value(var, f"{STATE_FIPS}{COUNTY_FIPS}", year)
+
+
+def _parse_geo(params) -> tuple[str, List[str]]:
+    level, _, codes = params.get("for", "").partition(":")
+    if codes == "*":
+        return level, [tract_code(i) for i in range(TRACTS_PER_COUNTY)] if level == "tract" else [COUNTY_FIPS]
+    return level, codes.split(",")
+
+
+def census_table(year: int, params) -> List[List[Any]]:
+    variables = params.get("get", "").split(",")
+    level, codes = _parse_geo(params)
+    if level == "tract":
+        header = variables + ["state", "county", "tract"]
+        rows = []
+        for code in codes:
+            geoid = f"{STATE_FIPS}{COUNTY_FIPS}{code}"
+            values = [f"Census Tract {code}; Bench County; Bench State" if v == "NAME" else census_value(v, geoid, year) for v in variables]
+            rows.append(values + [STATE_FIPS, COUNTY_FIPS, code])
+        return [header] + rows
+    header = variables + ["state", "county"]
+    values = ["Bench County, Bench State" if v == "NAME" else _county_values(v, year) for v in variables]
+    return [header, values + [STATE_FIPS, COUNTY_FIPS]]
+
+
+def pep_table(params) -> List[List[Any]]:
+    variables = params.get("get", "").split(",")
+    values = {
+        "POP": "870000", "BIRTHS": "9100", "DEATHS": "6200", "NATURALINC": "2900",
+        "DOMESTICMIG": "-4100", "INTERNATIONALMIG": "5200",
+    }
+    return [variables + ["state", "county"], [values.get(v, "0") for v in variables] + [STATE_FIPS, COUNTY_FIPS]]
+
+
+FLOW_PARTNERS = 60
+
+
+def _flow_partner(n: int) -> str:
+    # Spread partners over a handful of states; none collides with the stand-in county.
+    return f"{(n % 6) * 6 + 4:02d}{(n // 6) * 2 + 1:03d}"
+
+
+def flows_table(params) -> List[List[Any]]:
+    variables = params.get("get", "").split(",")
+    # County-to-county rows for the stand-in county: FLOW_PARTNERS domestic partners plus two regions abroad.
+    geoid1 = f"{STATE_FIPS}{COUNTY_FIPS}"
+    rows = []
+    partners = [(_flow_partner(n), f"Partner County {n}, Bench State {n % 6}") for n in range(FLOW_PARTNERS)]
+    partners += [(None, "Asia"), (None, "Europe")]
+    for geoid2, name2 in partners:
+        moved_in = 50 + _stable_int(f"{geoid2 or name2}", "in", modulo=4000)
+        moved_out = None if geoid2 is None else 50 + _stable_int(geoid2, "out", modulo=4000)
+        values = {
+            "GEOID1": geoid1, "GEOID2": geoid2, "FULL1_NAME": "Bench County, Bench State", "FULL2_NAME": name2,
+            "MOVEDIN": str(moved_in), "MOVEDOUT": None if moved_out is None else str(moved_out),
+            "MOVEDNET": None if moved_out is None else str(moved_in - moved_out),
+        }
+        rows.append([values.get(v) for v in variables] + [STATE_FIPS, COUNTY_FIPS])
+    return [variables + ["state", "county"]] + rows
+
+
+def tract_polygon(index: int) -> List[List[float]]:
+    lat, lon = tract_centroid(index)
+    h = TRACT_SPACING_DEG / 2
+    return [[lon - h, lat - h], [lon + h, lat - h], [lon + h, lat + h], [lon - h, lat + h], [lon - h, lat - h]]
+
+
+# --- App ---
+
+def _upstream_for(path: str) -> str:
+    if path.startswith("/data/"):
+        return "census_api"
+    if path.startswith("/geocoder/"):
+        return "census_geocoder"
+    if path.startswith("/search"):
+        return "nominatim"
+    if path.startswith("/score"):
+        return "walkscore"
+    return "tigerweb"
+
+
+def create_stand_in_app(profile: StandInProfile) -> FastAPI:
+    app = FastAPI(title="RealMarket upstream stand-in")
+    rng = random.Random(profile.seed)
+    app.state.request_counts = {name: 0 for name in UPSTREAMS}
+
+    @app.middleware("http")
+    async def emulate_upstream(request: Request, call_next):
+        if request.url.path == "/_stats":
+            return await call_next(request)
+        name = _upstream_for(request.url.path)
+        upstream = profile.upstreams[name]
+        app.state.request_counts[name] += 1
+        await asyncio.sleep(upstream.latency.sample(rng) / 1000)
+        if upstream.error_rate and rng.random() < upstream.error_rate:
+            return JSONResponse({"error": f"stand-in injected failure for {name}"}, status_code=upstream.error_status)
+        return await call_next(request)
+
+    @app.get("/_stats")
+    async def stats():
+        return app.state.request_counts
+
+    @app.get("/data/{year}/geoinfo")
+    async def geoinfo(year: int, request: Request):
+        _, codes = _parse_geo(request.query_params)
+        rows = [[str(1_000_000 + _stable_int(code, "aland", modulo=2_000_000)), STATE_FIPS, COUNTY_FIPS, code] for code in codes]
+        return [["AREALAND", "state", "county", "tract"]] + rows
+
+    @app.get("/data/{year}/pep/population")
+    async def pep_population(year: int, request: Request):
+        return pep_table(request.query_params)
+
+    @app.get("/data/{year}/pep/components")
+    async def pep_components(year: int, request: Request):
+        return pep_table(request.query_params)
+
+    @app.get("/data/{year}/acs/flows")
+    async def acs_flows(year: int, request: Request):
+        return flows_table(request.query_params)
+
+    @app.get("/data/{year}/{dataset:path}")
+    async def acs(year: int, dataset: str, request: Request):
+        return census_table(year, request.query_params)
+
+    @app.get("/search")
+    async def nominatim(q: str):
+        lat, lon = address_to_coords(q)
+        return [{"lat": str(lat), "lon": str(lon), "display_name": q}]
+
+    @app.get("/geocoder/geographies/coordinates")
+    async def geographies(x: float, y: float):
+        index = coords_to_tract(y, x)
+        return {"result": {"geographies": {
+            "Counties": [{"STATE": STATE_FIPS, "COUNTY": COUNTY_FIPS}],
+            "Census Tracts": [{"TRACT": tract_code(index), "ALAND": 1_500_000}],
+        }}}
+
+    @app.get("/geocoder/locations/onelineaddress")
+    async def oneline(address: str):
+        lat, lon = address_to_coords(address)
+        code = tract_code(coords_to_tract(lat, lon))
+        return {"result": {"addressMatches": [{
+            "coordinates": {"x": lon, "y": lat},
+            "geographies": {"Census Tracts": [{"GEOID": f"{STATE_FIPS}{COUNTY_FIPS}{code}", "AREALAND": 1_500_000}]},
+        }]}}
+
+    @app.post("/geocoder/geographies/addressbatch")
+    async def addressbatch(request: Request):
+        # Parsed with the stdlib so the stand-in does not need python-multipart.
+        body = await request.body()
+        message = BytesParser(policy=policy.default).parsebytes(
+            f"Content-Type: {request.headers.get('content-type', '')}\r\n\r\n".encode() + body
+        )
+        upload = next(
+            (part.get_payload(decode=True) for part in message.iter_parts() if part.get_param("name", header="content-disposition") == "addressFile"),
+            b"",
+        )
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for row in csv.reader(io.StringIO(upload.decode())):
+            if not row:
+                continue
+            record_id, fields = row[0], [f for f in row[1:] if f]
+            address = ", ".join(fields)
+            if "nomatch" in address.lower():
+                writer.writerow([record_id, address, "No_Match"])
+                continue
+            lat, lon = address_to_coords(address)
+            code = tract_code(coords_to_tract(lat, lon))
+            writer.writerow([record_id, address, "Match", "Exact", address.upper(), f"{lon},{lat}",
+                             "1000", "L", STATE_FIPS, COUNTY_FIPS, code, "1000"])
+        return Response(out.getvalue(), media_type="text/csv")
+
+    @app.get("/score")
+    async def walkscore(lat: float, lon: float):
+        score = _stable_int(lat, lon, modulo=100)
+        return {"walkscore": score, "description": "Bench walkable", "transit": {"score": score // 2, "description": "Bench transit"}}
+
+    @app.get("/arcgis/rest/services/TIGERweb/Tracts_Blocks/MapServer/2/query")
+    async def tigerweb(where: str = "", geometry: str = "", distance: float = 0.0,
+                       resultOffset: int = 0, resultRecordCount: int = 1000):
+        def feature(index: int) -> Dict[str, Any]:
+            return {
+                "type": "Feature",
+                "properties": {"STATE": STATE_FIPS, "COUNTY": COUNTY_FIPS, "TRACT": tract_code(index)},
+                "geometry": {"type": "Polygon", "coordinates": [tract_polygon(index)]},
+            }
+
+        if geometry:
+            # Point + distance (statute miles) query: every tract whose square comes within range.
+            lon, lat = (float(v) for v in geometry.split(","))
+            reach = distance / 69.0 + TRACT_SPACING_DEG / 2
+            indices = [i for i in range(TRACTS_PER_COUNTY)
+                       if abs(tract_centroid(i)[0] - lat) <= reach and abs(BASE_LON - lon) <= reach]
+            page = indices[resultOffset:resultOffset + resultRecordCount]
+            return {"type": "FeatureCollection", "features": [feature(i) for i in page],
+                    "exceededTransferLimit": resultOffset + resultRecordCount < len(indices)}
+        match = re.search(r"TRACT='(\d+)'", where)
+        if match:
+            return {"type": "FeatureCollection", "features": [feature(tract_index(match.group(1)))]}
+        if re.fullmatch(rf"STATE='{STATE_FIPS}'", where):
+            # State-wide boundary query (adjacency build): every tract, paged.
+            indices = list(range(TRACTS_PER_COUNTY))[resultOffset:resultOffset + resultRecordCount]
+            return {"type": "FeatureCollection", "features": [feature(i) for i in indices],
+                    "exceededTransferLimit": resultOffset + resultRecordCount < TRACTS_PER_COUNTY}
+        return {"type": "FeatureCollection", "features": []}
+
+    @app.get("/{path:path}")
+    async def not_found(path: str):
+        return Response(status_code=404)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the local upstream stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--profile", help="JSON file with per-upstream latency/error settings.")
+    args = parser.parse_args()
+    app = create_stand_in_app(StandInProfile.load(args.profile))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
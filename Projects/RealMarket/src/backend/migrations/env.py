@@ -33,7 +33,7 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from app.db.db_base_class import Base
-from app.models.population import PopulationCache # Import your models
+from app.models.population import PopulationCache, CountyPercentileTable, MarketDataJob # Import your models
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,35 @@
+# src/backend/migrations/versions/b7c2d3e4f5a6_create_county_percentiles_table.py
+"""Create county_percentiles table
+
+Revision ID: b7c2d3e4f5a6
+Revises: a6a1b2c3d4e5
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c2d3e4f5a6'
+down_revision: Union[str, None] = 'a6a1b2c3d4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('county_percentiles',
+    sa.Column('county_fips', sa.String(length=5), nullable=False),
+    sa.Column('data_year', sa.Integer(), nullable=False),
+    sa.Column('metrics', sa.JSON(), nullable=False),
+    sa.Column('tracts', sa.JSON(), nullable=False),
+    sa.Column('ranks', sa.LargeBinary(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('county_fips')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('county_percentiles')
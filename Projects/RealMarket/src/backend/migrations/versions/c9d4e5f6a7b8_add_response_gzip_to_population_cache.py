@@ -0,0 +1,27 @@
+# src/backend/migrations/versions/c9d4e5f6a7b8_add_response_gzip_to_population_cache.py
+"""Add response_gzip to population_cache
+
+Revision ID: c9d4e5f6a7b8
+Revises: b7c2d3e4f5a6
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d4e5f6a7b8'
+down_revision: Union[str, None] = 'b7c2d3e4f5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('population_cache', sa.Column('response_gzip', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('population_cache', 'response_gzip')
@@ -0,0 +1,27 @@
+# src/backend/migrations/versions/d1e6f7a8b9c0_add_etag_to_population_cache.py
+"""Add etag to population_cache
+
+Revision ID: d1e6f7a8b9c0
+Revises: c9d4e5f6a7b8
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e6f7a8b9c0'
+down_revision: Union[str, None] = 'c9d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('population_cache', sa.Column('etag', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('population_cache', 'etag')
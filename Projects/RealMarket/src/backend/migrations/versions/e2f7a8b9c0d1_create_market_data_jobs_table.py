@@ -0,0 +1,50 @@
+# src/backend/migrations/versions/e2f7a8b9c0d1_create_market_data_jobs_table.py
+"""Create market_data_jobs table
+
+Revision ID: e2f7a8b9c0d1
+Revises: d1e6f7a8b9c0
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f7a8b9c0d1'
+down_revision: Union[str, None] = 'd1e6f7a8b9c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('market_data_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('address', sa.String(), nullable=False),
+    sa.Column('address_key', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('status', sa.String(length=16), server_default='queued', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('error_status', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_market_data_jobs_status_created_at', 'market_data_jobs', ['status', 'created_at'], unique=False)
+    op.create_index(
+        'uq_market_data_jobs_active_address_key', 'market_data_jobs', ['address_key'], unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_market_data_jobs_active_address_key', table_name='market_data_jobs')
+    op.drop_index('ix_market_data_jobs_status_created_at', table_name='market_data_jobs')
+    op.drop_table('market_data_jobs')
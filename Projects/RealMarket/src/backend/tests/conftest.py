@@ -0,0 +1,13 @@
+import os
+
+# app.core.config builds the settings on import; these are the fields without defaults.
+# Unit tests never connect to Postgres or call the Census API.
+for name, value in {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "test",
+    "CENSUS_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
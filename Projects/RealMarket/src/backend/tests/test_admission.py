@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+def controller(**overrides) -> AdmissionController:
+    options = dict(
+        rate=0.0, burst=10.0, hit_cost=1.0, miss_cost=4.0,
+        user_max_misses=1, max_misses=1, queue_depth=4, queue_timeout=1.0,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def tokens(admission: AdmissionController, user_id: str) -> float:
+    bucket = admission._user(user_id).bucket
+    bucket._refill()
+    return bucket._tokens
+
+
+def test_token_bucket_wait_and_refund():
+    bucket = TokenBucket(rate=2.0, burst=4.0)
+    assert bucket.take(3) == 0.0
+    assert bucket.take(3) == pytest.approx(1.0, abs=0.01)
+    bucket.refund(3)
+    assert bucket.take(3) == 0.0
+
+
+def test_admit_rejects_with_retry_after():
+    admission = controller(rate=0.5, burst=2.0)
+    admission.admit("a")
+    admission.admit("a")
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.admit("a")
+    assert rejected.value.status_code == 429
+    # One token at 0.5/s is two seconds away.
+    assert rejected.value.headers["Retry-After"] == "2"
+    assert admission.rejected == 1
+    admission.admit("b")
+
+
+def test_retry_after_is_whole_seconds_and_bounded():
+    assert AdmissionRejected("x", 0.01).headers["Retry-After"] == "1"
+    assert AdmissionRejected("x", 2.2).headers["Retry-After"] == "3"
+    assert AdmissionRejected("x", float("inf")).headers["Retry-After"] == "3600"
+
+
+async def test_miss_charges_the_cost_beyond_the_hit():
+    admission = controller()
+    admission.admit("a")
+    async with admission.miss("a"):
+        assert admission.misses == 1
+    assert admission.misses == 0
+    assert tokens(admission, "a") == pytest.approx(10.0 - 4.0)
+
+
+async def test_queued_misses_are_served_round_robin():
+    admission = controller(user_max_misses=3)
+    order = []
+    release = asyncio.Event()
+
+    async def miss(name: str, user_id: str):
+        async with admission.miss(user_id):
+            order.append(name)
+            if name == "a1":
+                await release.wait()
+
+    first = asyncio.create_task(miss("a1", "a"))
+    await asyncio.sleep(0)
+    # a queues two misses before b queues one; b's first miss still goes before a's second.
+    queued = [asyncio.create_task(miss(name, user)) for name, user in (("a2", "a"), ("a3", "a"), ("b1", "b"))]
+    await asyncio.sleep(0)
+    assert order == ["a1"]
+    release.set()
+    await asyncio.gather(first, *queued)
+    assert order == ["a1", "a2", "b1", "a3"]
+    assert admission.misses == 0 and not admission._ring
+
+
+async def test_queue_timeout_rejects_and_refunds():
+    admission = controller(queue_timeout=0.05, rate=0.0)
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.miss("a"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    before = tokens(admission, "b")
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with admission.miss("b"):
+            pass
+    # Slots were busy for the whole queue timeout, so retry no sooner than that.
+    assert rejected.value.headers["Retry-After"] == "1"
+    assert tokens(admission, "b") == pytest.approx(before)
+    assert not admission._ring
+    release.set()
+    await holder
+
+
+async def test_full_queue_rejects_at_once_and_refunds():
+    admission = controller(queue_depth=1, user_max_misses=2, burst=20.0)
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.miss("a"):
+            await release.wait()
+
+    holders = [asyncio.create_task(hold()) for _ in range(2)]
+    await asyncio.sleep(0)
+    before = tokens(admission, "a")
+    with pytest.raises(AdmissionRejected):
+        async with admission.miss("a"):
+            pass
+    assert tokens(admission, "a") == pytest.approx(before)
+    release.set()
+    await asyncio.gather(*holders)
+    assert admission.misses == 0
+
+
+async def test_unaffordable_miss_is_rejected_before_queueing():
+    admission = controller(burst=4.0, miss_cost=6.0)
+    admission.admit("a")
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with admission.miss("a"):
+            pass
+    assert rejected.value.detail == "Uncached request rate limit exceeded."
+    assert admission.misses == 0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    admission = controller()
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.miss("a"):
+            await release.wait()
+
+    async def wait_for_slot():
+        async with admission.miss("b"):
+            pass
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(wait_for_slot())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert not admission._ring
+    release.set()
+    await holder
+    assert admission.misses == 0
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.admission import AdmissionController
+from app.core.overload import AdaptiveLimiter, Overloaded
+from app.services.census_service import CensusService
+
+
+class LagMonitor:
+    overloaded = False
+    lag = 0.0
+
+
+def limiter(**overrides) -> AdaptiveLimiter:
+    options = dict(initial_limit=4, min_limit=1, max_limit=8, backoff=0.5, tolerance=2.0)
+    options.update(overrides)
+    return AdaptiveLimiter(**options)
+
+
+async def run_miss(miss_limiter: AdaptiveLimiter, seconds: float = 0.0, error: Exception = None):
+    async with miss_limiter.slot():
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+
+
+async def test_sheds_beyond_the_limit():
+    miss_limiter = limiter(initial_limit=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with miss_limiter.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as shed:
+        miss_limiter.check()
+    assert shed.value.status_code == 503
+    assert shed.value.headers["Retry-After"] == "1"
+    assert miss_limiter.shed == 1
+    release.set()
+    await holder
+    miss_limiter.check()
+
+
+async def test_sheds_while_the_loop_lags():
+    monitor = LagMonitor()
+    miss_limiter = limiter(lag_monitor=monitor)
+    monitor.overloaded = True
+    with pytest.raises(Overloaded):
+        miss_limiter.check()
+    monitor.overloaded = False
+    miss_limiter.check()
+
+
+async def test_grows_while_fast_and_in_use():
+    miss_limiter = limiter(initial_limit=2, tolerance=10.0)
+    await run_miss(miss_limiter, 0.01)
+    assert miss_limiter.baseline is not None
+    for _ in range(20):
+        await asyncio.gather(run_miss(miss_limiter, 0.01), run_miss(miss_limiter, 0.01))
+    assert 2.0 < miss_limiter.limit <= 8.0
+
+
+async def test_does_not_grow_while_idle():
+    miss_limiter = limiter(initial_limit=8, max_limit=16)
+    for _ in range(10):
+        await run_miss(miss_limiter)
+    assert miss_limiter.limit == 8.0
+
+
+async def test_shrinks_on_slow_misses_once_per_baseline():
+    miss_limiter = limiter(initial_limit=8)
+    miss_limiter.baseline = 0.01
+    await run_miss(miss_limiter, 0.05)
+    assert miss_limiter.limit == 4.0
+    # A second slow miss inside the same baseline interval is the same burst.
+    miss_limiter._decreased_at = float("inf")
+    await run_miss(miss_limiter, 0.05)
+    assert miss_limiter.limit == 4.0
+
+
+async def test_shrinks_on_upstream_failure_but_not_client_errors():
+    miss_limiter = limiter(initial_limit=8)
+    miss_limiter.baseline = 1.0
+    with pytest.raises(HTTPException):
+        await run_miss(miss_limiter, error=HTTPException(status_code=404))
+    assert miss_limiter.limit == 8.0
+    with pytest.raises(HTTPException):
+        await run_miss(miss_limiter, error=HTTPException(status_code=502))
+    assert miss_limiter.limit == 4.0
+    assert miss_limiter.in_flight == 0
+
+
+async def test_never_shrinks_below_the_minimum():
+    miss_limiter = limiter(initial_limit=2, min_limit=2)
+    miss_limiter.baseline = 1.0
+    with pytest.raises(RuntimeError):
+        await run_miss(miss_limiter, error=RuntimeError("upstream"))
+    assert miss_limiter.limit == 2.0
+
+
+class EmptyCache:
+    async def get_cached_entry(self, address, db):
+        return None
+
+
+async def test_miss_shed_after_admission_is_refunded():
+    admission = AdmissionController(
+        rate=0.0, burst=10.0, hit_cost=1.0, miss_cost=4.0,
+        user_max_misses=1, max_misses=1, queue_depth=4, queue_timeout=1.0,
+    )
+    monitor = LagMonitor()
+    service = CensusService(
+        EmptyCache(), None, None, None,
+        admission=admission, miss_limiter=limiter(lag_monitor=monitor),
+    )
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.miss("other"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    bucket = admission._user("a").bucket
+    request = asyncio.create_task(service.get_market_data_entry("1 Main St", None, user_id="a"))
+    await asyncio.sleep(0)
+    # Charged and queued behind "other"; the loop starts lagging before a slot frees up.
+    assert bucket._tokens == pytest.approx(10.0 - 3.0)
+    monitor.overloaded = True
+    release.set()
+    with pytest.raises(Overloaded):
+        await request
+    assert bucket._tokens == pytest.approx(10.0)
+    assert admission.misses == 0
+    await holder